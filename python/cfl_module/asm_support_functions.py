@@ -19,6 +19,32 @@ class Support_Functions:
             raise ValueError(f"Chain name {chain_name} is not valid")
     return True
 
+  def _start_tick_timeout(self,element_data_total,event):
+    """
+    Schedule an element's timeout of element_data["timeout"] CF_TIMER_EVENTs
+    
+    Called with the first event the element sees; that event counts towards
+    the timeout when it is a CF_TIMER_EVENT.  The engine then wakes the chain
+    on the CF_TIMER_EVENT that expires the timeout, so the element need not
+    count timer events.  Returns True if the timeout has already expired.
+    """
+    element_data = element_data_total["data"]
+    ticks = element_data["timeout"]
+    if event.event_id == "CF_TIMER_EVENT":
+      ticks -= 1
+      if ticks <= 0:
+        element_data["timeout_token"] = 0  # tokens start at 1
+        return True
+    element_data["timeout_token"] = self.cf.schedule_tick_timeout(element_data_total["current_chain"],ticks)
+    return False
+  
+  def _is_timed_out(self,element_data,event):
+    return event.event_id == "CF_TIMER_EVENT" and self.cf.check_timeout(element_data["timeout_token"])
+  
+  def _cancel_timeout(self,element_data):
+    self.cf.cancel_timeout(element_data.get("timeout_token"))
+    element_data["timeout_token"] = None
+
   def list_all_asm(self):
     methods = [method for method in dir(self) 
            if method.startswith('asm_') and callable(getattr(self, method))]
@@ -23,7 +23,7 @@ class Basic_Opcodes(Support_Functions):
   
   def exec_output_fn(self,element_data,event=None):
     message = element_data['data']
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+    timestamp = datetime.fromtimestamp(self.cf.current_time()).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
     print(f"[{timestamp}] {message}")
     
   def exec_event_filter_fn(self,element_data,event):
@@ -32,7 +32,7 @@ class Basic_Opcodes(Support_Functions):
     event_list = element_data['data']
     for event_id in event_list:
       if event.event_id == event_id:
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+        timestamp = datetime.fromtimestamp(self.cf.current_time()).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
         print(f"[{timestamp}] {chain_name} {event.event_id} event received")  
         
     return "CF_CONTINUE"
@@ -44,7 +44,8 @@ class Basic_Opcodes(Support_Functions):
     self.cf.add_element(process_function=self.exec_event_filter_fn,
                         initialization_function=None,
                         termination_function=None,
-                        data=event_list, name=name)
+                        data=event_list, name=name,
+                        event_list=event_list,unmatched_return_code="CF_CONTINUE")
 
 
   def asm_one_shot_handler(self,one_shot_fn,one_shot_data,name = None):
@@ -57,7 +58,8 @@ class Basic_Opcodes(Support_Functions):
      self.cf.add_element(process_function=self.null_function_continue,
                          initialization_function=one_shot_fn,
                          termination_function=termination_fn,
-                         data=one_shot_data, name=name)
+                         data=one_shot_data, name=name,
+                         event_list=[],unmatched_return_code="CF_CONTINUE")
   
   def asm_log_message(self,message,name = None):
     
@@ -82,7 +84,8 @@ class Basic_Opcodes(Support_Functions):
     self.cf.add_element(process_function=self.exec_op_code_return_code,
                         initialization_function=None,
                         termination_function=None,
-                        data="CF_HALT", name=name)
+                        data="CF_HALT", name=name,
+                        event_list=[],unmatched_return_code="CF_HALT")
     
   def asm_terminate_system(self,name = None):
     self.asm_send_system_event("CF_TERMINATE_SYSTEM",None,name)
@@ -268,10 +271,13 @@ class Basic_Opcodes(Support_Functions):
     
       element_data = {"event_list":event_list,"count":count,"bool_fn":bool_fn,"bool_data":bool_data,"chain_list":chain_list,
                       "failure_fn":failure_fn,"failure_data":failure_data,"reset_flag":reset_flag}
+      # bool_fn sees every event, otherwise only event_list is counted
       self.cf.add_element(process_function=self.exec_exception_handler,
                         initialization_function=self.exec_exception_handler_init,
                         termination_function=termination_function,
-                        data=element_data, name=name)
+                        data=element_data, name=name,
+                        event_list=event_list if bool_fn is None else None,
+                        unmatched_return_code="CF_CONTINUE")
       
       
   def exec_join_or(self,element_data,event=None):
@@ -307,7 +313,8 @@ class Basic_Opcodes(Support_Functions):
     self.cf.add_element(process_function=self.exec_join_or,
                         initialization_function=self.null_function,
                         termination_function=self.null_function,
-                        data=element_data, name=name)
+                        data=element_data, name=name,
+                        event_list=["CF_TIMER_EVENT"])
     
   def exec_join_and(self,element_data,event=None):
     if event.event_id is not "CF_TIMER_EVENT":
@@ -340,7 +347,8 @@ class Basic_Opcodes(Support_Functions):
       self.cf.add_element(process_function=self.exec_join_and,
                           initialization_function=self.null_function,
                           termination_function=self.null_function,
-                          data=element_data, name=name)  
+                          data=element_data, name=name,
+                          event_list=["CF_TIMER_EVENT"])  
 
 
     
@@ -388,6 +396,128 @@ class Basic_Opcodes(Support_Functions):
     self.cf.add_element(process_function=self.exec_join_match_n_out_of_m,
                         initialization_function = self.exec_join_match_n_out_of_m_init,
                         termination_function = self.exec_join_match_n_out_of_m_termination,
-                        data=element_data, name=name)
+                        data=element_data, name=name,
+                        event_list=["CF_TIMER_EVENT"])
     
 
+    
+  def exec_await_init(self,element_data):
+    data = element_data['data']
+    data['result'] = None
+    data['task'] = self.cf.start_awaitable(element_data['current_chain'],data['coroutine_fn'](data['fn_data']))
+    
+  def exec_await_termination(self,element_data):
+    task = element_data['data']['task']
+    if task is not None and not task.done():
+      task.cancel()
+    element_data['data']['task'] = None
+    
+  def exec_await(self,element_data,event):
+    data = element_data['data']
+    if event.event_id != "CF_AWAIT_EVENT" or event.data is not data['task']:
+      return "CF_HALT"
+    task = data['task']
+    data['task'] = None
+    if task.cancelled() or task.exception() is not None:
+      if data['error_fn'] is not None:
+        data['error_fn'](data['error_data'])
+      if data['reset_flag'] == True:
+        return "CF_RESET"
+      return "CF_TERMINATE"
+    data['result'] = task.result()
+    if data['result_fn'] is not None:
+      data['result_fn'](data['fn_data'],data['result'])
+    return "CF_DISABLE"
+    
+  def asm_await(self,coroutine_fn,fn_data=None,result_fn=None,error_fn=None,error_data=None,reset_flag=False,name=None):
+    # halts the chain until coroutine_fn(fn_data) completes; requires ChainFlow.run_async()
+    # result_fn(fn_data,result) gets the result, error_fn(error_data) is called if it raises
+    if not callable(coroutine_fn):
+      raise TypeError("coroutine_fn must be callable")
+    if type(reset_flag) is not bool:
+      raise TypeError("reset_flag must be a boolean")
+    element_data = {"coroutine_fn":coroutine_fn,"fn_data":fn_data,"result_fn":result_fn,
+                    "error_fn":error_fn,"error_data":error_data,"reset_flag":reset_flag,"task":None}
+    self.cf.add_element(process_function=self.exec_await,
+                        initialization_function=self.exec_await_init,
+                        termination_function=self.exec_await_termination,
+                        data=element_data, name=name,
+                        event_list=["CF_AWAIT_EVENT"])
+    
+  def exec_offload_init(self,element_data):
+    data = element_data['data']
+    data['result'] = None
+    data['future'] = None
+    data['timeout_token'] = None
+    if data['timeout'] is not None:
+      data['timeout_token'] = self.cf.schedule_timeout(element_data['current_chain'],data['timeout'])
+    self._submit_offload(element_data)
+    
+  def _submit_offload(self,element_data):
+    data = element_data['data']
+    data['future'] = self.cf.submit_offload(element_data['current_chain'],data['offload_fn'],data['fn_data'],data['kind'])
+    
+  def exec_offload_termination(self,element_data):
+    data = element_data['data']
+    if data['future'] is not None:
+      data['future'].cancel()
+      data['future'] = None
+    self._cancel_timeout(data)
+    
+  def exec_offload_failure(self,data):
+    if data['error_fn'] is not None:
+      data['error_fn'](data['error_data'])
+    if data['reset_flag'] == True:
+      return "CF_RESET"
+    return "CF_TERMINATE"
+    
+  def exec_offload(self,element_data,event):
+    data = element_data['data']
+    if event.event_id == "CF_OFFLOAD_EVENT":
+      future = data['future']
+      if future is None or event.data is not future:
+        return "CF_HALT"
+      data['future'] = None
+      self._cancel_timeout(data)
+      if future.cancelled() or future.exception() is not None:
+        return self.exec_offload_failure(data)
+      data['result'] = future.result()
+      if data['result_fn'] is not None:
+        data['result_fn'](data['fn_data'],data['result'])
+      return "CF_DISABLE"
+    if event.event_id == "CF_TIMER_EVENT":
+      if data['timeout_token'] is not None and self._is_timed_out(data,event):
+        if data['future'] is not None:
+          data['future'].cancel()
+          data['future'] = None
+        data['timeout_token'] = None
+        return self.exec_offload_failure(data)
+      if data['future'] is None:
+        # the executor was at capacity, retry the submission
+        self._submit_offload(element_data)
+    return "CF_HALT"
+    
+  def asm_offload(self,offload_fn,fn_data=None,result_fn=None,timeout=None,error_fn=None,error_data=None,
+                  reset_flag=False,kind="thread",name=None):
+    # runs offload_fn(fn_data) on ChainFlow's bounded offload executor and halts the chain until it completes
+    # result_fn(fn_data,result) gets the result; on an exception or after timeout seconds
+    # error_fn(error_data) is called and the chain is reset or terminated as reset_flag selects
+    if not callable(offload_fn):
+      raise TypeError("offload_fn must be callable")
+    if type(reset_flag) is not bool:
+      raise TypeError("reset_flag must be a boolean")
+    if kind not in ("thread","process"):
+      raise ValueError("kind must be 'thread' or 'process'")
+    element_data = {"offload_fn":offload_fn,"fn_data":fn_data,"result_fn":result_fn,"timeout":timeout,
+                    "error_fn":error_fn,"error_data":error_data,"reset_flag":reset_flag,"kind":kind,
+                    "future":None,"timeout_token":None}
+    self.cf.add_element(process_function=self.exec_offload,
+                        initialization_function=self.exec_offload_init,
+                        termination_function=self.exec_offload_termination,
+                        data=element_data, name=name,
+                        event_list=["CF_OFFLOAD_EVENT","CF_TIMER_EVENT"])
+    
+  def asm_offload_process(self,offload_fn,fn_data=None,result_fn=None,timeout=None,error_fn=None,error_data=None,
+                          reset_flag=False,name=None):
+    # asm_offload on the process pool; offload_fn and fn_data must be picklable
+    self.asm_offload(offload_fn,fn_data,result_fn,timeout,error_fn,error_data,reset_flag,"process",name)
@@ -10,6 +10,12 @@ class Behavior_Tree_Control(FullLtreeStorage):
         self.chain_data = {}
         self.chain_data_link = {}
         
+    def _resolve_copy_policy(self, policy):
+        # chain data is handed out as plain dict / list; 'readonly' views would fail their type checks
+        policy = FullLtreeStorage._resolve_copy_policy(self, policy)
+        if policy == 'readonly':
+            raise ValueError("Behavior_Tree_Control does not support the 'readonly' copy policy")
+        return policy
     
     def add_composite_element(self, chain_name, data ):
         if chain_name in self.chain_list:
@@ -1,11 +1,14 @@
 import re
 import json
 import copy
+from bisect import bisect_left
 import psycopg2
 from psycopg2.extras import RealDictCursor
-from typing import Dict, List, Any, Optional, Union, Set, Tuple
+from typing import Callable, Dict, List, Any, Optional, Union, Set, Tuple, Iterator
+from collections.abc import Mapping, Sequence
 from contextlib import contextmanager
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from functools import lru_cache
 
 #
 #
@@ -26,16 +29,289 @@ class TreeNode:
     created_at: Optional[str] = None
     updated_at: Optional[str] = None
 
+@dataclass
+class CompiledQuery:
+    """
+    An lquery compiled for matching against many paths.
+    
+    match is the compiled regex's match method, None if the query is invalid.
+    segments are the leading labels of the query that select exactly one label
+    each: a label, a tuple of {a,b} alternatives, or None for '*'. exhaustive
+    is True when the segments are the whole query.
+    """
+    query: str
+    match: Optional[Callable[[str], Any]]
+    segments: List[Union[str, Tuple[str, ...], None]] = field(default_factory=list)
+    exhaustive: bool = False
+
+@dataclass
+class CompiledTextQuery:
+    """
+    An ltxtquery compiled for matching against many paths.
+    
+    tree is the parsed query: ('word', word, modifiers), ('not', operand),
+    ('and', operands) or ('or', operands). match takes the set of labels of a
+    path and returns whether the query holds. Both are None if the query is invalid.
+    """
+    query: str
+    tree: Optional[Tuple[Any, ...]]
+    match: Optional[Callable[[Set[str]], bool]]
+
+# ltxtquery tokens: a word with its modifiers, or an operator
+_LTXT_TOKEN = re.compile(r'\s*(?:([a-zA-Z0-9_]+)([*%@]*)|([&|!()]))')
+
+def _tokenize_ltxtquery(query: str) -> List[Tuple[str, str]]:
+    """Split an ltxtquery into ('word', modifiers) and (operator, '') tokens."""
+    tokens = []
+    position = 0
+    end = len(query.rstrip())
+    while position < end:
+        token = _LTXT_TOKEN.match(query, position)
+        if token is None:
+            raise ValueError(f"Invalid ltxtquery at {position}: {query!r}")
+        if token.group(1) is not None:
+            tokens.append((token.group(1), token.group(2)))
+        else:
+            tokens.append((token.group(3), ''))
+        position = token.end()
+    return tokens
+
+def _parse_ltxtquery(query: str) -> Tuple[Any, ...]:
+    """
+    Parse an ltxtquery; '!' binds tighter than '&', which binds tighter than '|'.
+    
+    Raises:
+        ValueError: If the query is not a valid ltxtquery
+    """
+    tokens = _tokenize_ltxtquery(query)
+    position = 0
+    
+    def peek() -> Optional[str]:
+        return tokens[position][0] if position < len(tokens) else None
+    
+    def parse_binary(operator: str, parse_operand: Callable[[], Tuple[Any, ...]]) -> Tuple[Any, ...]:
+        nonlocal position
+        operands = [parse_operand()]
+        while peek() == operator:
+            position += 1
+            operands.append(parse_operand())
+        if len(operands) == 1:
+            return operands[0]
+        return ('and' if operator == '&' else 'or', tuple(operands))
+    
+    def parse_or() -> Tuple[Any, ...]:
+        return parse_binary('|', parse_and)
+    
+    def parse_and() -> Tuple[Any, ...]:
+        return parse_binary('&', parse_unary)
+    
+    def parse_unary() -> Tuple[Any, ...]:
+        nonlocal position
+        token = peek()
+        if token is None or token in '&|)':
+            raise ValueError(f"Expected a word in ltxtquery: {query!r}")
+        position += 1
+        if token == '!':
+            return ('not', parse_unary())
+        if token == '(':
+            operand = parse_or()
+            if peek() != ')':
+                raise ValueError(f"Unbalanced parentheses in ltxtquery: {query!r}")
+            position += 1
+            return operand
+        return ('word', token, tokens[position - 1][1])
+    
+    tree = parse_or()
+    if position != len(tokens):
+        raise ValueError(f"Unexpected {peek()!r} in ltxtquery: {query!r}")
+    return tree
+
+def _label_matcher(word: str, modifiers: str) -> Callable[[str], bool]:
+    """
+    Build the test of a single label against an ltxtquery word.
+    
+    Modifiers: '*' matches labels starting with the word, '@' ignores case and
+    '%' matches the underscore separated parts of the word against those of
+    the label, each part anywhere in the label.
+    """
+    if not modifiers:
+        return word.__eq__
+    prefix = '*' in modifiers
+    ignore_case = '@' in modifiers
+    if ignore_case:
+        word = word.lower()
+    
+    if '%' in modifiers:
+        parts = word.split('_')
+        
+        def label_matches(label: str) -> bool:
+            if ignore_case:
+                label = label.lower()
+            label_parts = label.split('_')
+            if prefix:
+                return all(any(label_part.startswith(part) for label_part in label_parts) for part in parts)
+            return all(part in label_parts for part in parts)
+    elif prefix:
+        def label_matches(label: str) -> bool:
+            return (label.lower() if ignore_case else label).startswith(word)
+    else:
+        def label_matches(label: str) -> bool:
+            return label.lower() == word
+    
+    return label_matches
+
+def _word_matcher(word: str, modifiers: str) -> Callable[[Set[str]], bool]:
+    """Build the matcher of an ltxtquery word against the label set of a path."""
+    if not modifiers:
+        return lambda labels: word in labels
+    label_matches = _label_matcher(word, modifiers)
+    return lambda labels: any(map(label_matches, labels))
+
+def _text_matcher(tree: Tuple[Any, ...]) -> Callable[[Set[str]], bool]:
+    """Build the matcher of a parsed ltxtquery."""
+    kind = tree[0]
+    if kind == 'word':
+        return _word_matcher(tree[1], tree[2])
+    if kind == 'not':
+        operand = _text_matcher(tree[1])
+        return lambda labels: not operand(labels)
+    operands = [_text_matcher(operand) for operand in tree[1]]
+    if kind == 'and':
+        return lambda labels: all(operand(labels) for operand in operands)
+    return lambda labels: any(operand(labels) for operand in operands)
+
+class ReadOnlyDict(Mapping):
+    """
+    Read-only view of a dict; nested dicts, lists and tuples are returned as views too.
+    
+    Copying a view (copy.copy / copy.deepcopy) gives back plain, writable data.
+    A view is not a dict: isinstance(view, dict) is False and json.dumps()
+    rejects it, so deep copy it before serializing.
+    """
+    __slots__ = ('_data',)
+    
+    def __init__(self, data: dict):
+        self._data = data
+    
+    def __getitem__(self, key: Any) -> Any:
+        return _readonly(self._data[key])
+    
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self._data)
+    
+    def __len__(self) -> int:
+        return len(self._data)
+    
+    def __eq__(self, other: Any) -> bool:
+        return self._data == (other._data if isinstance(other, ReadOnlyDict) else other)
+    
+    def __copy__(self) -> dict:
+        return dict(self._data)
+    
+    def __deepcopy__(self, memo: dict) -> dict:
+        return copy.deepcopy(self._data, memo)
+    
+    def __repr__(self) -> str:
+        return f"ReadOnlyDict({self._data!r})"
+
+class ReadOnlyList(Sequence):
+    """Read-only view of a list or tuple; nested dicts, lists and tuples are returned as views too."""
+    __slots__ = ('_data',)
+    
+    def __init__(self, data: Union[list, tuple]):
+        self._data = data
+    
+    def __getitem__(self, index: Any) -> Any:
+        if isinstance(index, slice):
+            return ReadOnlyList(self._data[index])
+        return _readonly(self._data[index])
+    
+    def __len__(self) -> int:
+        return len(self._data)
+    
+    def __eq__(self, other: Any) -> bool:
+        return self._data == (other._data if isinstance(other, ReadOnlyList) else other)
+    
+    def __copy__(self) -> Union[list, tuple]:
+        return self._data[:]
+    
+    def __deepcopy__(self, memo: dict) -> Union[list, tuple]:
+        return copy.deepcopy(self._data, memo)
+    
+    def __repr__(self) -> str:
+        return f"ReadOnlyList({self._data!r})"
+
+def _readonly(value: Any) -> Any:
+    """Wrap mutable containers in read-only views; other values are returned as they are."""
+    if isinstance(value, dict):
+        return ReadOnlyDict(value)
+    if isinstance(value, (list, tuple)):
+        return ReadOnlyList(value)
+    if isinstance(value, set):
+        return frozenset(value)
+    return value
+
+def _no_copy(value: Any) -> Any:
+    return value
+
+# how stored data is handed out, see FullLtreeStorage
+_READERS = {'deepcopy': copy.deepcopy, 'readonly': _readonly, 'none': _no_copy}
+
+# entries of the compiled lquery and ltxtquery LRU caches
+QUERY_CACHE_SIZE = 256
+
+# a label that every regex conversion pass leaves untouched
+_PLAIN_LABEL = re.compile(r'[a-zA-Z0-9_]+')
+# {a,b,c} alternatives of ltree labels; all digit alternatives are quantifiers
+_LABEL_CHOICE = re.compile(r'\{([a-zA-Z_][a-zA-Z0-9_]*(?:,[a-zA-Z_][a-zA-Z0-9_]*)*)\}')
+
 class FullLtreeStorage:
     """
     A comprehensive system for storing and querying tree-structured data with full ltree compatibility.
     
     Supports all PostgreSQL ltree operators and provides seamless import/export with PostgreSQL.
+    
+    Nodes are kept in a dict with a sorted index of their paths beside it. Labels
+    only hold characters that sort after '.', so a node's descendants are the
+    contiguous run of paths starting with "path." and subtree queries are bisected
+    range scans. The index follows store(), delete(), delete_subtree() and clear();
+    paths added or deleted in between are merged in on the next query.
+    An inverted index from each label to the paths holding it is kept up to date
+    alongside, so ltxtquery searches combine postings instead of scanning paths.
+    
+    lquery and ltxtquery patterns are compiled once and kept in LRU caches of
+    QUERY_CACHE_SIZE entries shared by all storages, see compile_query() and
+    compile_ltxtquery().
+    
+    The copy policy sets how data crosses the storage boundary:
+    
+    - 'deepcopy' (default): store() keeps a deep copy and every read returns one.
+    - 'readonly': store() keeps a deep copy, reads return ReadOnlyDict / ReadOnlyList
+      views of it without copying. store() replaces a node's data rather than
+      changing it, so a view keeps showing the data it was taken from.
+      The views are not dict / list instances and json.dumps() rejects them, so
+      code that type checks or serializes results must keep 'deepcopy' or
+      copy.deepcopy() the views first; Behavior_Tree_Control refuses 'readonly'.
+    - 'none': nothing is copied; callers must not modify stored or returned data.
+    
+    store(), get(), get_node(), add_subtree() and the query methods take a copy_policy
+    argument to override the policy for one call: True for 'deepcopy', False for
+    'none', or a policy name.
     """
     
-    def __init__(self):
-        """Initialize the tree data storage system."""
+    def __init__(self, copy_policy: str = 'deepcopy'):
+        """
+        Initialize the tree data storage system.
+        
+        Args:
+            copy_policy: 'deepcopy', 'readonly' or 'none'
+        """
+        self.copy_policy = self._resolve_copy_policy(copy_policy)
         self.data: Dict[str, TreeNode] = {}
+        self._paths: List[str] = []  # sorted index of the stored paths, see _sorted_paths()
+        self._added: Set[str] = set()  # stored paths not yet in _paths
+        self._removed: Set[str] = set()  # deleted paths still in _paths
+        self._label_paths: Dict[str, Set[str]] = {}  # inverted index: label to the paths holding it
     
     def _validate_path(self, path: str) -> bool:
         """
@@ -86,7 +362,8 @@ class FullLtreeStorage:
         else:
             return '.'.join(labels[start:start + length])
     
-    def _convert_ltree_query_to_regex(self, query: str) -> str:
+    @staticmethod
+    def _convert_ltree_query_to_regex(query: str) -> str:
         """
         Convert full ltree query syntax to regex.
         
@@ -103,12 +380,13 @@ class FullLtreeStorage:
         # Handle ltxtquery format (word1@word2@word3)
         if '@' in query and not query.startswith('@') and not query.endswith('@'):
             # This is an ltxtquery format, convert @ to . for path matching
-            return self._convert_simple_pattern(query.replace('@', '.'))
+            return FullLtreeStorage._convert_simple_pattern(query.replace('@', '.'))
         
         # Convert lquery format
-        return self._convert_lquery_pattern(query)
+        return FullLtreeStorage._convert_lquery_pattern(query)
     
-    def _convert_lquery_pattern(self, pattern: str) -> str:
+    @staticmethod
+    def _convert_lquery_pattern(pattern: str) -> str:
         """Convert lquery pattern to regex."""
         # Escape special regex characters first
         result = re.escape(pattern)
@@ -140,7 +418,8 @@ class FullLtreeStorage:
         
         return f'^{result}$'
     
-    def _convert_simple_pattern(self, pattern: str) -> str:
+    @staticmethod
+    def _convert_simple_pattern(pattern: str) -> str:
         """Convert simple wildcard pattern to regex."""
         result = re.escape(pattern)
         result = result.replace('\\*\\*', '.*')
@@ -157,11 +436,41 @@ class FullLtreeStorage:
             path: The path to test
             query: The ltree query pattern
         """
+        match = self.compile_query(query).match
+        return match is not None and match(path) is not None
+    
+    @staticmethod
+    @lru_cache(maxsize=QUERY_CACHE_SIZE)
+    def compile_query(query: str) -> CompiledQuery:
+        """
+        Compile an lquery; the result is cached by query string for all storages.
+        
+        Args:
+            query: The ltree query pattern
+            
+        Returns:
+            CompiledQuery, whose match is None if the query does not convert to a valid regex
+        """
         try:
-            regex_pattern = self._convert_ltree_query_to_regex(query)
-            return bool(re.match(regex_pattern, path))
+            match = re.compile(FullLtreeStorage._convert_ltree_query_to_regex(query)).match
         except Exception:
-            return False
+            return CompiledQuery(query, None)
+        
+        compiled = CompiledQuery(query, match)
+        if '@' in query:  # ltxtquery words match in any position
+            return compiled
+        for label in query.split('.'):
+            if label == '*':
+                compiled.segments.append(None)
+            elif _PLAIN_LABEL.fullmatch(label):
+                compiled.segments.append(label)
+            else:
+                choice = _LABEL_CHOICE.fullmatch(label)
+                if choice is None:
+                    return compiled
+                compiled.segments.append(tuple(sorted(set(choice.group(1).split(',')))))
+        compiled.exhaustive = True
+        return compiled
     
     def ltxtquery_match(self, path: str, ltxtquery: str) -> bool:
         """
@@ -170,34 +479,28 @@ class FullLtreeStorage:
         
         Args:
             path: The path to test
-            ltxtquery: The ltxtquery expression (e.g., "word1 & word2", "word1 | word2")
+            ltxtquery: The ltxtquery expression (e.g., "word1 & word2", "word1 | !(word2* & word3@)")
         """
-        # Split path into words (labels)
-        path_words = set(path.split('.'))
-        
-        # Simple ltxtquery parser - supports &, |, !, ()
-        query = ltxtquery.strip()
-        
-        # Handle simple cases first
-        if '&' not in query and '|' not in query and '!' not in query:
-            # Single word query
-            return query.strip() in path_words
-        
-        # Replace logical operators with Python equivalents
-        # This is a simplified implementation
-        query = query.replace('&', ' and ')
-        query = query.replace('|', ' or ')
-        query = query.replace('!', ' not ')
-        
-        # Replace words with boolean checks
-        for word in re.findall(r'\b\w+\b', ltxtquery):
-            if word not in ['and', 'or', 'not']:
-                query = query.replace(word, f"'{word}' in path_words")
+        match = self.compile_ltxtquery(ltxtquery).match
+        return match is not None and match(set(path.split('.')))
+    
+    @staticmethod
+    @lru_cache(maxsize=QUERY_CACHE_SIZE)
+    def compile_ltxtquery(ltxtquery: str) -> CompiledTextQuery:
+        """
+        Compile an ltxtquery; the result is cached by query string for all storages.
         
+        Args:
+            ltxtquery: The ltxtquery expression
+            
+        Returns:
+            CompiledTextQuery, whose tree and match are None if the query is invalid
+        """
         try:
-            return eval(query)
-        except:
-            return False
+            tree = _parse_ltxtquery(ltxtquery)
+        except (ValueError, RecursionError):
+            return CompiledTextQuery(ltxtquery, None, None)
+        return CompiledTextQuery(ltxtquery, tree, _text_matcher(tree))
     
     def ltree_ancestor(self, ancestor: str, descendant: str) -> bool:
         """
@@ -328,8 +631,174 @@ class FullLtreeStorage:
         
         return '.'.join(common_labels) if common_labels else None
     
+    # Sorted path index
+    def _index_add(self, path: str) -> None:
+        """Add a newly stored path to the indexes."""
+        if path in self._removed:
+            self._removed.discard(path)
+        else:
+            self._added.add(path)
+        label_paths = self._label_paths
+        for label in path.split('.'):
+            postings = label_paths.get(label)
+            if postings is None:
+                label_paths[label] = {path}
+            else:
+                postings.add(path)
+    
+    def _index_remove(self, path: str) -> None:
+        """Remove a deleted path from the indexes."""
+        if path in self._added:
+            self._added.discard(path)
+        else:
+            self._removed.add(path)
+        self._labels_remove(path)
+    
+    def _labels_remove(self, path: str) -> None:
+        """Remove a deleted path from the inverted label index."""
+        label_paths = self._label_paths
+        for label in path.split('.'):
+            postings = label_paths.get(label)
+            if postings is not None:
+                postings.discard(path)
+                if not postings:
+                    del label_paths[label]
+    
+    def _sorted_paths(self) -> List[str]:
+        """
+        Return the sorted list of stored paths, merging the pending changes first.
+        
+        The returned list is the index itself and must not be modified.
+        """
+        paths = self._paths
+        if self._removed:
+            removed = self._removed
+            if len(removed) * 16 < len(paths):
+                for path in removed:
+                    del paths[bisect_left(paths, path)]
+            else:
+                paths[:] = [path for path in paths if path not in removed]
+            removed.clear()
+        if self._added:
+            # the sort merges the already sorted run with the new paths
+            paths.extend(self._added)
+            paths.sort()
+            self._added.clear()
+        return paths
+    
+    def _subtree_range(self, path: str) -> Tuple[int, int]:
+        """
+        Return the index range holding path and its descendants.
+        
+        '/' follows '.' and precedes every label character, so the range ends
+        before the first path that neither is path nor starts with "path.".
+        """
+        paths = self._sorted_paths()
+        return bisect_left(paths, path), bisect_left(paths, path + '/')
+    
+    def _descendant_paths(self, path: str) -> List[str]:
+        """Return the stored descendants of path in path order."""
+        paths = self._sorted_paths()
+        return paths[bisect_left(paths, path + '.'):bisect_left(paths, path + '/')]
+    
+    def _ancestor_paths(self, path: str) -> List[str]:
+        """Return the stored proper ancestors of path, shallowest first."""
+        labels = path.split('.')
+        ancestors = []
+        prefix = labels[0]
+        for label in labels[1:]:
+            if prefix in self.data:
+                ancestors.append(prefix)
+            prefix = f"{prefix}.{label}"
+        return ancestors
+    
+    def _child_ranges(self, prefix: str, start: int, end: int) -> List[Tuple[str, int, int]]:
+        """
+        Return (child, start, end) for every child label of prefix found in an index range.
+        
+        Each child's subtree is skipped with one bisect, so the cost depends on the
+        number of children rather than the size of the subtree.
+        """
+        paths = self._paths
+        label_start = len(prefix) + 1 if prefix else 0
+        children = []
+        index = start
+        if index < end and paths[index] == prefix:
+            index += 1
+        while index < end:
+            path = paths[index]
+            dot = path.find('.', label_start)
+            child = path if dot < 0 else path[:dot]
+            child_end = bisect_left(paths, child + '/', index, end)
+            children.append((child, index, child_end))
+            index = child_end
+        return children
+    
+    def _query_candidates(self, compiled: CompiledQuery) -> List[str]:
+        """
+        Return the paths that may match a compiled query, in path order.
+        
+        The leading segments are walked over the index like a trie: a label or
+        alternative narrows the range by bisection and '*' steps into each child,
+        so subtrees that cannot match are never visited. The remaining segments
+        are left to the regex, which only sees the descendants of the walked prefixes.
+        """
+        paths = self._sorted_paths()
+        ranges = [('', 0, len(paths))]
+        for segment in compiled.segments:
+            next_ranges = []
+            for prefix, start, end in ranges:
+                if segment is None:
+                    next_ranges.extend(self._child_ranges(prefix, start, end))
+                    continue
+                for label in ((segment,) if isinstance(segment, str) else segment):
+                    child = f"{prefix}.{label}" if prefix else label
+                    child_start = bisect_left(paths, child, start, end)
+                    child_end = bisect_left(paths, child + '/', child_start, end)
+                    if child_start < child_end:
+                        next_ranges.append((child, child_start, child_end))
+            ranges = next_ranges
+            if not ranges:
+                return []
+        
+        if compiled.exhaustive:
+            return [prefix for prefix, start, end in ranges if paths[start] == prefix]
+        candidates = []
+        for prefix, start, end in ranges:
+            if prefix:
+                # the regex continues with a '.', so only descendants can match
+                start = bisect_left(paths, prefix + '.', start, end)
+            candidates.extend(paths[start:end])
+        return candidates
+    
+    def _resolve_copy_policy(self, policy: Union[None, bool, str]) -> str:
+        """Map a copy_policy argument to a policy name, None being the storage's policy."""
+        if policy is None:
+            return self.copy_policy
+        if policy is True:
+            return 'deepcopy'
+        if policy is False:
+            return 'none'
+        if policy not in _READERS:
+            raise ValueError(f"Unknown copy policy: {policy!r}")
+        return policy
+    
+    def _reader(self, policy: Union[None, bool, str]) -> Callable[[Any], Any]:
+        """Return the function handing out stored data under a copy policy."""
+        return _READERS[self._resolve_copy_policy(policy)]
+    
+    def _result(self, path: str, node: TreeNode, reader: Callable[[Any], Any]) -> Dict[str, Any]:
+        """Build the query result entry of a node."""
+        return {
+            'path': path,
+            'data': reader(node.data),
+            'created_at': node.created_at,
+            'updated_at': node.updated_at
+        }
+    
     # Storage operations
-    def store(self, path: str, data: Any, created_at: Optional[str] = None, updated_at: Optional[str] = None) -> bool:
+    def store(self, path: str, data: Any, created_at: Optional[str] = None, updated_at: Optional[str] = None,
+              copy_policy: Union[None, bool, str] = None) -> bool:
         """
         Store data at a specific path in the tree.
         
@@ -338,6 +807,7 @@ class FullLtreeStorage:
             data: The data to store
             created_at: Optional creation timestamp
             updated_at: Optional update timestamp
+            copy_policy: Copy policy override; data is kept as is under 'none'
             
         Returns:
             True if successful
@@ -345,60 +815,105 @@ class FullLtreeStorage:
         if not self._validate_path(path):
             raise ValueError(f"Invalid ltree path: {path}")
         
+        if self._resolve_copy_policy(copy_policy) != 'none':
+            data = copy.deepcopy(data)
+        if path not in self.data:
+            self._index_add(path)
         self.data[path] = TreeNode(
             path=path,
-            data=copy.deepcopy(data),
+            data=data,
             created_at=created_at,
             updated_at=updated_at
         )
         return True
     
-    def get(self, path: str) -> Optional[Any]:
-        """Retrieve data from a specific path."""
+    def get(self, path: str, copy_policy: Union[None, bool, str] = None) -> Optional[Any]:
+        """Retrieve data from a specific path; copy_policy overrides the storage's policy."""
         if not self._validate_path(path):
             raise ValueError(f"Invalid ltree path: {path}")
         
         node = self.data.get(path)
-        return copy.deepcopy(node.data) if node else None
+        return self._reader(copy_policy)(node.data) if node else None
     
-    def get_node(self, path: str) -> Optional[TreeNode]:
-        """Retrieve the full node (with metadata) from a specific path."""
+    def get_node(self, path: str, copy_policy: Union[None, bool, str] = None) -> Optional[TreeNode]:
+        """
+        Retrieve the full node (with metadata) from a specific path.
+        
+        Under the 'none' policy this is the stored node itself, otherwise a new
+        node holding the data as handed out by the policy.
+        """
         if not self._validate_path(path):
             raise ValueError(f"Invalid ltree path: {path}")
         
         node = self.data.get(path)
-        return copy.deepcopy(node) if node else None
+        if node is None:
+            return None
+        policy = self._resolve_copy_policy(copy_policy)
+        if policy == 'none':
+            return node
+        return TreeNode(path=node.path, data=_READERS[policy](node.data),
+                        created_at=node.created_at, updated_at=node.updated_at)
     
     # Advanced querying with full ltree support
-    def query(self, pattern: str) -> List[Dict[str, Any]]:
-        """Query using ltree pattern matching (~)."""
-        results = []
-        for path, node in self.data.items():
-            if self.ltree_match(path, pattern):
-                results.append({
-                    'path': path,
-                    'data': copy.deepcopy(node.data),
-                    'created_at': node.created_at,
-                    'updated_at': node.updated_at
-                })
-        results.sort(key=lambda x: x['path'])
-        return results
-    
-    def query_ltxtquery(self, ltxtquery: str) -> List[Dict[str, Any]]:
-        """Query using ltxtquery pattern matching (@@)."""
-        results = []
-        for path, node in self.data.items():
-            if self.ltxtquery_match(path, ltxtquery):
-                results.append({
-                    'path': path,
-                    'data': copy.deepcopy(node.data),
-                    'created_at': node.created_at,
-                    'updated_at': node.updated_at
-                })
-        results.sort(key=lambda x: x['path'])
-        return results
-    
-    def query_by_operator(self, operator: str, path1: str, path2: str = None) -> List[Dict[str, Any]]:
+    # The query methods take copy_policy to override the storage's policy for their results
+    def query(self, pattern: str, copy_policy: Union[None, bool, str] = None) -> List[Dict[str, Any]]:
+        """
+        Query using ltree pattern matching (~).
+        
+        The pattern is compiled once and only tested against the candidates
+        left by walking its leading segments over the path index.
+        """
+        compiled = self.compile_query(pattern)
+        match = compiled.match
+        if match is None:
+            return []
+        data = self.data
+        reader = self._reader(copy_policy)
+        return [self._result(path, data[path], reader) for path in self._query_candidates(compiled) if match(path)]
+    
+    def query_ltxtquery(self, ltxtquery: str, copy_policy: Union[None, bool, str] = None) -> List[Dict[str, Any]]:
+        """Query using ltxtquery pattern matching (@@), answered from the inverted label index."""
+        tree = self.compile_ltxtquery(ltxtquery).tree
+        if tree is None:
+            return []
+        data = self.data
+        reader = self._reader(copy_policy)
+        return [self._result(path, data[path], reader) for path in sorted(self._ltxtquery_paths(tree))]
+    
+    def _ltxtquery_paths(self, tree: Tuple[Any, ...]) -> Set[str]:
+        """
+        Evaluate a parsed ltxtquery over the inverted label index.
+        
+        Words are looked up in the index; modified words scan the distinct labels
+        rather than the paths. '&' intersects the postings of its positive operands,
+        smallest first, and subtracts those of its negated ones.
+        
+        The returned set may be an index entry and must not be modified.
+        """
+        kind = tree[0]
+        label_paths = self._label_paths
+        if kind == 'word':
+            word, modifiers = tree[1], tree[2]
+            if not modifiers:
+                return label_paths.get(word, set())
+            label_matches = _label_matcher(word, modifiers)
+            return set().union(*(postings for label, postings in label_paths.items() if label_matches(label)))
+        if kind == 'not':
+            return self.data.keys() - self._ltxtquery_paths(tree[1])
+        if kind == 'or':
+            return set().union(*(self._ltxtquery_paths(operand) for operand in tree[1]))
+        
+        included = [self._ltxtquery_paths(operand) for operand in tree[1] if operand[0] != 'not']
+        excluded = [self._ltxtquery_paths(operand[1]) for operand in tree[1] if operand[0] == 'not']
+        if included:
+            included.sort(key=len)
+            result = included[0].intersection(*included[1:])
+        else:
+            result = set(self.data)
+        return result.difference(*excluded)
+    
+    def query_by_operator(self, operator: str, path1: str, path2: str = None,
+                          copy_policy: Union[None, bool, str] = None) -> List[Dict[str, Any]]:
         """
         Query using specific ltree operators.
         
@@ -406,92 +921,46 @@ class FullLtreeStorage:
             operator: '@>', '<@', '~', '@@', '||'
             path1: First operand (for @>, <@ this is the reference path)
             path2: Second operand (for operators that need it)
+            copy_policy: Copy policy override for the results
         """
-        results = []
-        
-        if operator == '@>':  # ancestor-of
-            for path, node in self.data.items():
-                if self.ltree_ancestor(path1, path):
-                    results.append({
-                        'path': path,
-                        'data': copy.deepcopy(node.data),
-                        'created_at': node.created_at,
-                        'updated_at': node.updated_at
-                    })
-        
-        elif operator == '<@':  # descendant-of  
-            for path, node in self.data.items():
-                if self.ltree_descendant(path, path1):
-                    results.append({
-                        'path': path,
-                        'data': copy.deepcopy(node.data),
-                        'created_at': node.created_at,
-                        'updated_at': node.updated_at
-                    })
+        if operator in ('@>', '<@'):  # paths path1 is an ancestor of, i.e. descendant-of path1
+            reader = self._reader(copy_policy)
+            return [self._result(path, self.data[path], reader) for path in self._descendant_paths(path1)]
         
         elif operator == '~':  # lquery match
-            return self.query(path1)
+            return self.query(path1, copy_policy=copy_policy)
         
         elif operator == '@@':  # ltxtquery match
-            return self.query_ltxtquery(path1)
+            return self.query_ltxtquery(path1, copy_policy=copy_policy)
         
-        results.sort(key=lambda x: x['path'])
-        return results
+        return []
     
-    def query_ancestors(self, path: str) -> List[Dict[str, Any]]:
+    def query_ancestors(self, path: str, copy_policy: Union[None, bool, str] = None) -> List[Dict[str, Any]]:
         """Get all ancestors using @> operator."""
         if not self._validate_path(path):
             raise ValueError(f"Invalid ltree path: {path}")
         
-        results = []
-        for stored_path, node in self.data.items():
-            if self.ltree_ancestor(stored_path, path):
-                results.append({
-                    'path': stored_path,
-                    'data': copy.deepcopy(node.data),
-                    'created_at': node.created_at,
-                    'updated_at': node.updated_at
-                })
-        
-        results.sort(key=lambda x: len(x['path'].split('.')))
-        return results
+        reader = self._reader(copy_policy)
+        return [self._result(ancestor, self.data[ancestor], reader) for ancestor in self._ancestor_paths(path)]
     
-    def query_descendants(self, path: str) -> List[Dict[str, Any]]:
+    def query_descendants(self, path: str, copy_policy: Union[None, bool, str] = None) -> List[Dict[str, Any]]:
         """Get all descendants using <@ operator."""
         if not self._validate_path(path):
             raise ValueError(f"Invalid ltree path: {path}")
         
-        results = []
-        for stored_path, node in self.data.items():
-            if self.ltree_descendant(stored_path, path):
-                results.append({
-                    'path': stored_path,
-                    'data': copy.deepcopy(node.data),
-                    'created_at': node.created_at,
-                    'updated_at': node.updated_at
-                })
-        
-        results.sort(key=lambda x: x['path'])
-        return results
+        reader = self._reader(copy_policy)
+        return [self._result(descendant, self.data[descendant], reader)
+                for descendant in self._descendant_paths(path)]
     
-    def query_subtree(self, path: str) -> List[Dict[str, Any]]:
+    def query_subtree(self, path: str, copy_policy: Union[None, bool, str] = None) -> List[Dict[str, Any]]:
         """Get node and all its descendants."""
-        results = []
-        
-        # Add the node itself if it exists
-        if self.exists(path):
-            node = self.data[path]
-            results.append({
-                'path': path,
-                'data': copy.deepcopy(node.data),
-                'created_at': node.created_at,
-                'updated_at': node.updated_at
-            })
-        
-        # Add all descendants
-        results.extend(self.query_descendants(path))
-        results.sort(key=lambda x: x['path'])
-        return results
+        if not self._validate_path(path):
+            raise ValueError(f"Invalid ltree path: {path}")
+        
+        start, end = self._subtree_range(path)
+        data = self.data
+        reader = self._reader(copy_policy)
+        return [self._result(stored_path, data[stored_path], reader) for stored_path in self._paths[start:end]]
     
     def exists(self, path: str) -> bool:
         """Check if a path exists."""
@@ -501,35 +970,30 @@ class FullLtreeStorage:
         """Delete a specific node."""
         if path in self.data:
             del self.data[path]
+            self._index_remove(path)
             return True
         return False
     
-    def add_subtree(self, path: str,subtree: List[Dict[str, Any]]):
-        """Add a subtree to a specific path."""
+    def add_subtree(self, path: str,subtree: List[Dict[str, Any]], copy_policy: Union[None, bool, str] = None):
+        """Add a subtree to a specific path; copy_policy overrides the storage's policy for the stores."""
         if not self._validate_path(path):
             raise ValueError(f"Invalid ltree path: {path}")
         if self.exists(path) == False:
             raise ValueError(f"Path {path} does not exist")
 
         for node in subtree:
-            self.store(path + '.' + node['path'], node['data'])
+            self.store(path + '.' + node['path'], node['data'], copy_policy=copy_policy)
         return  True
     
     def delete_subtree(self, path: str) -> int:
         """Delete a node and all its descendants."""
-        to_delete = [path] if path in self.data else []
-        
-        # Find all descendants
-        for stored_path in self.data.keys():
-            if self.ltree_descendant(stored_path, path):
-                to_delete.append(stored_path)
-        
-        # Delete them
-        for delete_path in to_delete:
-            if delete_path in self.data:
-                del self.data[delete_path]
-        
-        return len(to_delete)
+        start, end = self._subtree_range(path)
+        paths = self._paths
+        for delete_path in paths[start:end]:
+            del self.data[delete_path]
+            self._labels_remove(delete_path)
+        del paths[start:end]
+        return end - start
     
     # PostgreSQL integration
     @contextmanager
@@ -717,12 +1181,10 @@ class FullLtreeStorage:
         depths = [self.nlevel(path) for path in self.data.keys()]
         root_nodes = sum(1 for path in self.data.keys() if self.nlevel(path) == 1)
         
-        # Count leaf nodes (nodes with no children)
-        leaf_nodes = 0
-        for path in self.data.keys():
-            has_children = any(self.ltree_ancestor(path, other_path) for other_path in self.data.keys())
-            if not has_children:
-                leaf_nodes += 1
+        # Count leaf nodes (nodes with no children); a node's first descendant follows it in path order
+        paths = self._sorted_paths()
+        leaf_nodes = sum(1 for index, path in enumerate(paths)
+                         if index + 1 == len(paths) or not paths[index + 1].startswith(path + '.'))
         
         return {
             'total_nodes': len(self.data),
@@ -735,6 +1197,10 @@ class FullLtreeStorage:
     def clear(self) -> None:
         """Clear all data."""
         self.data.clear()
+        self._paths.clear()
+        self._added.clear()
+        self._removed.clear()
+        self._label_paths.clear()
     
     def size(self) -> int:
         """Get the number of nodes."""
@@ -742,7 +1208,7 @@ class FullLtreeStorage:
     
     def get_all_paths(self) -> List[str]:
         """Get all paths sorted."""
-        return sorted(self.data.keys())
+        return list(self._sorted_paths())
 
 
 # Example usage and comprehensive testing
@@ -0,0 +1,280 @@
+"""
+Chain flow benchmark suite
+
+Runs the engine on a simulated clock, so timer driven chains finish in
+seconds, and reports the wall time of the engine itself.
+
+    python cf_benchmark.py                     # run and print the results
+    python cf_benchmark.py --json run.json     # also save them
+    python cf_benchmark.py --compare base.json # compare against a saved run
+    python cf_benchmark.py --quick --only dispatch,churn
+
+Results saved from one commit can be compared with a run of another; the
+ratio column is new time / old time, so values below 1 are speedups.
+Trees without cf_clock.SimulatedClock or ChainFlow.run_ticks() (before the
+engine clock was added) are run through their public methods instead:
+the engine passes are driven with send_system_event() and
+execute_system_event_loop() on real time, which the benchmarks here do
+not depend on.
+"""
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List
+
+from chain_flow import ChainFlow
+from op_codes import Opcodes
+from cf_events import Event
+
+try:
+    from cf_clock import SimulatedClock
+except ImportError:  # trees before the engine clock
+    SimulatedClock = None
+
+
+def build_engine():
+    """Return a ChainFlow on a simulated clock, if the tree has one, with its Opcodes"""
+    if SimulatedClock is None:
+        cf = ChainFlow(lambda: None)
+    else:
+        cf = ChainFlow(lambda: None, clock=SimulatedClock())
+    cf.event_id_dict.add_event_id("BENCH_EVENT", "Benchmark Event")
+    return cf, Opcodes(cf)
+
+
+def start_engine(cf):
+    """Finalize the chains and start the engine, outside the timed section"""
+    cf.finalize()
+    if hasattr(cf, 'run_ticks'):
+        cf.run_ticks(0)
+    else:
+        cf.initialize_chains()
+
+
+def run_ticks(cf, ticks: int) -> None:
+    """Run ticks engine passes, as cf_engine_start() does on trees without run_ticks()"""
+    if hasattr(cf, 'run_ticks'):
+        cf.run_ticks(ticks)
+        return
+    for _ in range(ticks):
+        cf.send_system_event(Event("CF_TIMER_EVENT", {'delta_time': 0.0, 'time_stamp': time.time()}))
+        cf.execute_system_event_loop()
+
+
+def add_continue_elements(cf, count: int) -> None:
+    for _ in range(count):
+        cf.add_element(process_function=lambda element, event: "CF_CONTINUE")
+
+
+def bench_dispatch(size: Dict[str, int]) -> Dict[str, Any]:
+    """Cost of running one element on one event"""
+    elements = size['elements']
+    ticks = size['ticks']
+    cf, op = build_engine()
+    cf.define_chain("dispatch", auto_flag=True)
+    add_continue_elements(cf, elements)
+    op.asm_halt()
+    cf.end_chain()
+    start_engine(cf)
+    start = time.perf_counter()
+    run_ticks(cf, ticks)
+    elapsed = time.perf_counter() - start
+    return {'value': elapsed / (ticks * (elements + 1)) * 1e9, 'unit': 'ns/element'}
+
+
+def bench_scaling(size: Dict[str, int]) -> Dict[str, Any]:
+    """Tick cost for N chains of M elements all reacting to the timer"""
+    chains = size['chains']
+    elements = size['elements']
+    ticks = size['ticks']
+    cf, op = build_engine()
+    for index in range(chains):
+        cf.define_chain(f"chain_{index}", auto_flag=True)
+        add_continue_elements(cf, elements - 1)
+        op.asm_wait_for_event("CF_TIMER_EVENT", event_count=ticks * 10)
+        cf.end_chain()
+    start_engine(cf)
+    start = time.perf_counter()
+    run_ticks(cf, ticks)
+    elapsed = time.perf_counter() - start
+    return {'value': elapsed / ticks * 1e6, 'unit': 'us/tick'}
+
+
+def bench_callbacks(size: Dict[str, int]) -> Dict[str, Any]:
+    """Throughput of events sent to chain named queues"""
+    chains = size['chains']
+    events = size['events']
+    cf, op = build_engine()
+    for index in range(chains):
+        cf.define_chain(f"chain_{index}", auto_flag=True)
+        op.asm_wait_for_event("BENCH_EVENT", event_count=events * 10)
+        cf.end_chain()
+    start_engine(cf)
+    chain_names = list(cf.list_of_chains)
+    event = Event("BENCH_EVENT", None)
+    start = time.perf_counter()
+    for _ in range(events // chains):
+        for chain_name in chain_names:
+            cf.send_named_queue_event(chain_name, event)
+        run_ticks(cf, 1)
+    elapsed = time.perf_counter() - start
+    sent = (events // chains) * chains
+    return {'value': elapsed / sent * 1e9, 'unit': 'ns/event'}
+
+
+def bench_population(size: Dict[str, int]) -> Dict[str, Any]:
+    """Tick cost with parked asm_wait_time, asm_verify and watch dog chains"""
+    chains = size['chains']
+    ticks = size['ticks']
+    kind = size['kind']
+    cf, op = build_engine()
+    for index in range(chains):
+        cf.define_chain(f"chain_{index}", auto_flag=True)
+        if kind == "wait":
+            op.asm_wait_time(1.0 + index % 50)
+        elif kind == "verify":
+            op.asm_verify(lambda fn_data, event: True, timeout=ticks * 10)
+            op.asm_wait_for_event("BENCH_EVENT")
+        else:
+            op.asm_watch_dog("BENCH_EVENT", "BENCH_EVENT", "BENCH_EVENT", "CF_TIMER_EVENT", ticks * 10)
+            op.asm_wait_for_event("BENCH_EVENT")
+        op.asm_halt()
+        cf.end_chain()
+    start_engine(cf)
+    start = time.perf_counter()
+    run_ticks(cf, ticks)
+    elapsed = time.perf_counter() - start
+    return {'value': elapsed / ticks * 1e6, 'unit': 'us/tick'}
+
+
+def bench_churn(size: Dict[str, int]) -> Dict[str, Any]:
+    """Cost of a disable_chain / enable_chain pair"""
+    chains = size['chains']
+    rounds = size['rounds']
+    cf, op = build_engine()
+    for index in range(chains):
+        cf.define_chain(f"chain_{index}", auto_flag=True)
+        add_continue_elements(cf, 4)
+        op.asm_wait_for_event("BENCH_EVENT")
+        cf.end_chain()
+    start_engine(cf)
+    chain_names = list(cf.list_of_chains)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for chain_name in chain_names:
+            cf.disable_chain(chain_name)
+            cf.enable_chain(chain_name)
+        run_ticks(cf, 1)
+    elapsed = time.perf_counter() - start
+    return {'value': elapsed / (rounds * chains) * 1e9, 'unit': 'ns/cycle'}
+
+
+# name to (function, full sizes, quick sizes)
+BENCHMARKS = {
+    'dispatch': (bench_dispatch,
+                 [{'elements': 10, 'ticks': 2000}, {'elements': 100, 'ticks': 500}],
+                 [{'elements': 10, 'ticks': 200}]),
+    'scaling': (bench_scaling,
+                [{'chains': chains, 'elements': elements, 'ticks': 50}
+                 for chains in (10, 100, 1000) for elements in (1, 10)],
+                [{'chains': chains, 'elements': 10, 'ticks': 10} for chains in (10, 100)]),
+    'callbacks': (bench_callbacks,
+                  [{'chains': 1, 'events': 20000}, {'chains': 100, 'events': 20000}],
+                  [{'chains': 10, 'events': 2000}]),
+    'population': (bench_population,
+                   [{'kind': kind, 'chains': chains, 'ticks': 100}
+                    for kind in ("wait", "verify", "watch_dog") for chains in (100, 1000, 10000)],
+                   [{'kind': kind, 'chains': 100, 'ticks': 20} for kind in ("wait", "verify", "watch_dog")]),
+    'churn': (bench_churn,
+              [{'chains': 100, 'rounds': 50}, {'chains': 1000, 'rounds': 10}],
+              [{'chains': 100, 'rounds': 5}]),
+}
+
+
+def run_benchmarks(names: List[str], quick: bool = False, repeat: int = 3) -> List[Dict[str, Any]]:
+    """
+    Run benchmarks, keeping the best of repeat runs for each size
+
+    Returns:
+        List of dicts with name, params, value, unit and the runs
+    """
+    results = []
+    for name in names:
+        function, sizes, quick_sizes = BENCHMARKS[name]
+        for size in (quick_sizes if quick else sizes):
+            runs = [function(size) for _ in range(repeat)]
+            values = [run['value'] for run in runs]
+            results.append({
+                'name': name,
+                'params': size,
+                'value': min(values),
+                'median': statistics.median(values),
+                'unit': runs[0]['unit'],
+            })
+    return results
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _key(result: Dict[str, Any]) -> str:
+    return result['name'] + json.dumps(result['params'], sort_keys=True)
+
+
+def format_results(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]] = None) -> str:
+    """Return the results as a text table, with ratios to baseline if given"""
+    old = {_key(result): result for result in baseline or []}
+    lines = []
+    for result in results:
+        params = " ".join(f"{key}={value}" for key, value in result['params'].items())
+        line = f"{result['name']:<11} {params:<36} {result['value']:>12.2f} {result['unit']:<11}"
+        previous = old.get(_key(result))
+        if previous is not None and previous['value'] > 0:
+            line += f" {previous['value']:>12.2f} x{result['value'] / previous['value']:.2f}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Chain flow benchmark suite")
+    parser.add_argument("--quick", action="store_true", help="small sizes for a smoke run")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per size, the best is kept")
+    parser.add_argument("--only", help="comma separated benchmarks: " + ",".join(BENCHMARKS))
+    parser.add_argument("--json", dest="json_path", help="save the results to this file")
+    parser.add_argument("--compare", help="results file of an earlier run to compare with")
+    args = parser.parse_args(argv)
+
+    names = list(BENCHMARKS) if args.only is None else args.only.split(",")
+    for name in names:
+        if name not in BENCHMARKS:
+            parser.error(f"unknown benchmark '{name}'")
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)['results']
+
+    results = run_benchmarks(names, args.quick, args.repeat)
+    print(format_results(results, baseline))
+    if args.json_path:
+        with open(args.json_path, "w") as file:
+            json.dump({
+                'commit': _git_commit(),
+                'python': platform.python_version(),
+                'time_stamp': time.time(),
+                'quick': args.quick,
+                'results': results,
+            }, file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
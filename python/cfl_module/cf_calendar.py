@@ -0,0 +1,262 @@
+"""
+Chain flow calendar - second / minute / hour / day boundaries and cron schedules
+"""
+import math
+from datetime import datetime, date, timedelta, time as day_time, tzinfo
+from typing import List, Optional, Union
+
+from cf_events import Event
+
+
+def resolve_timezone(timezone: Union[None, str, tzinfo]) -> Optional[tzinfo]:
+    """
+    Return the tzinfo for a timezone, None for the local time of the host
+
+    Args:
+        timezone: None, an IANA name such as "Europe/Paris", or a tzinfo
+
+    Raises:
+        ValueError: If the name is not a known timezone
+        TypeError: If timezone is neither a string nor a tzinfo
+    """
+    if timezone is None or isinstance(timezone, tzinfo):
+        return timezone
+    if not isinstance(timezone, str):
+        raise TypeError("timezone must be None, a timezone name or a tzinfo")
+    from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+    try:
+        return ZoneInfo(timezone)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Unknown timezone '{timezone}'")
+
+
+def _local(timestamp: float, tz: Optional[tzinfo]) -> datetime:
+    """Wall clock time of a timestamp, naive in the host's local time when tz is None"""
+    return datetime.fromtimestamp(timestamp, tz)
+
+
+def _wall_timestamp(wall: datetime, tz: Optional[tzinfo]) -> float:
+    """Timestamp of a naive wall clock time in tz"""
+    return wall.replace(tzinfo=tz).timestamp() if tz is not None else wall.timestamp()
+
+
+class CalendarScheduler:
+    """
+    Generates CF_SECOND_EVENT, CF_MINUTE_EVENT, CF_HOUR_EVENT and CF_DAY_EVENT
+
+    The timestamps of the next boundaries are computed ahead, so a tick
+    that crosses none of them costs a single comparison.  When the clock
+    jumps over several boundaries of a kind, one event of that kind is
+    generated.  Minutes, hours and days follow the wall clock of the
+    timezone, including daylight saving changes.
+    """
+
+    def __init__(self, timezone: Union[None, str, tzinfo] = None):
+        """
+        Initialize a CalendarScheduler
+
+        Args:
+            timezone: None for the host's local time, an IANA name or a tzinfo
+        """
+        self.tz = resolve_timezone(timezone)
+        self.next_boundary = math.inf
+        self._next_minute = math.inf
+        self._next_hour = math.inf
+        self._next_day = math.inf
+
+    def set_timezone(self, timezone: Union[None, str, tzinfo], now: float) -> None:
+        """Change the timezone and recompute the boundaries after now"""
+        self.tz = resolve_timezone(timezone)
+        self.reset(now)
+
+    def reset(self, now: float) -> None:
+        """Compute the boundaries after now without generating events"""
+        self._next_minute = self._minute_after(now)
+        self._next_hour = self._hour_after(now)
+        self._next_day = self._day_after(now)
+        self.next_boundary = math.floor(now) + 1
+
+    def _minute_after(self, now: float) -> float:
+        # timezone offsets are whole minutes
+        return (math.floor(now) // 60 + 1) * 60
+
+    def _hour_after(self, now: float) -> float:
+        minute = self._minute_after(now)
+        minute += (60 - _local(minute, self.tz).minute) % 60 * 60
+        # a daylight saving shift that is not a whole hour moves the local hour start
+        for _ in range(60):
+            if _local(minute, self.tz).minute == 0:
+                return minute
+            minute += 60
+        return minute
+
+    def _day_after(self, now: float) -> float:
+        tomorrow = _local(now, self.tz).date() + timedelta(days=1)
+        return _wall_timestamp(datetime.combine(tomorrow, day_time()), self.tz)
+
+    def advance(self, now: float) -> List[Event]:
+        """
+        Return the events of the boundaries crossed up to now
+
+        Returns:
+            List of events, seconds first, empty if now is before next_boundary
+        """
+        if now < self.next_boundary:
+            return []
+        local = _local(now, self.tz)
+        events = [Event.trusted("CF_SECOND_EVENT", {'second': local.second, 'time_stamp': now})]
+        self.next_boundary = math.floor(now) + 1
+        if now >= self._next_minute:
+            self._next_minute = self._minute_after(now)
+            events.append(Event.trusted("CF_MINUTE_EVENT", {'minute': local.minute, 'time_stamp': now}))
+            if now >= self._next_hour:
+                self._next_hour = self._hour_after(now)
+                events.append(Event.trusted("CF_HOUR_EVENT", {'hour': local.hour, 'time_stamp': now}))
+                if now >= self._next_day:
+                    self._next_day = self._day_after(now)
+                    events.append(Event.trusted("CF_DAY_EVENT", {'day': local.day, 'weekday': local.weekday(),
+                                                                 'date': local.date(), 'time_stamp': now}))
+        return events
+
+    def __repr__(self):
+        return f"CalendarScheduler(tz={self.tz}, next_boundary={self.next_boundary})"
+
+
+_MONTH_NAMES = {name: index + 1 for index, name in enumerate(
+    ("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"))}
+_DAY_NAMES = {name: index for index, name in enumerate(("sun", "mon", "tue", "wed", "thu", "fri", "sat"))}
+_MACROS = {
+    "@yearly": "0 0 1 1 *",
+    "@annually": "0 0 1 1 *",
+    "@monthly": "0 0 1 * *",
+    "@weekly": "0 0 * * 0",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@hourly": "0 * * * *",
+}
+_MONTH_DAYS = (31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+# give up looking for a matching minute after this many years
+_SEARCH_YEARS = 8
+
+
+class CronSchedule:
+    """
+    Five field cron expression: minute hour day-of-month month day-of-week
+
+    Each field is "*", a value, a range "a-b", a step "*/n" or "a-b/n", or a
+    comma separated list of those.  Months and days of the week also take
+    three letter names; day of week 0 and 7 are both Sunday.  As in cron,
+    when both day fields are restricted a day matching either one matches.
+    The macros @yearly, @monthly, @weekly, @daily, @midnight and @hourly
+    are accepted.
+    """
+
+    def __init__(self, expression: str):
+        """
+        Initialize a CronSchedule
+
+        Raises:
+            ValueError: If the expression is malformed or can never match
+        """
+        if not isinstance(expression, str):
+            raise TypeError("expression must be a string")
+        self.expression = expression
+        fields = _MACROS.get(expression.strip().lower(), expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression '{expression}' must have 5 fields")
+        self.minutes = self._parse_field(fields[0], 0, 59)
+        self.hours = self._parse_field(fields[1], 0, 23)
+        self.days = self._parse_field(fields[2], 1, 31)
+        self.months = self._parse_field(fields[3], 1, 12, _MONTH_NAMES)
+        weekdays = self._parse_field(fields[4], 0, 7, _DAY_NAMES)
+        # cron counts from Sunday, datetime.weekday() from Monday
+        self.weekdays = frozenset((day - 1) % 7 for day in weekdays)
+        self.days_restricted = not fields[2].startswith("*")
+        self.weekdays_restricted = not fields[4].startswith("*")
+        if (self.days_restricted and not self.weekdays_restricted
+                and min(self.days) > max(_MONTH_DAYS[month - 1] for month in self.months)):
+            raise ValueError(f"Cron expression '{expression}' never matches")
+
+    def _parse_field(self, field: str, low: int, high: int, names: dict = None) -> frozenset:
+        values = set()
+        for part in field.lower().split(","):
+            step = 1
+            if "/" in part:
+                part, step_text = part.split("/", 1)
+                step = self._parse_value(step_text, 1, high - low + 1, None, field)
+            if part == "*":
+                start, end = low, high
+            elif "-" in part:
+                start_text, end_text = part.split("-", 1)
+                start = self._parse_value(start_text, low, high, names, field)
+                end = self._parse_value(end_text, low, high, names, field)
+                if end < start:
+                    raise ValueError(f"Invalid range '{part}' in cron field '{field}'")
+            else:
+                start = self._parse_value(part, low, high, names, field)
+                end = high if step != 1 else start
+            values.update(range(start, end + 1, step))
+        return frozenset(values)
+
+    @staticmethod
+    def _parse_value(text: str, low: int, high: int, names: Optional[dict], field: str) -> int:
+        if names is not None and text in names:
+            return names[text]
+        if not text.isdigit():
+            raise ValueError(f"Invalid value '{text}' in cron field '{field}'")
+        value = int(text)
+        if not low <= value <= high:
+            raise ValueError(f"Value {value} out of range {low}-{high} in cron field '{field}'")
+        return value
+
+    def _day_matches(self, day: date) -> bool:
+        in_days = day.day in self.days
+        in_weekdays = day.weekday() in self.weekdays
+        if self.days_restricted and self.weekdays_restricted:
+            return in_days or in_weekdays
+        return in_days and in_weekdays
+
+    def matches(self, wall: datetime) -> bool:
+        """Return True if the schedule fires in the minute of a wall clock time"""
+        return (wall.minute in self.minutes and wall.hour in self.hours
+                and wall.month in self.months and self._day_matches(wall.date()))
+
+    def next_after(self, now: float, timezone: Union[None, str, tzinfo] = None) -> Optional[float]:
+        """
+        Return the timestamp of the first matching minute after now
+
+        Wall clock minutes skipped by a daylight saving change do not fire,
+        and a repeated wall clock minute fires once.
+
+        Args:
+            now (float): Timestamp in seconds
+            timezone: None for the host's local time, an IANA name or a tzinfo
+
+        Returns:
+            float, or None if nothing matches within the next years
+        """
+        tz = resolve_timezone(timezone)
+        wall = _local(now, tz).replace(second=0, microsecond=0, tzinfo=None) + timedelta(minutes=1)
+        end_year = wall.year + _SEARCH_YEARS
+        while wall.year < end_year:
+            if wall.month not in self.months:
+                wall = datetime(wall.year + (wall.month == 12), wall.month % 12 + 1, 1)
+                continue
+            if not self._day_matches(wall.date()):
+                wall = datetime.combine(wall.date() + timedelta(days=1), day_time())
+                continue
+            if wall.hour not in self.hours:
+                wall = wall.replace(minute=0) + timedelta(hours=1)
+                continue
+            if wall.minute not in self.minutes:
+                wall += timedelta(minutes=1)
+                continue
+            timestamp = _wall_timestamp(wall, tz)
+            # skip wall times that do not exist or were already passed
+            if timestamp > now and _local(timestamp, tz).replace(tzinfo=None) == wall:
+                return timestamp
+            wall += timedelta(minutes=1)
+        return None
+
+    def __repr__(self):
+        return f"CronSchedule('{self.expression}')"
@@ -0,0 +1,84 @@
+"""
+Chain flow clocks - the time source of a ChainFlow and its opcodes
+"""
+import time
+from typing import Optional
+
+
+class SystemClock:
+    """Wall clock time; the default clock of a ChainFlow"""
+
+    simulated = False
+
+    def time(self) -> float:
+        """Return the current time in seconds since the epoch"""
+        return time.time()
+
+    def sleep(self, seconds: float) -> None:
+        """Block the calling thread for seconds"""
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def __repr__(self):
+        return "SystemClock()"
+
+
+class SimulatedClock:
+    """
+    Clock that only moves when the engine or the caller advances it
+
+    The engines never block on a simulated clock: where they would sleep
+    until the next tick, timeout deadline or calendar boundary they advance
+    the clock straight to it instead, so chains waiting for minutes or days
+    run as fast as the dispatching allows.  Events posted from other
+    threads are still drained on every wake up, but the engine does not
+    wait for them.
+    """
+
+    simulated = True
+    # smallest step taken by sleep(), so float rounding at a deadline
+    # can not leave the engine spinning just short of it
+    resolution = 1e-6
+
+    def __init__(self, start: Optional[float] = None, tick_period: float = 0.1):
+        """
+        Initialize a SimulatedClock
+
+        Args:
+            start (float, optional): Starting time in seconds since the epoch,
+                defaults to the current wall clock time
+            tick_period (float): Seconds cf_engine_start() advances the clock
+                per engine pass, in place of calling time_tick()
+        """
+        if tick_period <= 0:
+            raise ValueError("tick_period must be positive")
+        self.now = time.time() if start is None else float(start)
+        self.tick_period = tick_period
+
+    def time(self) -> float:
+        """Return the simulated time in seconds since the epoch"""
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        """Advance the clock by seconds instead of blocking"""
+        if seconds > 0:
+            self.now += max(seconds, self.resolution)
+
+    def advance(self, seconds: float) -> None:
+        """
+        Advance the clock by seconds
+
+        Raises:
+            ValueError: If seconds is negative
+        """
+        if seconds < 0:
+            raise ValueError("a clock can not move backwards")
+        self.now += seconds
+
+    def advance_to(self, when: float) -> None:
+        """Advance the clock to the time when, if it is in the future"""
+        if when > self.now:
+            self.now = float(when)
+
+    def __repr__(self):
+        return f"SimulatedClock(now={self.now})"
@@ -3,7 +3,8 @@ Event-driven processing system with dual queue architecture
 """
 
 from collections import deque
-from typing import Any, Optional, List
+from typing import Any, Optional, List, Tuple
+from queue import SimpleQueue, Empty
 import threading
 
 class Event_id_dict():
@@ -32,7 +33,9 @@ class Event_id_dict():
 class Event:
     """Event class to encapsulate event data and metadata"""
     
-    def __init__(self, event_id: str, data: Any):
+    __slots__ = ('event_id', 'data')
+    
+    def __init__(self, event_id: str, data: Any = None):
         """
         Initialize an Event
         
@@ -49,6 +52,18 @@ class Event:
         self.event_id = event_id.strip()
         self.data = data
     
+    @classmethod
+    def trusted(cls, event_id: str, data: Any = None) -> "Event":
+        """
+        Build an Event without validating event_id
+        
+        For engine generated events whose ids are known to be valid.
+        """
+        event = object.__new__(cls)
+        event.event_id = event_id
+        event.data = data
+        return event
+    
     def __repr__(self):
         return f"Event(event_id='{self.event_id}', data={self.data})"
     
@@ -119,6 +134,32 @@ class EventQueue:
                 return None
             return self._queue.popleft()
     
+    def drain(self, max_n: Optional[int] = None) -> deque:
+        """
+        Remove and return events in queue order
+        
+        When the whole queue is taken the deque itself is swapped out in
+        one operation.
+        
+        Args:
+            max_n (int, optional): Maximum number of events, None for all
+            
+        Returns:
+            deque: Removed events, oldest first
+        """
+        with self._lock:
+            if max_n is None or max_n >= len(self._queue):
+                drained = self._queue
+                self._queue = deque()
+                return drained
+            popleft = self._queue.popleft
+            return deque(popleft() for _ in range(max_n))
+    
+    def push_front(self, events) -> None:
+        """Put events back at the head of the queue, keeping their order"""
+        with self._lock:
+            self._queue.extendleft(reversed(events))
+    
     def peek(self) -> Optional[Event]:
         """
         Look at the next event without removing it
@@ -191,11 +232,78 @@ class EventQueue:
         return f"EventQueue(name='{self.name}', size={self.size()}, max_size={self.max_size})"
 
 
+class UnlockedEventQueue(EventQueue):
+    """
+    Event queue owned by a single thread
+
+    Same interface as EventQueue without the lock; only the engine thread
+    may touch it.  Other threads hand events over through the thread safe
+    ingress of DualEventQueueSystem.
+    """
+    
+    def enqueue(self, event: Event) -> bool:
+        if not isinstance(event, Event):
+            raise TypeError("event must be an Event instance")
+        if self.max_size is not None and len(self._queue) >= self.max_size:
+            return False  # Queue is full
+        self._queue.append(event)
+        self._event_count += 1
+        return True
+    
+    def dequeue(self) -> Optional[Event]:
+        if not self._queue:
+            return None
+        return self._queue.popleft()
+    
+    def drain(self, max_n: Optional[int] = None) -> deque:
+        if max_n is None or max_n >= len(self._queue):
+            drained = self._queue
+            self._queue = deque()
+            return drained
+        popleft = self._queue.popleft
+        return deque(popleft() for _ in range(max_n))
+    
+    def push_front(self, events) -> None:
+        self._queue.extendleft(reversed(events))
+    
+    def peek(self) -> Optional[Event]:
+        if not self._queue:
+            return None
+        return self._queue[0]
+    
+    def size(self) -> int:
+        return len(self._queue)
+    
+    def is_empty(self) -> bool:
+        return not self._queue
+    
+    def is_full(self) -> bool:
+        return self.max_size is not None and len(self._queue) >= self.max_size
+    
+    def clear(self) -> int:
+        cleared_count = len(self._queue)
+        self._queue.clear()
+        return cleared_count
+    
+    def get_all_events(self) -> List[Event]:
+        return list(self._queue)
+    
+    def get_stats(self) -> dict:
+        return {
+            'name': self.name,
+            'current_size': len(self._queue),
+            'max_size': self.max_size,
+            'total_events_processed': self._event_count,
+            'is_empty': len(self._queue) == 0,
+            'is_full': self.is_full()
+        }
+
+
 class DualEventQueueSystem:
     """System managing both normal and callback event queues"""
     
     def __init__(self,chain_list: List[str], normal_queue_max_size: Optional[int] = None, 
-                 callback_queue_max_size: Optional[int] = None):
+                 callback_queue_max_size: Optional[int] = None, lock_free: bool = False):
         """
         Initialize the dual queue system
         
@@ -203,6 +311,8 @@ class DualEventQueueSystem:
             chain_list (List[str]): List of chain names
             normal_queue_max_size (int, optional): Max size for normal events queue
             callback_queue_max_size (int, optional): Max size for callback events queue
+            lock_free (bool): Use unlocked queues owned by the engine thread; other
+                threads must use post_normal_event/post_callback_event
         """
         if not isinstance(chain_list, list):
             raise TypeError("chain_list must be a list")
@@ -210,23 +320,87 @@ class DualEventQueueSystem:
             raise TypeError("chain_list must contain only strings")
         if not chain_list:
             raise ValueError("chain_list cannot be empty")
-        self.chain_list = chain_list
-        self.normal_events = EventQueue("normal_events", normal_queue_max_size)
+        self.chain_list = list(chain_list)
+        self.lock_free = lock_free
+        self.callback_queue_max_size = callback_queue_max_size
+        self._queue_class = UnlockedEventQueue if lock_free else EventQueue
+        self.normal_events = self._queue_class("normal_events", normal_queue_max_size)
         self.callback_events = {}
         for chain_name in chain_list:
-            self.callback_events[chain_name]  = EventQueue(chain_name, callback_queue_max_size)
+            self.callback_events[chain_name]  = self._queue_class(chain_name, callback_queue_max_size)
+        # Thread safe hand over of (chain_name or None, event) from other threads
+        self._ingress = SimpleQueue()
        
     
+    def add_chain(self, chain_name: str) -> None:
+        """Add the callback queue of a chain"""
+        if chain_name in self.callback_events:
+            raise ValueError(f"Chain '{chain_name}' already has a callback queue")
+        self.chain_list.append(chain_name)
+        self.callback_events[chain_name] = self._queue_class(chain_name, self.callback_queue_max_size)
+    
+    def remove_chain(self, chain_name: str) -> None:
+        """Drop the callback queue of a chain with its queued events"""
+        if chain_name not in self.callback_events:
+            raise ValueError(f"Chain '{chain_name}' does not exist")
+        del self.callback_events[chain_name]
+        self.chain_list.remove(chain_name)
+    
     def add_normal_event(self, event: Event) -> bool:
         """Add event to normal events queue"""
         return self.normal_events.enqueue(event)
     
     def add_callback_event(self,chain_name  : str, event: Event) -> bool:
         """Add event to callback events queue"""
-        if chain_name not in self.chain_list:
+        callback_queue = self.callback_events.get(chain_name)
+        if callback_queue is None:
+            raise ValueError(f"Chain '{chain_name}' does not exist")
+        
+        return callback_queue.enqueue(event)
+    
+    def post_normal_event(self, event: Event) -> None:
+        """Hand a normal event over from any thread; queued by drain_ingress()"""
+        if not isinstance(event, Event):
+            raise TypeError("event must be an Event instance")
+        self._ingress.put((None, event))
+    
+    def post_callback_event(self, chain_name: str, event: Event) -> None:
+        """Hand a callback event over from any thread; queued by drain_ingress()"""
+        if chain_name not in self.callback_events:
             raise ValueError(f"Chain '{chain_name}' does not exist")
+        if not isinstance(event, Event):
+            raise TypeError("event must be an Event instance")
+        self._ingress.put((chain_name, event))
+    
+    def post_wakeup(self) -> None:
+        """Wake a drain_ingress() blocked waiting; returned as (None, None)"""
+        self._ingress.put((None, None))
+    
+    def drain_ingress(self, wait: Optional[float] = None) -> List[Tuple[Optional[str], Event]]:
+        """
+        Remove every event posted from other threads
         
-        return self.callback_events[chain_name].enqueue(event)
+        Args:
+            wait (float, optional): Seconds to block for a first event when
+                none is posted; None returns immediately
+        
+        Returns:
+            List of (chain_name, event) in posting order; chain_name is None
+            for normal events
+        """
+        posted = []
+        if wait is not None and wait > 0:
+            try:
+                posted.append(self._ingress.get(timeout=wait))
+            except Empty:
+                return posted
+        ingress_get = self._ingress.get_nowait
+        try:
+            while True:
+                posted.append(ingress_get())
+        except Empty:
+            pass
+        return posted
     
     def get_next_normal_event(self) -> Optional[Event]:
         """Get next event from normal events queue"""
@@ -234,10 +408,26 @@ class DualEventQueueSystem:
     
     def get_next_callback_event(self,chain_name: str) -> Optional[Event]:
         """Get next event from callback events queue"""
-        if chain_name not in self.chain_list:
+        callback_queue = self.callback_events.get(chain_name)
+        if callback_queue is None:
             raise ValueError(f"Chain '{chain_name}' does not exist")
         
-        return self.callback_events[chain_name].dequeue()   
+        return callback_queue.dequeue()
+    
+    def drain_normal(self, max_n: Optional[int] = None) -> deque:
+        """Remove up to max_n events (all if None) from the normal events queue"""
+        return self.normal_events.drain(max_n)
+    
+    def restore_normal(self, events) -> None:
+        """Put undispatched events back at the head of the normal events queue"""
+        self.normal_events.push_front(events)
+    
+    def drain_callbacks(self, chain_name: str) -> deque:
+        """Remove every event from a chain's callback events queue"""
+        callback_queue = self.callback_events.get(chain_name)
+        if callback_queue is None:
+            raise ValueError(f"Chain '{chain_name}' does not exist")
+        return callback_queue.drain()
     
     def has_normal_events(self) -> bool:
         """Check if normal events queue has events"""
@@ -245,9 +435,10 @@ class DualEventQueueSystem:
     
     def has_callback_events(self,chain_name: str) -> bool:
         """Check if callback events queue has events"""
-        if chain_name not in self.chain_list:
+        callback_queue = self.callback_events.get(chain_name)
+        if callback_queue is None:
             raise ValueError(f"Chain '{chain_name}' does not exist")
-        return not self.callback_events[chain_name].is_empty()
+        return not callback_queue.is_empty()
     
     def clear_normal_events(self) -> int:
         """Clear normal events queue"""
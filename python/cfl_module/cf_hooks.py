@@ -0,0 +1,54 @@
+"""
+Chain flow hook layers - instrumentation stacked on a ChainFlow's methods
+"""
+
+
+class HookLayer:
+    """
+    Base of the opt-in layers that shadow ChainFlow methods (profiler, metrics, journal)
+
+    A subclass lists the method names it shadows in _hooked and defines
+    methods of the same names, which continue with self._next[name].
+    attach() sets them as instance attributes of the ChainFlow, so the
+    engine runs the plain methods when no layer is attached.  Layers stack:
+    the method bound before attach(), which may be another layer's, is
+    what self._next calls and what detach() restores.  Layers must be
+    detached in the reverse order; detaching one while a later layer still
+    shadows one of its methods raises RuntimeError rather than dropping
+    that layer's hooks.
+    """
+
+    _hooked = ()
+
+    def attach(self) -> None:
+        """Swap the layer's methods into the ChainFlow"""
+        if self.attached:
+            return
+        cf = self.cf
+        # the methods bound before attaching, which may be another layer's
+        self._saved = {name: vars(cf).get(name) for name in self._hooked}
+        self._next = {name: getattr(cf, name) for name in self._hooked}
+        for name in self._hooked:
+            setattr(cf, name, getattr(self, name))
+        self.attached = True
+
+    def detach(self) -> None:
+        """
+        Restore the methods bound before attach()
+
+        Raises:
+            RuntimeError: if a layer attached after this one is still attached
+        """
+        if not self.attached:
+            return
+        cf = self.cf
+        for name in self._hooked:
+            if vars(cf).get(name) != getattr(self, name):
+                raise RuntimeError(f"{name} was hooked after the {type(self).__name__} attached; "
+                                   "detach that layer first")
+        for name, method in self._saved.items():
+            if method is None:
+                del cf.__dict__[name]
+            else:
+                setattr(cf, name, method)
+        self.attached = False
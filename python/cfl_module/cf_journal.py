@@ -0,0 +1,642 @@
+"""
+Chain flow event journal - write ahead log of the events sent to a ChainFlow, and its replay
+"""
+import asyncio
+import io
+import itertools
+import math
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+import zlib
+from collections import namedtuple
+from concurrent.futures import Future
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from cf_clock import SimulatedClock
+from cf_events import Event
+from cf_hooks import HookLayer
+
+MAGIC = b"CFJ1"
+SEGMENT_SUFFIX = ".cfj"
+# payload length, crc32 of the rest of the frame, sequence, engine time, tick count, flags
+_FRAME = struct.Struct("<IIQdqB")
+_FRAME_HEAD = struct.Struct("<II")
+_FRAME_COVERED = struct.Struct("<QdqB")
+_CRC_OFFSET = _FRAME_HEAD.size  # the crc covers the frame from the sequence on
+
+FLAG_INTERNAL = 1  # sent by a chain, or an awaitable / offload completion
+FLAG_START = 2  # an engine started its chains; no event
+FLAG_UNRECORDED = 4  # the event data holds Unrecorded placeholders
+
+# events sent by the engine when work started by a chain completes
+_COMPLETION_EVENTS = frozenset(("CF_AWAIT_EVENT", "CF_OFFLOAD_EVENT"))
+_PLAIN_TYPES = frozenset((str, int, float, bool, type(None), bytes, dict, list, tuple, set, frozenset))
+
+JournalRecord = namedtuple("JournalRecord", "sequence time tick flags chain_name event_id data")
+JournalRecord.__doc__ = """
+A journal entry: chain_name is None for a system event, event_id is None
+for an engine start record
+"""
+
+_fdatasync = getattr(os, "fdatasync", os.fsync)
+
+
+class Unrecorded:
+    """Stands in for a part of the event data that could not be pickled"""
+
+    __slots__ = ("description",)
+
+    def __init__(self, description: str):
+        self.description = description
+
+    def __repr__(self):
+        return f"Unrecorded({self.description})"
+
+
+class _JournalPickler(pickle.Pickler):
+
+    def persistent_id(self, obj):
+        if type(obj) in _PLAIN_TYPES:
+            return None
+        if isinstance(obj, (Future, asyncio.Future)) or (callable(obj) and not isinstance(obj, type)):
+            return repr(obj)
+        try:
+            pickle.dumps(obj, protocol=5)
+        except Exception:
+            return repr(obj)
+        return None
+
+
+class _JournalUnpickler(pickle.Unpickler):
+
+    def persistent_load(self, pid):
+        return Unrecorded(pid)
+
+
+def _encode(chain_name: Optional[str], event: Event) -> Tuple[bytes, int]:
+    value = (chain_name, event.event_id, event.data)
+    try:
+        return pickle.dumps(value, protocol=5), 0
+    except Exception:
+        file = io.BytesIO()
+        _JournalPickler(file, protocol=5).dump(value)
+        return file.getvalue(), FLAG_UNRECORDED
+
+
+def _segment_path(directory: str, first_sequence: int) -> str:
+    return os.path.join(directory, f"{first_sequence:020d}{SEGMENT_SUFFIX}")
+
+
+def _sync_directory(directory: str) -> None:
+    """Make a new segment file itself durable; not supported on every platform"""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class JournalReader:
+    """
+    Reads the segments of a journal directory through mmap
+
+    Frames are checked against their crc and decoded straight from the
+    mapped file.  A segment ends at its first incomplete or corrupt frame,
+    which is where a crash interrupted the writer; the position is added
+    to damaged and reading carries on with the next segment.
+    """
+
+    def __init__(self, directory: str):
+        """
+        Initialize a JournalReader
+
+        Args:
+            directory (str): Journal directory written by an EventJournal
+        """
+        self.directory = directory
+        self.damaged = []  # (segment path, offset of the first bad frame)
+
+    def segments(self) -> List[Tuple[int, str]]:
+        """
+        Return (first sequence, path) of every segment, oldest first
+        """
+        segments = []
+        for name in os.listdir(self.directory):
+            stem, suffix = os.path.splitext(name)
+            if suffix == SEGMENT_SUFFIX and stem.isdigit():
+                segments.append((int(stem), os.path.join(self.directory, name)))
+        segments.sort()
+        return segments
+
+    def _frames(self, path: str, decode: bool = True) -> Iterator[JournalRecord]:
+        with open(path, "rb") as file:
+            if os.fstat(file.fileno()).st_size <= len(MAGIC):
+                return
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                if mapped[:len(MAGIC)] != MAGIC:
+                    raise ValueError(f"'{path}' is not a journal segment")
+                end = len(mapped)
+                offset = len(MAGIC)
+                with memoryview(mapped) as view:
+                    while offset < end:
+                        start = offset + _FRAME.size
+                        if start > end:
+                            self.damaged.append((path, offset))
+                            return
+                        length, crc, sequence, event_time, tick, flags = _FRAME.unpack_from(view, offset)
+                        stop = start + length
+                        if stop > end:
+                            self.damaged.append((path, offset))
+                            return
+                        with view[offset + _CRC_OFFSET:stop] as covered:
+                            valid = zlib.crc32(covered) == crc
+                        if not valid:
+                            self.damaged.append((path, offset))
+                            return
+                        chain_name = event_id = data = None
+                        if decode and not flags & FLAG_START:
+                            with view[start:stop] as payload:
+                                if flags & FLAG_UNRECORDED:
+                                    chain_name, event_id, data = _JournalUnpickler(io.BytesIO(payload)).load()
+                                else:
+                                    chain_name, event_id, data = pickle.loads(payload)
+                        yield JournalRecord(sequence, event_time, tick, flags, chain_name, event_id, data)
+                        offset = stop
+
+    def records(self, start_sequence: int = 0) -> Iterator[JournalRecord]:
+        """
+        Iterate the records from start_sequence on, in sequence order
+
+        Segments holding only earlier records are not opened.
+        """
+        segments = self.segments()
+        for index, (first_sequence, path) in enumerate(segments):
+            if index + 1 < len(segments) and segments[index + 1][0] <= start_sequence:
+                continue
+            for record in self._frames(path):
+                if record.sequence >= start_sequence:
+                    yield record
+
+    def __iter__(self) -> Iterator[JournalRecord]:
+        return self.records()
+
+    def last_sequence(self) -> Optional[int]:
+        """Return the sequence of the last intact record, None for an empty journal"""
+        for _, path in reversed(self.segments()):
+            last = None
+            for record in self._frames(path, decode=False):
+                last = record.sequence
+            if last is not None:
+                return last
+        return None
+
+
+class EventJournal(HookLayer):
+    """
+    Write ahead journal of the events accepted by a ChainFlow
+
+    Every event accepted by send_system_event(), send_named_queue_event()
+    or drained from the post_* methods is appended with its sequence
+    number, engine time and tick count, and each engine start adds a start
+    record.  Events sent by chains while they run, and the completion
+    events of awaitables and offloaded work, are flagged internal: replay
+    does not feed them back, the chains generate them again.
+
+    As a HookLayer, the journal hooks the ChainFlow methods as instance
+    attributes while attached.  The engine thread only pickles and frames
+    an event; a writer thread appends the frames and syncs them to disk in
+    groups, every commit_interval seconds or once commit_bytes are pending,
+    so one fsync covers many events (group commit).  sync() waits for the
+    records appended so far to be durable.  Segments roll over once they
+    reach segment_bytes or are segment_seconds old, see prune().
+
+    Event data that can not be pickled (futures, callables, ...) is
+    journaled as Unrecorded placeholders.
+    """
+
+    _hooked = ("send_system_event", "send_named_queue_event", "_queue_posted_system_event",
+               "_start_chains", "execute_system_event_loop", "_execute_pending_callbacks")
+
+    def __init__(self, cf, directory: str, segment_bytes: int = 64 << 20,
+                 segment_seconds: Optional[float] = None, commit_interval: float = 0.005,
+                 commit_bytes: int = 1 << 20, max_pending_bytes: int = 64 << 20, fsync: bool = True):
+        """
+        Initialize an EventJournal and start its writer thread
+
+        Records of an existing journal in directory are kept; new records
+        continue their sequence in a new segment.
+
+        Args:
+            cf (ChainFlow): Chain flow whose events are journaled
+            directory (str): Directory of the segment files, created if missing
+            segment_bytes (int): Size at which a segment rolls over
+            segment_seconds (float, optional): Age at which a segment rolls over
+            commit_interval (float): Seconds the writer gathers records
+                before writing and syncing them
+            commit_bytes (int): Pending bytes that trigger a commit at once
+            max_pending_bytes (int): Pending bytes at which recording blocks
+                until the writer catches up
+            fsync (bool): Sync each commit to disk; False only writes it
+        """
+        if segment_bytes <= 0:
+            raise ValueError("segment_bytes must be positive")
+        if segment_seconds is not None and segment_seconds <= 0:
+            raise ValueError("segment_seconds must be positive")
+        if commit_interval < 0:
+            raise ValueError("commit_interval can not be negative")
+        if commit_bytes <= 0 or max_pending_bytes <= 0:
+            raise ValueError("commit_bytes and max_pending_bytes must be positive")
+        self.cf = cf
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.commit_interval = commit_interval
+        self.commit_bytes = commit_bytes
+        self.max_pending_bytes = max_pending_bytes
+        self.fsync = fsync
+        self.attached = False
+        os.makedirs(directory, exist_ok=True)
+        last_sequence = JournalReader(directory).last_sequence()
+        self.sequence = 0 if last_sequence is None else last_sequence + 1  # next sequence number
+        self.committed_sequence = self.sequence - 1  # last durable record
+        self._first_sequence = self.sequence
+        self.commit_count = 0
+        self.segment_count = 0
+        self.bytes_written = 0
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+        # (sequence, time, tick, flags, payload) waiting for the writer, which frames them
+        self._pending = []
+        self._pending_bytes = 0
+        self._flush_requested = False
+        self._closed = False
+        self._error = None
+        self._segment = None
+        self._segment_path = None
+        self._segment_size = 0
+        self._segment_opened = 0.0
+        self._chain_thread = None  # thread running the chains, see _hooked
+        self._writer = threading.Thread(target=self._write_loop, name="chain_flow_journal", daemon=True)
+        self._writer.start()
+
+    def send_system_event(self, event: Event, engine_event: bool = False) -> None:
+        self._next["send_system_event"](event, engine_event)
+        if not engine_event:
+            self.record(None, event)
+
+    def send_named_queue_event(self, chain_name: str, event: Event) -> None:
+        self._next["send_named_queue_event"](chain_name, event)
+        if chain_name in self.cf.chain_dict:  # not one routed to another shard
+            self.record(chain_name, event)
+
+    def _queue_posted_system_event(self, event: Event) -> None:
+        self._next["_queue_posted_system_event"](event)
+        self.record(None, event)
+
+    def _start_chains(self) -> None:
+        self._append(b"", FLAG_START)
+        self._next["_start_chains"]()
+
+    def execute_system_event_loop(self) -> None:
+        self._chain_thread = threading.get_ident()
+        try:
+            self._next["execute_system_event_loop"]()
+        finally:
+            self._chain_thread = None
+
+    def _execute_pending_callbacks(self) -> None:
+        self._chain_thread = threading.get_ident()
+        try:
+            self._next["_execute_pending_callbacks"]()
+        finally:
+            self._chain_thread = None
+
+    def record(self, chain_name: Optional[str], event: Event) -> int:
+        """
+        Append an event to the journal
+
+        Args:
+            chain_name (str, optional): Chain of a named queue event, None
+                for a system event
+
+        Returns:
+            int: Sequence number of the record
+        """
+        payload, flags = _encode(chain_name, event)
+        if self._chain_thread == threading.get_ident() or event.event_id in _COMPLETION_EVENTS:
+            flags |= FLAG_INTERNAL
+        return self._append(payload, flags)
+
+    def _append(self, payload: bytes, flags: int) -> int:
+        cf = self.cf
+        event_time = cf.current_time()
+        tick = cf.tick_count
+        with self._lock:
+            if self._pending_bytes >= self.max_pending_bytes or self._closed or self._error is not None:
+                self._wait_for_writer()
+            sequence = self.sequence
+            self.sequence = sequence + 1
+            pending = self._pending
+            pending.append((sequence, event_time, tick, flags, payload))
+            self._pending_bytes += len(payload) + _FRAME.size
+            if len(pending) == 1 or self._pending_bytes >= self.commit_bytes:
+                self._condition.notify_all()
+        return sequence
+
+    def _wait_for_writer(self) -> None:
+        """Block while the pending records exceed max_pending_bytes; called with the lock held"""
+        while True:
+            if self._closed:
+                raise RuntimeError("EventJournal is closed")
+            if self._error is not None:
+                raise RuntimeError("EventJournal writer failed") from self._error
+            if self._pending_bytes < self.max_pending_bytes:
+                return
+            self._condition.wait()
+
+    def sync(self, timeout: Optional[float] = None) -> bool:
+        """
+        Commit the pending records now and wait until they are durable
+
+        Returns:
+            bool: False if timeout expired first
+
+        Raises:
+            RuntimeError: If the writer failed
+        """
+        with self._condition:
+            target = self.sequence - 1
+            self._flush_requested = True
+            self._condition.notify_all()
+            done = self._condition.wait_for(
+                lambda: self.committed_sequence >= target or self._error is not None, timeout)
+            if self._error is not None:
+                raise RuntimeError("EventJournal writer failed") from self._error
+            return done
+
+    def close(self) -> None:
+        """Detach, commit the pending records and stop the writer thread"""
+        self.detach()
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+        self._writer.join()
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+        if self._error is not None:
+            raise RuntimeError("EventJournal writer failed") from self._error
+
+    def _write_loop(self) -> None:
+        condition = self._condition
+        while True:
+            with condition:
+                while not self._pending and not self._closed:
+                    condition.wait()
+                if not self._closed and not self._flush_requested and self._pending_bytes < self.commit_bytes:
+                    # let the records arriving meanwhile join this commit
+                    condition.wait(self.commit_interval)
+                batch = self._pending
+                self._pending = []
+                self._pending_bytes = 0
+                self._flush_requested = False
+                closing = self._closed
+                condition.notify_all()
+            if batch:
+                try:
+                    self._commit(batch)
+                except BaseException as error:
+                    with condition:
+                        self._error = error
+                        condition.notify_all()
+                    return
+                with condition:
+                    self.committed_sequence = batch[-1][0]
+                    self.commit_count += 1
+                    condition.notify_all()
+            elif closing:
+                return
+
+    def _commit(self, batch: List[Tuple[int, float, int, int, bytes]]) -> None:
+        chunk = []
+        pack_head = _FRAME_HEAD.pack
+        pack_covered = _FRAME_COVERED.pack
+        crc32 = zlib.crc32
+        for sequence, event_time, tick, flags, payload in batch:
+            if self._segment is None or self._segment_full():
+                self._write_chunk(chunk)
+                chunk = []
+                self._open_segment(sequence)
+            covered = pack_covered(sequence, event_time, tick, flags)
+            chunk.append(pack_head(len(payload), crc32(payload, crc32(covered))))
+            chunk.append(covered)
+            chunk.append(payload)
+            self._segment_size += _FRAME.size + len(payload)
+        self._write_chunk(chunk)
+
+    def _segment_full(self) -> bool:
+        if self._segment_size >= self.segment_bytes:
+            return True
+        return (self.segment_seconds is not None
+                and time.monotonic() - self._segment_opened >= self.segment_seconds)
+
+    def _write_chunk(self, chunk: List[bytes]) -> None:
+        if not chunk:
+            return
+        data = b"".join(chunk)
+        self._segment.write(data)
+        self._segment.flush()
+        if self.fsync:
+            _fdatasync(self._segment.fileno())
+        self.bytes_written += len(data)
+
+    def _open_segment(self, first_sequence: int) -> None:
+        if self._segment is not None:
+            self._segment.close()
+        path = _segment_path(self.directory, first_sequence)
+        segment = open(path, "xb")
+        segment.write(MAGIC)
+        with self._condition:
+            self._segment = segment
+            self._segment_path = path
+        self._segment_size = len(MAGIC)
+        self._segment_opened = time.monotonic()
+        self.segment_count += 1
+        if self.fsync:
+            _sync_directory(self.directory)
+
+    def prune(self, before_sequence: int) -> int:
+        """
+        Delete the segments holding only records before before_sequence
+
+        E.g. the sequence returned by last_sequence() when a snapshot was
+        taken; the segment being written is never deleted.
+
+        Returns:
+            int: Number of segments deleted
+        """
+        with self._condition:
+            current_path = self._segment_path
+        segments = JournalReader(self.directory).segments()
+        deleted = 0
+        for index in range(len(segments) - 1):
+            path = segments[index][1]
+            if segments[index + 1][0] > before_sequence or path == current_path:
+                break
+            os.remove(path)
+            deleted += 1
+        return deleted
+
+    def last_sequence(self) -> int:
+        """Return the sequence of the last record appended, -1 if none"""
+        return self.sequence - 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return the record, commit, segment and byte counts"""
+        with self._condition:
+            pending = len(self._pending)
+        return {
+            "records": self.sequence - self._first_sequence,
+            "pending": pending,
+            "last_sequence": self.sequence - 1,
+            "committed_sequence": self.committed_sequence,
+            "commits": self.commit_count,
+            "segments": self.segment_count,
+            "bytes_written": self.bytes_written,
+        }
+
+    def __repr__(self):
+        return f"EventJournal(directory='{self.directory}', sequence={self.sequence})"
+
+
+class _ReplayClock(SimulatedClock):
+    """SimulatedClock whose sleep() does not pass limit, the time of the next journal record"""
+
+    def __init__(self, start: float, tick_period: float):
+        super().__init__(start, tick_period)
+        self.limit = math.inf
+
+    def sleep(self, seconds: float) -> None:
+        if seconds > 0:
+            self.now = min(self.now + max(seconds, self.resolution), max(self.limit, self.now))
+
+
+class _ReplayDone(Exception):
+    pass
+
+
+class _Replayer:
+    """Feeds the journal records that are due into the engine each time it drains posted events"""
+
+    def __init__(self, cf, records: Iterator[JournalRecord], clock: _ReplayClock,
+                 settle_time: float, stop_clock: bool):
+        self.cf = cf
+        self.records = records
+        self.clock = clock
+        self.settle_time = settle_time
+        self.stop_clock = stop_clock
+        self.next_record = next(records, None)
+        self.end_time = None
+        self.stats = {"replayed": 0, "internal": 0, "dropped": 0, "restarts": 0,
+                      "last_sequence": None, "complete": False}
+        self._drain = cf.drain_posted_events
+
+    def _due(self, record: JournalRecord, now: float) -> bool:
+        if record.time != now:
+            return record.time < now
+        # sent at the time of an engine pass: before or after the pass's tick
+        # was dispatched; the polled engine ticks on every pass, so it can wait
+        return self.stop_clock or record.tick <= self.cf.tick_count
+
+    def drain_posted_events(self, wait=None) -> None:
+        self._drain(wait)
+        now = self.clock.time()
+        if self.next_record is None:
+            if now >= self.end_time:
+                self.stats["complete"] = True
+                raise _ReplayDone()
+            return
+        cf = self.cf
+        stats = self.stats
+        chain_dict = cf.chain_dict
+        record = self.next_record
+        while record is not None and self._due(record, now):
+            stats["last_sequence"] = record.sequence
+            if record.flags & FLAG_START:
+                stats["restarts"] += 1
+            elif record.flags & FLAG_INTERNAL:
+                stats["internal"] += 1
+            elif record.chain_name is None:
+                cf.send_system_event(Event.trusted(record.event_id, record.data))
+                stats["replayed"] += 1
+            elif record.chain_name in chain_dict and chain_dict[record.chain_name]["active"]:
+                cf.send_named_queue_event(record.chain_name, Event.trusted(record.event_id, record.data))
+                stats["replayed"] += 1
+            else:
+                stats["dropped"] += 1
+            record = next(self.records, None)
+        self.next_record = record
+        if record is None:
+            self.end_time = now + self.settle_time
+        if self.stop_clock:
+            self.clock.limit = record.time if record is not None else self.end_time
+
+
+def replay_events(cf, directory: str, engine: str = "polled", tick_period: float = 0.1,
+                  start_sequence: int = 0, settle_time: float = 0.0) -> Dict[str, Any]:
+    """
+    Run a ChainFlow on the events of a journal, see ChainFlow.replay_journal()
+    """
+    if engine not in ("polled", "event_driven"):
+        raise ValueError("engine must be 'polled' or 'event_driven'")
+    if tick_period <= 0:
+        raise ValueError("tick_period must be positive")
+    if settle_time < 0:
+        raise ValueError("settle_time can not be negative")
+    if not cf._finalized:
+        raise RuntimeError("ChainFlow must be finalized before replaying a journal")
+    records = JournalReader(directory).records(start_sequence)
+    first = next(records, None)
+    if first is None:
+        return {"replayed": 0, "internal": 0, "dropped": 0, "restarts": 0,
+                "last_sequence": None, "complete": True}
+    clock = _ReplayClock(first.time, tick_period)
+    # the start record of the first engine start is consumed by the engine start below
+    if not first.flags & FLAG_START:
+        records = itertools.chain((first,), records)
+    replayer = _Replayer(cf, records, clock, settle_time, engine == "event_driven")
+    if replayer.next_record is None:
+        replayer.end_time = first.time + settle_time
+
+    saved_clock = cf.clock
+    saved_drain = vars(cf).get("drain_posted_events")
+    # the journal times are those of the recorded clock, so pending deadlines keep their meaning
+    cf.clock = clock
+    cf.drain_posted_events = replayer.drain_posted_events
+    try:
+        if engine == "polled":
+            cf.cf_engine_start()
+        else:
+            cf.cf_engine_start_event_driven(tick_period)
+    except _ReplayDone:
+        # stopped between engine passes; the next engine start keeps the replayed state
+        cf._restored = True
+    finally:
+        if saved_drain is None:
+            del cf.__dict__["drain_posted_events"]
+        else:
+            cf.drain_posted_events = saved_drain
+        cf.clock = saved_clock
+    replayer.stats["end_time"] = clock.time()
+    return replayer.stats
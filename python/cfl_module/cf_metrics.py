@@ -0,0 +1,316 @@
+"""
+Engine metrics - tick processing time, event latency and overrun histograms
+"""
+import os
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from cf_events import Event
+from cf_hooks import HookLayer
+
+
+# Prometheus bucket bounds in seconds, from 10 us to 10 s
+PROMETHEUS_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                      0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """
+    HDR style histogram of non negative integer values
+
+    Values below 2**sub_bucket_bits are counted exactly; above that every
+    power of two range is split into 2**(sub_bucket_bits - 1) linear
+    buckets, so a recorded value is known to within
+    2**-(sub_bucket_bits - 1) of itself (about 3% with the default) at any
+    magnitude, with buckets allocated only as large values arrive.
+    """
+
+    def __init__(self, sub_bucket_bits: int = 6):
+        """
+        Initialize a Histogram
+
+        Args:
+            sub_bucket_bits (int): log2 of the number of exactly counted values
+        """
+        if not isinstance(sub_bucket_bits, int) or sub_bucket_bits < 2:
+            raise ValueError("sub_bucket_bits must be an integer of at least 2")
+        self.sub_bucket_bits = sub_bucket_bits
+        self.reset()
+
+    def reset(self) -> None:
+        """Clear the recorded values"""
+        self._counts = [0] * (1 << self.sub_bucket_bits)
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def _index(self, value: int) -> int:
+        sub_bucket_bits = self.sub_bucket_bits
+        if value < (1 << sub_bucket_bits):
+            return value
+        shift = value.bit_length() - sub_bucket_bits
+        return (shift << (sub_bucket_bits - 1)) + (value >> shift)
+
+    def _bucket_upper(self, index: int) -> int:
+        """Largest value counted in a bucket"""
+        sub_bucket_bits = self.sub_bucket_bits
+        if index < (1 << sub_bucket_bits):
+            return index
+        shift = (index >> (sub_bucket_bits - 1)) - 1
+        mantissa = index - (shift << (sub_bucket_bits - 1))
+        return ((mantissa + 1) << shift) - 1
+
+    def record(self, value: int) -> None:
+        """Record a value; negative values are recorded as 0"""
+        value = int(value)
+        if value < 0:
+            value = 0
+        index = self._index(value)
+        counts = self._counts
+        if index >= len(counts):
+            counts.extend([0] * (index + 1 - len(counts)))
+        counts[index] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, percent: float) -> Optional[int]:
+        """
+        Return the value at a percentile, None if nothing is recorded
+
+        The result is the upper bound of the bucket holding the percentile,
+        clamped to the largest recorded value.
+        """
+        if not 0 <= percent <= 100:
+            raise ValueError("percent must be between 0 and 100")
+        if self.count == 0:
+            return None
+        rank = max(1, -(-self.count * percent // 100))
+        seen = 0
+        for index, bucket_count in enumerate(self._counts):
+            seen += bucket_count
+            if seen >= rank:
+                return min(self._bucket_upper(index), self.max)
+        return self.max
+
+    def buckets(self, bounds: Optional[Sequence[float]] = None) -> List[Tuple[float, int]]:
+        """
+        Return (upper bound, cumulative count) pairs, empty buckets included
+
+        Args:
+            bounds (sequence, optional): Increasing upper bounds to count up
+                to, e.g. a fixed Prometheus bucket layout; None for the
+                allocated buckets of the histogram.  A bucket holding values
+                on both sides of a bound is counted above it, so the counts
+                have the resolution of the histogram.
+        """
+        counts = self._counts
+        result = []
+        seen = 0
+        if bounds is None:
+            for index, bucket_count in enumerate(counts):
+                seen += bucket_count
+                result.append((self._bucket_upper(index), seen))
+            return result
+        index = 0
+        for bound in bounds:
+            while index < len(counts) and self._bucket_upper(index) <= bound:
+                seen += counts[index]
+                index += 1
+            result.append((bound, seen))
+        return result
+
+    def get_stats(self, scale: float = 1.0) -> Dict[str, Any]:
+        """
+        Return count, min, max, mean and the usual percentiles
+
+        Args:
+            scale (float): Factor applied to the values, e.g. 1e-6 for
+                microseconds to seconds
+        """
+        def scaled(value):
+            return None if value is None else value * scale
+
+        return {
+            'count': self.count,
+            'min': scaled(self.min),
+            'max': scaled(self.max),
+            'mean': self.total * scale / self.count if self.count else None,
+            'p50': scaled(self.percentile(50)),
+            'p90': scaled(self.percentile(90)),
+            'p99': scaled(self.percentile(99)),
+            'p999': scaled(self.percentile(99.9)),
+        }
+
+    def __repr__(self):
+        return f"Histogram(count={self.count}, min={self.min}, max={self.max})"
+
+
+class TimedEvent(Event):
+    """
+    Copy of a sent Event stamped with its enqueue time
+
+    EngineMetrics queues these in place of the caller's Event, so an Event
+    object sent more than once is timed per send and is never modified.
+    """
+    __slots__ = ('enqueue_time',)
+
+    @classmethod
+    def stamp(cls, event: Event) -> Event:
+        if not isinstance(event, Event):
+            return event  # left for the send method to reject
+        timed_event = cls.trusted(event.event_id, event.data)
+        timed_event.enqueue_time = time.perf_counter()
+        return timed_event
+
+
+class EngineMetrics(HookLayer):
+    """
+    Opt-in engine metrics for a ChainFlow
+
+    Records, in microseconds:
+        - tick processing time: each execute_system_event_loop() pass
+        - event latency: from send_system_event / send_named_queue_event
+          (or the post_* equivalents) to the start of the event's dispatch
+    and counts the ticks whose processing time overran tick_period.
+
+    As a HookLayer, the instrumented methods are set as instance
+    attributes of the ChainFlow while attached and removed on detach, so
+    the engine runs unchanged when metrics are disabled.  The send and post
+    methods queue a TimedEvent copy of the event carrying the enqueue time,
+    including the events the engine sends itself (CF_TIMER_EVENT, calendar
+    events).
+    """
+
+    _hooked = ('send_system_event', 'send_named_queue_event', 'post_system_event',
+               'post_named_queue_event', 'execute_system_event', 'execute_chain_element',
+               'execute_system_event_loop')
+
+    def __init__(self, cf, tick_period: float = 0.1, prometheus_path: Optional[str] = None,
+                 export_interval: float = 10.0, prometheus_buckets: Sequence[float] = PROMETHEUS_BUCKETS):
+        """
+        Initialize EngineMetrics
+
+        Args:
+            cf (ChainFlow): Chain flow to instrument
+            tick_period (float): Seconds a tick may take before it counts as an overrun
+            prometheus_path (str, optional): File rewritten with the Prometheus
+                text export every export_interval seconds while the engine runs
+            export_interval (float): Seconds between Prometheus exports
+            prometheus_buckets (sequence): Increasing histogram bucket bounds,
+                in seconds, exported whether or not they hold values
+        """
+        if tick_period <= 0:
+            raise ValueError("tick_period must be positive")
+        prometheus_buckets = tuple(prometheus_buckets)
+        if any(lower >= upper for lower, upper in zip(prometheus_buckets, prometheus_buckets[1:])):
+            raise ValueError("prometheus_buckets must be increasing")
+        self.prometheus_buckets = prometheus_buckets
+        self.cf = cf
+        self.tick_period = tick_period
+        self.prometheus_path = prometheus_path
+        self.export_interval = export_interval
+        self.attached = False
+        self._next_export = 0.0
+        self.reset()
+
+    def reset(self) -> None:
+        """Clear the recorded metrics"""
+        self.tick_time = Histogram()
+        self.event_latency = Histogram()
+        self.tick_count = 0
+        self.overrun_count = 0
+
+    def send_system_event(self, event, engine_event: bool = False) -> None:
+        self._next['send_system_event'](TimedEvent.stamp(event), engine_event)
+
+    def send_named_queue_event(self, chain_name: str, event) -> None:
+        self._next['send_named_queue_event'](chain_name, TimedEvent.stamp(event))
+
+    def post_system_event(self, event) -> None:
+        self._next['post_system_event'](TimedEvent.stamp(event))
+
+    def post_named_queue_event(self, chain_name: str, event) -> None:
+        self._next['post_named_queue_event'](chain_name, TimedEvent.stamp(event))
+
+    def execute_system_event(self, event=None) -> None:
+        if event is None:
+            event = self.cf.event_system.get_next_normal_event()
+            if event is None:
+                return
+        if type(event) is TimedEvent and event.enqueue_time is not None:
+            self.event_latency.record((time.perf_counter() - event.enqueue_time) * 1e6)
+            event.enqueue_time = None
+        self._next['execute_system_event'](event)
+
+    def execute_chain_element(self, chain: str, event) -> None:
+        # callback events reach the chain here; normal events were timed by execute_system_event
+        if type(event) is TimedEvent and event.enqueue_time is not None:
+            self.event_latency.record((time.perf_counter() - event.enqueue_time) * 1e6)
+            event.enqueue_time = None
+        self._next['execute_chain_element'](chain, event)
+
+    def execute_system_event_loop(self) -> None:
+        start = time.perf_counter()
+        self._next['execute_system_event_loop']()
+        end = time.perf_counter()
+        elapsed = end - start
+        self.tick_time.record(elapsed * 1e6)
+        self.tick_count += 1
+        if elapsed > self.tick_period:
+            self.overrun_count += 1
+        if self.prometheus_path is not None and end >= self._next_export:
+            self._next_export = end + self.export_interval
+            self.write_prometheus(self.prometheus_path)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Return the metrics; times in seconds
+        """
+        return {
+            'tick_count': self.tick_count,
+            'overrun_count': self.overrun_count,
+            'tick_period': self.tick_period,
+            'tick_time': self.tick_time.get_stats(1e-6),
+            'event_latency': self.event_latency.get_stats(1e-6),
+        }
+
+    def prometheus_text(self, prefix: str = "chain_flow") -> str:
+        """Return the metrics in the Prometheus text exposition format"""
+        lines = []
+        for name, help_text, histogram in (
+                ("tick_processing_seconds", "Time spent dispatching the events of a tick", self.tick_time),
+                ("event_latency_seconds", "Time from sending an event to its dispatch", self.event_latency)):
+            metric = f"{prefix}_{name}"
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} histogram")
+            bounds = histogram.buckets([bound * 1e6 for bound in self.prometheus_buckets])
+            for bound, (_, cumulative) in zip(self.prometheus_buckets, bounds):
+                lines.append(f'{metric}_bucket{{le="{bound:.6g}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{le="+Inf"}} {histogram.count}')
+            lines.append(f"{metric}_sum {histogram.total * 1e-6:.6f}")
+            lines.append(f"{metric}_count {histogram.count}")
+        for name, help_text, value in (
+                ("ticks_total", "Engine ticks processed", self.tick_count),
+                ("tick_overruns_total", "Ticks whose processing took longer than the tick period",
+                 self.overrun_count)):
+            metric = f"{prefix}_{name}"
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str, prefix: str = "chain_flow") -> None:
+        """Write prometheus_text() to path, replacing the file atomically"""
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w") as file:
+            file.write(self.prometheus_text(prefix))
+        os.replace(temp_path, path)
+
+    def __repr__(self):
+        return (f"EngineMetrics(attached={self.attached}, ticks={self.tick_count}, "
+                f"overruns={self.overrun_count})")
@@ -0,0 +1,214 @@
+"""
+Chain flow profiler - per chain and per element timing for a ChainFlow
+"""
+import time
+from typing import Any, Dict, List, Optional
+
+from cf_hooks import HookLayer
+
+
+class ChainFlowProfiler(HookLayer):
+    """
+    Opt-in instrumentation of a ChainFlow
+
+    While attached, the profiler's methods are set as instance attributes
+    of the ChainFlow, shadowing execute_chain_element,
+    _execute_callback_events and execute_system_event_loop, see HookLayer.
+    Every engine (polled, event driven, asyncio) runs a chain on normal
+    and callback events through execute_chain_element.  The first time a
+    chain runs, the process and initialization functions of its
+    CompiledChain are replaced by timing wrappers, so the shared
+    ChainFlow.execute_chain_element loop runs unchanged.  Detaching
+    restores what was bound before and the element functions, so an
+    unprofiled engine runs the plain methods with no instrumentation
+    checks at all.
+
+    Recorded:
+        - calls, cumulative and max wall time per (chain, element name,
+          opcode), where the opcode is the process function name and the
+          time includes the element's initialization function
+        - events each chain was run on, normal and callback events, and
+          the largest callback queue depth seen when its callback events
+          were run
+        - normal event queue depth at each engine pass
+    """
+
+    _hooked = ('execute_chain_element', '_execute_callback_events', 'execute_system_event_loop')
+
+    def __init__(self, cf):
+        """
+        Initialize a ChainFlowProfiler
+
+        Args:
+            cf (ChainFlow): Chain flow to instrument
+        """
+        self.cf = cf
+        self.attached = False
+        self._instrumented = {}  # chain to (CompiledChain, its timed process functions)
+        self.reset()
+
+    def reset(self) -> None:
+        """Clear the recorded statistics"""
+        # the timing wrappers hold the old statistics; chains are instrumented again when run
+        self._restore_functions()
+        self._element_stats = {}  # (chain, element name, opcode) to [calls, total, max]
+        self._chain_events = {}  # chain to events run
+        self._callback_depth = {}  # chain to max callback queue depth
+        self._normal_depth = [0, 0, 0]  # samples, total, max
+        self._initialization_time = 0.0  # time of the initialization function run before the next process function
+
+    def detach(self) -> None:
+        """
+        Restore the plain dispatcher and the element functions
+
+        Raises:
+            RuntimeError: if a layer attached after this one is still attached
+        """
+        if not self.attached:
+            return
+        super().detach()
+        self._restore_functions()
+
+    def _restore_functions(self) -> None:
+        # the element dicts hold the functions, including any replaced while profiling
+        for compiled_chain, _ in self._instrumented.values():
+            compiled_chain.reload_functions()
+        self._instrumented = {}
+
+    def _instrument(self, chain: str, compiled_chain) -> None:
+        """Swap timing wrappers into a chain's compiled process and initialization functions"""
+        entry = self._instrumented.get(chain)
+        if entry is not None and entry[0] is not compiled_chain:
+            # finalize() or a restore built a new CompiledChain for the chain
+            entry[0].reload_functions()
+        # start from the element dicts, which hold the plain functions
+        compiled_chain.reload_functions()
+        process_functions = compiled_chain.process_functions
+        timed_process_functions = []
+        for element, process_function in zip(compiled_chain.elements, process_functions):
+            key = (chain, element.get('name'), getattr(process_function, '__name__', repr(process_function)))
+            stats = self._element_stats.setdefault(key, [0, 0.0, 0.0])
+            timed_process_functions.append(self._timed_process_function(process_function, stats))
+        compiled_chain.process_functions = tuple(timed_process_functions)
+        compiled_chain.initialization_functions = tuple(
+            None if initialization_function is None else self._timed_initialization_function(initialization_function)
+            for initialization_function in compiled_chain.initialization_functions)
+        self._instrumented[chain] = (compiled_chain, compiled_chain.process_functions)
+
+    def _timed_process_function(self, process_function, stats: list):
+        perf_counter = time.perf_counter
+
+        def timed_process_function(element, event):
+            start = perf_counter()
+            return_code = process_function(element, event)
+            elapsed = perf_counter() - start + self._initialization_time
+            self._initialization_time = 0.0
+            stats[0] += 1
+            stats[1] += elapsed
+            if elapsed > stats[2]:
+                stats[2] = elapsed
+            return return_code
+        return timed_process_function
+
+    def _timed_initialization_function(self, initialization_function):
+        perf_counter = time.perf_counter
+
+        def timed_initialization_function(element):
+            # execute_chain_element runs the process function right after, which adds this time
+            start = perf_counter()
+            initialization_function(element)
+            self._initialization_time = perf_counter() - start
+        return timed_initialization_function
+
+    def execute_chain_element(self, chain: str, event) -> None:
+        """ChainFlow.execute_chain_element on timed element functions, counting the events"""
+        compiled_chain = self.cf._compiled_chains[chain]
+        entry = self._instrumented.get(chain)
+        # a new CompiledChain, or an element function replaced since, is instrumented again
+        if entry is None or compiled_chain.process_functions is not entry[1]:
+            self._instrument(chain, compiled_chain)
+        self._chain_events[chain] = self._chain_events.get(chain, 0) + 1
+        self._next['execute_chain_element'](chain, event)
+
+    def _execute_callback_events(self, chain: str) -> None:
+        """ChainFlow._execute_callback_events sampling the chain's callback queue depth"""
+        depth = self.cf.event_system.callback_events[chain].size()
+        if depth > self._callback_depth.get(chain, 0):
+            self._callback_depth[chain] = depth
+        self._next['_execute_callback_events'](chain)
+
+    def execute_system_event_loop(self) -> None:
+        """ChainFlow.execute_system_event_loop sampling the normal queue depth"""
+        cf = self.cf
+        depth = cf.event_system.normal_events.size()
+        normal_depth = self._normal_depth
+        normal_depth[0] += 1
+        normal_depth[1] += depth
+        if depth > normal_depth[2]:
+            normal_depth[2] = depth
+        self._next['execute_system_event_loop']()
+
+    def report(self, sort_by: str = "total_time", limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Return the element statistics, hottest first
+
+        Args:
+            sort_by (str): "total_time", "max_time", "mean_time" or "calls"
+            limit (int, optional): Number of rows to return
+
+        Returns:
+            List of dicts with chain, element, opcode, calls, total_time,
+            max_time and mean_time; times in seconds
+        """
+        if sort_by not in ("total_time", "max_time", "mean_time", "calls"):
+            raise ValueError(f"Invalid sort key: {sort_by}")
+        rows = []
+        for (chain, element, opcode), (calls, total, maximum) in self._element_stats.items():
+            if calls == 0:
+                continue
+            rows.append({
+                'chain': chain,
+                'element': element,
+                'opcode': opcode,
+                'calls': calls,
+                'total_time': total,
+                'max_time': maximum,
+                'mean_time': total / calls,
+            })
+        rows.sort(key=lambda row: row[sort_by], reverse=True)
+        return rows if limit is None else rows[:limit]
+
+    def chain_report(self) -> List[Dict[str, Any]]:
+        """
+        Return events dispatched and max callback queue depth per chain, busiest first
+        """
+        rows = [{'chain': chain, 'events': events, 'max_callback_depth': self._callback_depth.get(chain, 0)}
+                for chain, events in self._chain_events.items()]
+        rows.sort(key=lambda row: row['events'], reverse=True)
+        return rows
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return the element report, the chain report and the normal queue depth"""
+        samples, total, maximum = self._normal_depth
+        return {
+            'elements': self.report(),
+            'chains': self.chain_report(),
+            'normal_queue_depth': {
+                'samples': samples,
+                'mean': total / samples if samples else 0.0,
+                'max': maximum,
+            },
+        }
+
+    def format_report(self, sort_by: str = "total_time", limit: Optional[int] = 20) -> str:
+        """Return the hot spot report as a text table"""
+        lines = [f"{'chain':<20} {'element':<24} {'opcode':<28} {'calls':>9} "
+                 f"{'total ms':>10} {'mean us':>10} {'max us':>10}"]
+        for row in self.report(sort_by, limit):
+            lines.append(f"{row['chain']:<20} {str(row['element']):<24} {row['opcode']:<28} {row['calls']:>9} "
+                         f"{row['total_time'] * 1e3:>10.3f} {row['mean_time'] * 1e6:>10.2f} "
+                         f"{row['max_time'] * 1e6:>10.2f}")
+        return "\n".join(lines)
+
+    def __repr__(self):
+        return f"ChainFlowProfiler(attached={self.attached}, elements={len(self._element_stats)})"
@@ -0,0 +1,38 @@
+"""
+Return codes for chain flow process functions
+"""
+from enum import IntEnum
+
+
+class ReturnCode(IntEnum):
+    """
+    Interned integer return codes
+
+    Process functions may return either a ReturnCode member or the
+    equivalent "CF_*" string.  With strict checking off, return codes are
+    mapped through RETURN_CODE_TABLE, which also takes the plain int values.
+    The values index ChainFlow's return code handler table.
+    """
+    CF_HALT = 0
+    CF_CONTINUE = 1
+    CF_DISABLE = 2
+    CF_RESET = 3
+    CF_TERMINATE = 4
+
+
+CF_HALT = ReturnCode.CF_HALT
+CF_CONTINUE = ReturnCode.CF_CONTINUE
+CF_DISABLE = ReturnCode.CF_DISABLE
+CF_RESET = ReturnCode.CF_RESET
+CF_TERMINATE = ReturnCode.CF_TERMINATE
+
+# Maps the "CF_*" string names to their ReturnCode members; the strict check
+# accepts only these and the members themselves
+RETURN_CODE_NAMES = {_return_code.name: _return_code for _return_code in ReturnCode}
+
+# Maps every return code form (string name, ReturnCode member or plain int)
+# to its ReturnCode member for the unchecked lookup; built once at import
+RETURN_CODE_TABLE = dict(RETURN_CODE_NAMES)
+for _return_code in ReturnCode:
+    RETURN_CODE_TABLE[int(_return_code)] = _return_code
+del _return_code
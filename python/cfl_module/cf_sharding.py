@@ -0,0 +1,215 @@
+"""
+Sharded chain flow - runs the chains of a ChainFlow across worker processes
+"""
+import os
+import threading
+import zlib
+import multiprocessing
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from chain_flow import ChainFlow
+from cf_events import Event
+
+
+def default_shard_of(chain_name: str, shard_count: int) -> int:
+    """Stable chain to shard assignment; crc32 is the same in every process"""
+    return zlib.crc32(chain_name.encode("utf-8")) % shard_count
+
+
+def _resolve_shard(partition, chain_name: str, shard_count: int) -> int:
+    if partition is None:
+        return default_shard_of(chain_name, shard_count)
+    if callable(partition):
+        shard_index = partition(chain_name, shard_count)
+    else:
+        shard_index = partition.get(chain_name)
+        if shard_index is None:
+            return default_shard_of(chain_name, shard_count)
+    if not isinstance(shard_index, int) or not 0 <= shard_index < shard_count:
+        raise ValueError(f"Chain '{chain_name}' mapped to invalid shard {shard_index}")
+    return shard_index
+
+
+class _ShardRouter:
+    """Chain router installed in each shard's ChainFlow, see ChainFlow.set_chain_router()"""
+
+    def __init__(self, shard_index: int, inboxes: list, chain_shards: Dict[str, int]):
+        self.shard_index = shard_index
+        self.inboxes = inboxes
+        self.chain_shards = chain_shards  # chains of the other shards to their shard
+
+    def routes(self, chain_name: str) -> bool:
+        return chain_name in self.chain_shards
+
+    def send_named_queue_event(self, chain_name: str, event: Event) -> None:
+        self.inboxes[self.chain_shards[chain_name]].put((chain_name, event))
+
+    def send_system_event(self, event: Event) -> None:
+        for shard_index, inbox in enumerate(self.inboxes):
+            if shard_index != self.shard_index:
+                inbox.put((None, event))
+
+
+def _forward_inbox(cf: ChainFlow, inbox) -> None:
+    """Post the events arriving on a shard's inbox to its engine"""
+    event_ids = cf.event_id_dict.event_id_dict
+    while True:
+        item = inbox.get()
+        if item is None:
+            return
+        chain_name, event = item
+        if event.event_id not in event_ids:
+            continue
+        if chain_name is None:
+            cf.post_system_event(event)
+        elif chain_name in cf.chain_dict:
+            cf.post_named_queue_event(chain_name, event)
+
+
+def _run_shard(shard_index: int, shard_count: int, build_fn: Callable, partition,
+               inboxes: list, tick_period: float) -> None:
+    """Worker process body: build the chains, keep the owned ones and run the engine"""
+    cf = ChainFlow(lambda: None, lock_free_queues=True)
+    build_fn(cf)
+    owned = []
+    remote = {}
+    for chain_name in cf.list_of_chains:
+        owner = _resolve_shard(partition, chain_name, shard_count)
+        if owner == shard_index:
+            owned.append(chain_name)
+        else:
+            remote[chain_name] = owner
+    if not owned:
+        return
+    cf.retain_chains(owned)
+    cf.set_chain_router(_ShardRouter(shard_index, inboxes, remote))
+    cf.finalize()
+    forwarder = threading.Thread(target=_forward_inbox, args=(cf, inboxes[shard_index]), daemon=True)
+    forwarder.start()
+    cf.cf_engine_start_event_driven(tick_period)
+
+
+class ShardedChainFlow:
+    """
+    Runs a chain population across worker processes, each with its own engine
+
+    Chains hold arbitrary callables, so they are not shipped to the workers:
+    every worker calls build_fn(cf) on a fresh ChainFlow to define all the
+    chains (without finalizing), keeps the chains its shard owns and runs
+    them with cf_engine_start_event_driven().  build_fn must therefore be
+    picklable, e.g. a module level function, unless the fork start method
+    is used.
+
+    Events are carried between processes over multiprocessing queues, one
+    inbox per shard:
+        - send_named_queue_event() goes to the shard owning the chain
+        - send_system_event() goes to every shard
+    Inside a worker, ChainFlow.send_named_queue_event() for a chain of
+    another shard and every ChainFlow.send_system_event() are routed the
+    same way, so opcodes such as asm_send_named_event and
+    asm_terminate_system work across shards.  Chains that enable, disable
+    or join each other must be placed in the same shard with partition.
+    """
+
+    def __init__(self, build_fn: Callable[[ChainFlow], Any], shard_count: Optional[int] = None,
+                 partition: Union[None, Dict[str, int], Callable[[str, int], int]] = None,
+                 tick_period: float = 0.1, mp_context=None):
+        """
+        Initialize a ShardedChainFlow
+
+        Args:
+            build_fn (callable): build_fn(cf) defines the chains on cf
+            shard_count (int, optional): Number of worker processes, defaults
+                to the number of CPUs
+            partition (dict or callable, optional): Chain name to shard index,
+                or partition(chain_name, shard_count) returning it; chains not
+                in the dict and the default use default_shard_of()
+            tick_period (float): Seconds between CF_TIMER_EVENTs in each shard
+            mp_context: multiprocessing context, defaults to multiprocessing
+        """
+        if not callable(build_fn):
+            raise TypeError("build_fn must be a callable function")
+        if shard_count is None:
+            shard_count = os.cpu_count() or 1
+        if not isinstance(shard_count, int) or shard_count < 1:
+            raise ValueError("shard_count must be a positive integer")
+        if partition is not None and not callable(partition) and not isinstance(partition, dict):
+            raise TypeError("partition must be a dict or a callable")
+        self.build_fn = build_fn
+        self.shard_count = shard_count
+        self.partition = partition
+        self.tick_period = tick_period
+        self._mp = mp_context if mp_context is not None else multiprocessing
+        self._inboxes = []
+        self._processes = []
+
+    def shard_of(self, chain_name: str) -> int:
+        """Return the index of the shard owning a chain"""
+        return _resolve_shard(self.partition, chain_name, self.shard_count)
+
+    def start(self) -> None:
+        """Start the worker processes"""
+        if self._processes:
+            raise RuntimeError("ShardedChainFlow is already started")
+        self._inboxes = [self._mp.Queue() for _ in range(self.shard_count)]
+        for shard_index in range(self.shard_count):
+            process = self._mp.Process(target=_run_shard,
+                                       args=(shard_index, self.shard_count, self.build_fn, self.partition,
+                                             self._inboxes, self.tick_period),
+                                       name=f"chain_flow_shard_{shard_index}")
+            process.start()
+            self._processes.append(process)
+
+    def send_named_queue_event(self, chain_name: str, event: Event) -> None:
+        """
+        Send an event to the queue tied to a chain, in the shard that owns it
+
+        Events for chains that do not exist or are not active are dropped by
+        the shard.
+        """
+        if not isinstance(chain_name, str):
+            raise TypeError("chain_name must be a string")
+        if not isinstance(event, Event):
+            raise TypeError("event must be an instance of Event")
+        self._check_started()
+        self._inboxes[self.shard_of(chain_name)].put((chain_name, event))
+
+    def send_system_event(self, event: Event) -> None:
+        """Send a system event to every shard"""
+        if not isinstance(event, Event):
+            raise TypeError("event must be an instance of Event")
+        self._check_started()
+        for inbox in self._inboxes:
+            inbox.put((None, event))
+
+    def stop_system(self) -> None:
+        """Terminate the chains of every shard"""
+        self.send_system_event(Event("CF_TERMINATE_SYSTEM"))
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for the worker processes to finish
+
+        Returns:
+            bool: True if every worker has finished
+        """
+        for process in self._processes:
+            process.join(timeout)
+        finished = not any(process.is_alive() for process in self._processes)
+        if finished:
+            for inbox in self._inboxes:
+                # the workers are gone, do not block on undelivered events
+                inbox.cancel_join_thread()
+                inbox.close()
+        return finished
+
+    def is_alive(self) -> List[bool]:
+        """Return whether each worker process is running"""
+        return [process.is_alive() for process in self._processes]
+
+    def _check_started(self):
+        if not self._processes:
+            raise RuntimeError("ShardedChainFlow is not started")
+
+    def __repr__(self):
+        return f"ShardedChainFlow(shards={self.shard_count}, started={bool(self._processes)})"
@@ -0,0 +1,228 @@
+"""
+Chain flow snapshots - save and restore the runtime state of a ChainFlow
+"""
+import asyncio
+import io
+import pickle
+from concurrent.futures import Future
+from typing import Any, Callable, Iterable, Optional
+
+from cf_events import Event
+from timing_wheel import TimingWheel
+
+SNAPSHOT_VERSION = 1
+
+# work in flight does not survive a restart; the element holding it is initialized again
+_IN_FLIGHT_TYPES = (Future, asyncio.Future)
+# values that are never callables or work in flight
+_SCALAR_TYPES = frozenset((str, int, float, bool, type(None), bytes))
+_PLAIN_TYPES = _SCALAR_TYPES | {dict, list, tuple, set, frozenset, Event}
+
+
+class _Keep:
+    """Placeholder for a value taken from the restoring system"""
+
+    def __repr__(self):
+        return "KEEP"
+
+
+class _Restart:
+    """Placeholder for work in flight; its element is initialized again"""
+
+    def __repr__(self):
+        return "RESTART"
+
+
+KEEP = _Keep()
+RESTART = _Restart()
+
+
+class _SnapshotPickler(pickle.Pickler):
+
+    def __init__(self, file, cf, buffer_callback):
+        super().__init__(file, protocol=5, buffer_callback=buffer_callback)
+        self.cf = cf
+
+    def persistent_id(self, obj):
+        if type(obj) in _PLAIN_TYPES:
+            return None
+        if isinstance(obj, _IN_FLIGHT_TYPES):
+            return "restart"
+        # callables belong to the chain definitions, which the restoring
+        # process rebuilds; their place keeps the restoring system's value
+        if obj is self.cf or (callable(obj) and not isinstance(obj, type)):
+            return "keep"
+        return None
+
+
+class _SnapshotUnpickler(pickle.Unpickler):
+
+    restarts = 0
+
+    def persistent_load(self, pid):
+        if pid == "restart":
+            self.restarts += 1
+            return RESTART
+        return KEEP
+
+
+def _merge(current: Any, saved: Any) -> Any:
+    """
+    Return saved with its KEEP placeholders replaced by the matching parts of current
+
+    Dicts and lists of current are updated in place, so references held
+    elsewhere (e.g. by closures built with the chains) see the restored
+    state.
+    """
+    if saved is KEEP:
+        return current
+    if saved is RESTART:
+        return None
+    if isinstance(saved, dict):
+        if not isinstance(current, dict):
+            current = {}
+        merged = {key: value if type(value) in _SCALAR_TYPES else _merge(current.get(key), value)
+                  for key, value in saved.items()}
+        if type(current) is dict:
+            current.clear()
+            current.update(merged)
+            return current
+        return merged
+    if isinstance(saved, list):
+        same_shape = isinstance(current, list) and len(current) == len(saved)
+        merged = [_merge(current[index] if same_shape else None, value) for index, value in enumerate(saved)]
+        if same_shape:
+            current[:] = merged
+            return current
+        return merged
+    if isinstance(saved, tuple) and not hasattr(saved, '_fields'):
+        same_shape = isinstance(current, tuple) and len(current) == len(saved)
+        return tuple(_merge(current[index] if same_shape else None, value) for index, value in enumerate(saved))
+    return saved
+
+
+def _holds_restart(saved: Any) -> bool:
+    if saved is RESTART:
+        return True
+    if isinstance(saved, dict):
+        return any(_holds_restart(value) for value in saved.values())
+    if isinstance(saved, (list, tuple)):
+        return any(_holds_restart(value) for value in saved)
+    return False
+
+
+def _events(events: Iterable[Event]) -> list:
+    return [(event.event_id, event.data) for event in events]
+
+
+def take_snapshot(cf, buffer_callback: Optional[Callable] = None) -> bytes:
+    """
+    Serialize the runtime state of a finalized ChainFlow, see ChainFlow.snapshot()
+    """
+    if not cf._finalized:
+        raise RuntimeError("ChainFlow must be finalized before taking a snapshot")
+    if cf._subscription_changes is not None:
+        raise RuntimeError("Cannot take a snapshot while an event is being dispatched")
+    if cf._reload is not None:
+        raise RuntimeError("Cannot take a snapshot while a reload is in progress")
+    cf.drain_posted_events()
+    event_system = cf.event_system
+    chains = {}
+    for chain_name in cf.list_of_chains:
+        compiled_chain = cf._compiled_chains[chain_name]
+        chain_data = cf.chain_dict[chain_name]
+        chains[chain_name] = {
+            'active': chain_data['active'],
+            'element_names': compiled_chain.element_names,
+            'enable': pickle.PickleBuffer(compiled_chain.enable),
+            'initialized': pickle.PickleBuffer(compiled_chain.initialized),
+            'data': [element.get('data') for element in compiled_chain.elements],
+            'chain_data': chain_data['chain_data'],
+            'callback_events': _events(event_system.callback_events[chain_name].get_all_events()),
+        }
+    state = {
+        'version': SNAPSHOT_VERSION,
+        'chains': chains,
+        'normal_events': _events(event_system.normal_events.get_all_events()),
+        'tick_count': cf.tick_count,
+        'timeout_token': cf._timeout_token,
+        'tick_timeouts': [(deadline, token, chain_name)
+                          for deadline, token, (chain_name, _) in cf._tick_wheel.items()],
+        'time_timeouts': [(deadline, token, chain_name)
+                          for deadline, token, (chain_name, _) in cf._time_wheel.items()],
+        'expired_timeouts': dict(cf._expired_timeouts),
+        'time_stamp': getattr(cf, 'time_stamp', None),
+    }
+    file = io.BytesIO()
+    _SnapshotPickler(file, cf, buffer_callback).dump(state)
+    return file.getvalue()
+
+
+def restore_snapshot(cf, data, buffers: Optional[Iterable] = None) -> None:
+    """
+    Load a snapshot into a ChainFlow built with the same chains, see ChainFlow.restore()
+    """
+    if not cf._finalized:
+        raise RuntimeError("ChainFlow must be finalized before restoring a snapshot")
+    if cf._subscription_changes is not None:
+        raise RuntimeError("Cannot restore a snapshot while an event is being dispatched")
+    unpickler = _SnapshotUnpickler(io.BytesIO(data), buffers=buffers)
+    state = unpickler.load()
+    if not isinstance(state, dict) or state.get('version') != SNAPSHOT_VERSION:
+        raise ValueError("Unsupported snapshot version")
+    chains = state['chains']
+    if list(chains) != cf.list_of_chains:
+        raise ValueError("Snapshot chains do not match the chains of this ChainFlow")
+    for chain_name, saved in chains.items():
+        if saved['element_names'] != cf._compiled_chains[chain_name].element_names:
+            raise ValueError(f"Snapshot elements of chain '{chain_name}' do not match")
+
+    # start from a stopped system: no queued events, timeouts or active chains
+    for chain_name in cf.get_active_chains():
+        cf.chain_dict[chain_name]['active'] = False
+    cf.event_system.clear_normal_events()
+    for chain_name in cf.list_of_chains:
+        cf.event_system.clear_callback_events(chain_name)
+    cf._pending_callback_chains.clear()
+    cf._expired_timeouts = {}
+    cf._timeout_chains = {}
+
+    event_system = cf.event_system
+    for chain_name, saved in chains.items():
+        compiled_chain = cf._compiled_chains[chain_name]
+        chain_data = cf.chain_dict[chain_name]
+        compiled_chain.enable[:] = bytes(saved['enable'])
+        compiled_chain.initialized[:] = bytes(saved['initialized'])
+        compiled_chain.generation += 1
+        for index, (element, element_data) in enumerate(zip(compiled_chain.elements, saved['data'])):
+            if unpickler.restarts and _holds_restart(element_data):
+                compiled_chain.initialized[index] = 0
+            element['data'] = _merge(element.get('data'), element_data)
+        chain_data['chain_data'] = _merge(chain_data['chain_data'], saved['chain_data'])
+        chain_data['active'] = saved['active']
+        for event_id, event_data in saved['callback_events']:
+            event_system.add_callback_event(chain_name, Event.trusted(event_id, event_data))
+        if saved['callback_events']:
+            cf._pending_callback_chains.add(chain_name)
+    for event_id, event_data in state['normal_events']:
+        event_system.add_normal_event(Event.trusted(event_id, event_data))
+
+    cf.tick_count = state['tick_count']
+    cf._timeout_token = max(cf._timeout_token, state['timeout_token'])
+    cf._tick_wheel = TimingWheel(current=cf.tick_count)
+    for deadline, token, chain_name in state['tick_timeouts']:
+        cf._tick_wheel.schedule(deadline, token, (chain_name, cf._compiled_chains[chain_name]))
+    cf._time_wheel = TimingWheel(current=cf._time_ms())
+    for deadline, token, chain_name in state['time_timeouts']:
+        cf._time_wheel.schedule(deadline, token, (chain_name, cf._compiled_chains[chain_name]))
+    for token, chain_name in state['expired_timeouts'].items():
+        cf._expired_timeouts[token] = chain_name
+        cf._timeout_chains.setdefault(chain_name, set()).add(token)
+    if state['time_stamp'] is not None:
+        cf.time_stamp = state['time_stamp']
+
+    cf._active_positions = [position for position, chain_name in enumerate(cf.list_of_chains)
+                            if cf.chain_dict[chain_name]['active']]
+    for chain_name in cf.list_of_chains:
+        cf._update_subscription(chain_name)
+    cf._restored = True
@@ -6,19 +6,230 @@ from time import sleep
 from datetime import datetime, timedelta
 
 import time
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, Future
+from contextlib import contextmanager
+from queue import SimpleQueue
+from bisect import bisect_left, insort
+from heapq import heapify, heappush, heappop
 from cf_events import Event, EventQueue, DualEventQueueSystem
 from cf_events import Event_id_dict
+from cf_return_codes import ReturnCode, RETURN_CODE_TABLE, RETURN_CODE_NAMES
+from cf_return_codes import CF_HALT, CF_CONTINUE
+from timing_wheel import TimingWheel
+from cf_clock import SystemClock
+from cf_calendar import CalendarScheduler
+from cf_snapshot import take_snapshot, restore_snapshot
+from cf_journal import EventJournal, replay_events
+from cf_profiler import ChainFlowProfiler
+from cf_metrics import EngineMetrics, PROMETHEUS_BUCKETS
+
+
+class ElementView(dict):
+    """
+    Dictionary view of a compiled chain element
+
+    Opcode functions still receive the element as a dict.  The 'enable' and
+    'initialized' flags are not stored in the dict; they are served from the
+    parallel flag arrays of the owning CompiledChain, and iteration, items(),
+    repr() and dict(element) include them after 'name' as before.  Elements
+    defined with an event_list or a CF_CONTINUE unmatched_return_code also
+    carry those keys.
+
+    Replacing an element's process, initialization or termination function
+    updates the CompiledChain's function tuples.  The keys the dispatcher
+    indexes the chain by ('name', 'event_list', 'unmatched_return_code')
+    can not be changed or deleted after finalize(); that raises ValueError.
+    """
+    __slots__ = ('_compiled_chain', '_index')
+
+    _flag_keys = ('enable', 'initialized')
+    _function_keys = ('process_function', 'initialization_function', 'termination_function')
+    _fixed_keys = ('name', 'event_list', 'unmatched_return_code')
+
+    def __missing__(self, key):
+        if key == 'enable':
+            return self._compiled_chain.enable[self._index] == 1
+        if key == 'initialized':
+            return self._compiled_chain.initialized[self._index] == 1
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key == 'enable':
+            self._compiled_chain.enable[self._index] = 1 if value else 0
+            self._compiled_chain.dirty = True
+        elif key == 'initialized':
+            self._compiled_chain.initialized[self._index] = 1 if value else 0
+            self._compiled_chain.dirty = True
+        elif key in self._function_keys:
+            dict.__setitem__(self, key, value)
+            self._compiled_chain.reload_functions()
+        elif key in self._fixed_keys:
+            raise ValueError(f"Element key '{key}' can not be changed after finalize()")
+        else:
+            dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        if key in self._flag_keys or key in self._function_keys or key in self._fixed_keys:
+            raise ValueError(f"Element key '{key}' can not be deleted after finalize()")
+        dict.__delitem__(self, key)
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def __contains__(self, key):
+        return key in self._flag_keys or dict.__contains__(self, key)
+
+    def get(self, key, default=None):
+        if key in self._flag_keys:
+            return self[key]
+        return dict.get(self, key, default)
+
+    def keys(self):
+        keys = list(dict.keys(self))
+        keys[1:1] = self._flag_keys
+        return keys
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return dict.__len__(self) + len(self._flag_keys)
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def values(self):
+        return [self[key] for key in self.keys()]
+
+    def copy(self):
+        return dict(self.items())
+
+    def __repr__(self):
+        return repr(self.copy())
+
+    def __reduce__(self):
+        # copies and pickles of an element are plain dicts
+        return (dict, (self.copy(),))
+
+
+class CompiledChain:
+    """
+    Compact execution form of a chain built by ChainFlow.finalize()
+
+    Element flags are kept in parallel bytearrays and the element callables
+    in tuples, so the dispatcher indexes arrays instead of doing dict lookups.
+    """
+    __slots__ = ('name', 'length', 'element_names', 'process_functions',
+                 'initialization_functions', 'termination_functions',
+                 'elements', 'enable', 'initialized', 'event_sets',
+                 'unmatched_halts', 'reaction', 'live', 'dirty', 'generation')
+
+    def __init__(self, chain_name, element_list):
+        self.name = chain_name
+        self.length = len(element_list)
+        self.element_names = tuple(element['name'] for element in element_list)
+        self.process_functions = tuple(element['process_function'] for element in element_list)
+        self.initialization_functions = tuple(element['initialization_function'] for element in element_list)
+        self.termination_functions = tuple(element['termination_function'] for element in element_list)
+        self.enable = bytearray(1 if element.get('enable', True) else 0 for element in element_list)
+        self.initialized = bytearray(1 if element.get('initialized', False) else 0 for element in element_list)
+        self.event_sets = tuple(element.get('event_list') for element in element_list)
+        self.unmatched_halts = tuple(element.get('unmatched_return_code', CF_HALT) is CF_HALT
+                                     for element in element_list)
+        # Maintained by ChainFlow's subscription index
+        self.reaction = frozenset()
+        self.live = False
+        self.dirty = False
+        # Bumped whenever the chain's callback queue is cleared
+        self.generation = 0
+
+        elements = []
+        for index, element in enumerate(element_list):
+            view = ElementView(element)
+            dict.pop(view, 'enable', None)
+            dict.pop(view, 'initialized', None)
+            dict.__setitem__(view, 'current_chain', chain_name)
+            view._compiled_chain = self
+            view._index = index
+            elements.append(view)
+        self.elements = tuple(elements)
+
+    def reload_functions(self):
+        """Rebuild the function tuples after an element's function was replaced"""
+        elements = self.elements
+        self.process_functions = tuple(dict.__getitem__(element, 'process_function') for element in elements)
+        self.initialization_functions = tuple(dict.__getitem__(element, 'initialization_function')
+                                              for element in elements)
+        self.termination_functions = tuple(dict.__getitem__(element, 'termination_function') for element in elements)
+
+    def reset_flags(self):
+        """Enable every element and clear its initialized flag"""
+        self.enable[:] = b'\x01' * self.length
+        self.initialized[:] = bytes(self.length)
+
+    def compute_reaction(self):
+        """
+        Compute the event ids the chain can currently react to
+
+        Walks the enabled elements in order, collecting their event sets,
+        until an element that halts on unmatched events is reached.  An
+        uninitialized element or one without an event set reacts to
+        every event.
+
+        Returns:
+            frozenset or None: event ids, or None for every event
+        """
+        event_ids = set()
+        enable = self.enable
+        initialized = self.initialized
+        event_sets = self.event_sets
+        for index in range(self.length):
+            if not enable[index]:
+                continue
+            event_set = event_sets[index]
+            if event_set is None or not initialized[index]:
+                return None
+            event_ids |= event_set
+            if self.unmatched_halts[index]:
+                break
+        return frozenset(event_ids)
+
 
 class ChainFlow:
     """
     Chain Flow class for managing sequential processing chains
     """
     
-    def __init__(self,time_tick):
+    def __init__(self,time_tick,strict_return_codes=True,lock_free_queues=False,clock=None,timezone=None):
        
         if not callable(time_tick):
             raise TypeError("time_tick must be a callable function")
         self.time_tick = time_tick
+        # time source of the engine and the opcodes, see cf_clock
+        self.clock = clock if clock is not None else SystemClock()
+        # timezone of the minute, hour and day events; None is the host's local time
+        self.timezone = timezone
+        # executor kind to (executor, in flight semaphore), see configure_offload()
+        self._offload_executors = {}
+        self.profiler = None
+        self.metrics = None
+        self.journal = None
+        # engine owned queues without locks; other threads use post_* methods
+        self.lock_free_queues = lock_free_queues
+        
+        # Indexed by ReturnCode value
+        self._return_code_handlers = (
+            self._return_code_halt,
+            self._return_code_continue,
+            self._return_code_disable,
+            self._return_code_reset,
+            self._return_code_terminate,
+        )
+        self.set_return_code_checking(strict_return_codes)
         
         self.reset_cf()
         """Initialize ChainFlow with empty chain collections"""
@@ -40,6 +251,8 @@ class ChainFlow:
         self.event_id_dict.add_event_id("CF_DAY_EVENT","New Day Event")
         self.event_id_dict.add_event_id("CF_TERMINATE_SYSTEM","Terminate System Event")
         self.event_id_dict.add_event_id("CF_RESET_SYSTEM","Reset System Event")
+        self.event_id_dict.add_event_id("CF_AWAIT_EVENT","Awaitable Done Event")
+        self.event_id_dict.add_event_id("CF_OFFLOAD_EVENT","Offload Done Event")
         
         
        
@@ -48,8 +261,31 @@ class ChainFlow:
        
         self.list_of_chains = []  # Ordered list of chain names
         self.chain_dict = {}      # Dictionary mapping chain names to chain data
+        self._compiled_chains = {}  # Chain name to CompiledChain, built by finalize()
+        self._chain_position = {}   # Chain name to index in list_of_chains
+        self._event_subscribers = {}  # Event id to set of chains that react to it
+        self._wildcard_chains = set()  # Chains that react to every event
+        self._pending_callback_chains = set()  # Chains with queued callback events
+        self._subscription_changes = None  # Chains whose candidacy changed, logged while dispatching
+        self._live_chain_count = 0  # Active chains with at least one enabled element
+        self._active_positions = []  # Sorted list_of_chains positions of the active chains
+        self.tick_count = 0  # CF_TIMER_EVENTs dispatched
+        self._tick_wheel = TimingWheel(current=0)  # deadlines in ticks
+        self._time_wheel = TimingWheel(current=self._time_ms())  # deadlines in milliseconds
+        self._calendar = CalendarScheduler(self.timezone)  # second, minute, hour and day boundaries
+        self._timeout_token = 0
+        self._expired_timeouts = {}  # Expired timeout token to chain name
+        self._timeout_chains = {}  # Chain name to its expired timeout tokens
+        self._event_loop = None  # asyncio loop while run_async() is running
+        self._chain_router = None  # routes events for chains run by other shards, see cf_sharding
+        self.async_event_queue = None
         self._current_chain = None  # Track chain being defined
         self._finalized = False   # Track if chain is finalized
+        # chains defined and removed since begin_reload(), applied by commit_reload()
+        self._reload = None
+        self._posted_reloads = SimpleQueue()  # (build_fn, Future) from post_reload()
+        self._restored = False  # set by restore(), the engine then keeps the chain state
+        self._stepping = False  # run_ticks() has started the engine
         self._system_active = True
         self._execution_active = False       
         self.reserved_chain_names = []
@@ -79,8 +315,8 @@ class ChainFlow:
         if not isinstance(chain_name, str):
             raise TypeError("chain_name must be a string")
         
-        if self._finalized:
-            raise RuntimeError("Cannot define chains after finalization")
+        if self._finalized and self._reload is None:
+            raise RuntimeError("Cannot define chains after finalization, use begin_reload()")
         
         if chain_name not in self.reserved_chain_names:
             self.reserved_chain_names.append(chain_name)
@@ -88,11 +324,13 @@ class ChainFlow:
         if self._current_chain is not None:
             raise ValueError(f"Cannot define new chain '{chain_name}' while chain '{self._current_chain}' is still being defined. Call end_chain() first.")
         
-        if chain_name in self.chain_dict:
+        # during a reload a chain defined with the name of an existing chain replaces it
+        chain_dict = self.chain_dict if self._reload is None else self._reload['chain_dict']
+        if chain_name in chain_dict:
             raise ValueError(f"Chain name '{chain_name}' already exists. Chain names must be unique.")
         
         # Initialize new chain
-        self.chain_dict[chain_name] = {
+        chain_dict[chain_name] = {
             'element_list': [],
             'auto_flag': auto_flag,
             'active': False,
@@ -116,19 +354,24 @@ class ChainFlow:
         
         
     
-    def add_element(self, process_function,initialization_function=None,termination_function=None,data=None, name=None):
+    def add_element(self, process_function,initialization_function=None,termination_function=None,data=None, name=None,
+                    event_list=None, unmatched_return_code="CF_HALT"):
         """
         Add a processing element to the current chain
         
         Args:
             process_Function (callable): Python function for processing
             name (str, optional): Unique name for the element within the chain
+            event_list (list, optional): Event ids the element reacts to once
+                initialized, None if it reacts to every event
+            unmatched_return_code (str): "CF_HALT" or "CF_CONTINUE", the code the
+                element returns, with no side effects, for events not in event_list
             
         Raises:
             ValueError: If no chain is being defined or name conflicts
             TypeError: If process_Function is not callable or is None
         """
-        if self._finalized:
+        if self._finalized and self._reload is None:
             raise RuntimeError("Cannot add elements after finalization")
         
         if self._current_chain is None:
@@ -149,14 +392,26 @@ class ChainFlow:
         
         # Generate name if not provided
         if name is None:
-            element_count = len(self.chain_dict[self._current_chain]['element_list'])
+            element_count = len(self._defined_chain(self._current_chain)['element_list'])
             name = f"element_{element_count + 1}"
         
         if not isinstance(name, str):
             raise TypeError("name must be a string")
         
+        if event_list is not None:
+            if not isinstance(event_list, (list, tuple, set, frozenset)):
+                raise TypeError("event_list must be a list of event ids")
+            if not all(isinstance(event_id, str) for event_id in event_list):
+                raise TypeError("event_list must contain only strings")
+            event_list = frozenset(event_list)
+        if isinstance(unmatched_return_code, bool):
+            raise ValueError("unmatched_return_code must be CF_HALT or CF_CONTINUE")
+        unmatched_return_code = RETURN_CODE_TABLE.get(unmatched_return_code)
+        if unmatched_return_code is not CF_HALT and unmatched_return_code is not CF_CONTINUE:
+            raise ValueError("unmatched_return_code must be CF_HALT or CF_CONTINUE")
+        
         # Check for name uniqueness within current chain
-        current_chain_data = self.chain_dict[self._current_chain]
+        current_chain_data = self._defined_chain(self._current_chain)
         existing_names = [elem['name'] for elem in current_chain_data['element_list']]
         
         if name in existing_names:
@@ -173,6 +428,11 @@ class ChainFlow:
             'process_function': process_function,
             'data': data
         }
+        # only elements that filter their events carry the dispatch keys
+        if event_list is not None:
+            element_dict['event_list'] = event_list
+        if unmatched_return_code is not CF_HALT:
+            element_dict['unmatched_return_code'] = unmatched_return_code
         
         # Add to current chain's element list
         current_chain_data['element_list'].append(element_dict)
@@ -185,23 +445,65 @@ class ChainFlow:
         Raises:
             ValueError: If no chain is being defined
         """
-        if self._finalized:
+        if self._finalized and self._reload is None:
             raise RuntimeError("Cannot end chains after finalization")
         
         if self._current_chain is None:
             raise ValueError("No chain is currently being defined")
         
         # Add chain name to ordered list
-        self.list_of_chains.append(self._current_chain)
+        if self._reload is None:
+            self.list_of_chains.append(self._current_chain)
+        else:
+            self._reload['list_of_chains'].append(self._current_chain)
         
         chain_name = self._current_chain
-        element_count = len(self.chain_dict[self._current_chain]['element_list'])
+        element_count = len(self._defined_chain(self._current_chain)['element_list'])
         
        
         
         # Clear current chain
         self._current_chain = None
     
+    def _defined_chain(self, chain_name):
+        """Return the data of a chain being defined, staged for a reload or not"""
+        if self._reload is not None:
+            return self._reload['chain_dict'][chain_name]
+        return self.chain_dict[chain_name]
+    
+    def retain_chains(self, chain_names):
+        """
+        Drop every defined chain not in chain_names; used to run a subset of the chains
+        
+        Raises:
+            RuntimeError: If the system is finalized
+            ValueError: If a chain is still being defined or a name is unknown
+        """
+        if self._finalized:
+            raise RuntimeError("Cannot drop chains after finalization")
+        if self._current_chain is not None:
+            raise ValueError(f"Chain '{self._current_chain}' is still being defined. Call end_chain() first.")
+        retained = set(chain_names)
+        for chain_name in retained:
+            if chain_name not in self.chain_dict:
+                raise ValueError(f"Chain '{chain_name}' does not exist")
+        self.list_of_chains = [chain_name for chain_name in self.list_of_chains if chain_name in retained]
+        self.chain_dict = {chain_name: self.chain_dict[chain_name] for chain_name in self.list_of_chains}
+        
+    def set_chain_router(self, chain_router):
+        """
+        Route events for chains that are not defined in this ChainFlow
+        
+        chain_router.routes(chain_name) tells whether it handles a chain;
+        send_named_queue_event() hands events for those chains to
+        chain_router.send_named_queue_event() and send_system_event() also
+        passes every event to chain_router.send_system_event().
+        
+        Args:
+            chain_router: Router object, None to remove the router
+        """
+        self._chain_router = chain_router
+        
     def finalize(self):
         """
         Finalize the chain flow system - all chains must be properly defined
@@ -211,11 +513,255 @@ class ChainFlow:
         """
         if self._current_chain is not None:
             raise ValueError(f"Chain '{self._current_chain}' is still being defined. Call end_chain() first.")
-        self.event_system = DualEventQueueSystem(self.list_of_chains)
+        self._compile_chains()
+        self.event_system = DualEventQueueSystem(self.list_of_chains, lock_free=self.lock_free_queues)
         self._finalized = True
+
+    def _compile_chains(self):
+        """
+        Compile every defined chain into a CompiledChain
+
+        The chain's element_list is replaced by the compiled ElementView
+        objects so get_chain_info() and the opcode functions see the same
+        elements the dispatcher runs.
+        """
+        self._compiled_chains = {}
+        for chain_name in self.list_of_chains:
+            chain_data = self.chain_dict[chain_name]
+            compiled_chain = CompiledChain(chain_name, chain_data['element_list'])
+            chain_data['element_list'] = list(compiled_chain.elements)
+            self._compiled_chains[chain_name] = compiled_chain
+        self._chain_position = {chain_name: position for position, chain_name in enumerate(self.list_of_chains)}
+        self._event_subscribers = {}
+        self._wildcard_chains = set()
+        self._pending_callback_chains = set()
+        self._live_chain_count = 0
+        self._active_positions = []
+        
+    def _update_subscription(self, chain_name):
+        """
+        Recompute the events a chain reacts to and update the subscription index
+        """
+        compiled_chain = self._compiled_chains[chain_name]
+        compiled_chain.dirty = False
+        if self.chain_dict[chain_name]['active']:
+            reaction = compiled_chain.compute_reaction()
+            live = 1 in compiled_chain.enable
+        else:
+            reaction = frozenset()
+            live = False
+            
+        if live != compiled_chain.live:
+            compiled_chain.live = live
+            self._live_chain_count += 1 if live else -1
+            
+        old_reaction = compiled_chain.reaction
+        if reaction == old_reaction:
+            return
+        if old_reaction is None:
+            self._wildcard_chains.discard(chain_name)
+        else:
+            for event_id in old_reaction:
+                subscribers = self._event_subscribers[event_id]
+                subscribers.discard(chain_name)
+                if not subscribers:
+                    del self._event_subscribers[event_id]
+        if reaction is None:
+            self._wildcard_chains.add(chain_name)
+        else:
+            for event_id in reaction:
+                self._event_subscribers.setdefault(event_id, set()).add(chain_name)
+        compiled_chain.reaction = reaction
+        if self._subscription_changes is not None:
+            self._subscription_changes.append(chain_name)
        
 
     
+    def begin_reload(self):
+        """
+        Start a transaction that adds, replaces or removes chains of a finalized system
+        
+        Until commit_reload() or abort_reload(), define_chain(), add_element()
+        and end_chain() (and so the asm_ opcodes) stage chains instead of
+        changing the running system; a chain defined with the name of an
+        existing chain replaces it.  remove_chain() stages a removal.
+        
+        Raises:
+            RuntimeError: If the system is not finalized or a reload is in progress
+        """
+        if not self._finalized:
+            raise RuntimeError("ChainFlow must be finalized before reloading chains")
+        if self._reload is not None:
+            raise RuntimeError("A reload is already in progress")
+        # after finalize() _current_chain is the chain last executed, restored at the end
+        self._reload = {'chain_dict': {}, 'list_of_chains': [], 'removed': [],
+                        'current_chain': self._current_chain}
+        self._current_chain = None
+        
+    def remove_chain(self, chain_name):
+        """
+        Stage the removal of a chain in the current reload
+        
+        Raises:
+            RuntimeError: If no reload is in progress
+            ValueError: If the chain does not exist or is redefined in the reload
+        """
+        if self._reload is None:
+            raise RuntimeError("No reload in progress, call begin_reload() first")
+        if chain_name not in self.chain_dict:
+            raise ValueError(f"Chain '{chain_name}' does not exist")
+        if chain_name in self._reload['chain_dict']:
+            raise ValueError(f"Chain '{chain_name}' is redefined in this reload")
+        if chain_name not in self._reload['removed']:
+            self._reload['removed'].append(chain_name)
+            
+    def abort_reload(self):
+        """Discard the chains staged since begin_reload()"""
+        if self._reload is None:
+            return
+        self._current_chain = self._reload['current_chain']
+        self._reload = None
+        
+    def commit_reload(self):
+        """
+        Apply the chains staged since begin_reload()
+        
+        Removed and replaced chains are disabled, running their termination
+        functions, then the new definitions are compiled and those with
+        auto_flag set are enabled.  Only the changed chains and their
+        entries in the indexes are touched: every other chain keeps its
+        state, queued events and timeouts.  Added chains run after the
+        existing ones.
+        
+        Call it on the engine thread between events, e.g. before the
+        engine starts; from other threads or from chain elements use
+        post_reload().
+        
+        Returns:
+            dict: 'added', 'replaced' and 'removed' chain names
+            
+        Raises:
+            RuntimeError: If no reload is in progress or an event is being dispatched
+            ValueError: If a chain is still being defined
+        """
+        reload = self._reload
+        if reload is None:
+            raise RuntimeError("No reload in progress, call begin_reload() first")
+        if self._current_chain is not None:
+            raise ValueError(f"Chain '{self._current_chain}' is still being defined. Call end_chain() first.")
+        if self._subscription_changes is not None:
+            raise RuntimeError("Cannot commit a reload while an event is being dispatched, use post_reload()")
+        self._reload = None
+        self._current_chain = reload['current_chain']
+        chain_dict = self.chain_dict
+        staged = reload['chain_dict']
+        removed = reload['removed']
+        replaced = [chain_name for chain_name in reload['list_of_chains'] if chain_name in chain_dict]
+        added = [chain_name for chain_name in reload['list_of_chains'] if chain_name not in chain_dict]
+        
+        # compile before touching the running chains
+        compiled_chains = {}
+        for chain_name in reload['list_of_chains']:
+            compiled_chains[chain_name] = CompiledChain(chain_name, staged[chain_name]['element_list'])
+            staged[chain_name]['element_list'] = list(compiled_chains[chain_name].elements)
+            
+        for chain_name in removed + replaced:
+            # leaves the chain out of the subscription index, queues and timeouts
+            self.disable_chain(chain_name)
+            
+        for chain_name in removed:
+            del chain_dict[chain_name]
+            del self._compiled_chains[chain_name]
+            self.event_system.remove_chain(chain_name)
+        if removed:
+            removed_set = set(removed)
+            self.list_of_chains = [chain_name for chain_name in self.list_of_chains if chain_name not in removed_set]
+            
+        for chain_name in replaced:
+            chain_dict[chain_name] = staged[chain_name]
+            self._compiled_chains[chain_name] = compiled_chains[chain_name]
+        for chain_name in added:
+            chain_dict[chain_name] = staged[chain_name]
+            self._compiled_chains[chain_name] = compiled_chains[chain_name]
+            self.event_system.add_chain(chain_name)
+            self.list_of_chains.append(chain_name)
+            
+        if removed:
+            # positions after a removed chain shift down
+            self._chain_position = {chain_name: position for position, chain_name in enumerate(self.list_of_chains)}
+            self._active_positions = [position for position, chain_name in enumerate(self.list_of_chains)
+                                      if chain_dict[chain_name]['active']]
+        else:
+            for position in range(len(self.list_of_chains) - len(added), len(self.list_of_chains)):
+                self._chain_position[self.list_of_chains[position]] = position
+                
+        for chain_name in reload['list_of_chains']:
+            if chain_dict[chain_name]['auto_flag']:
+                self.enable_chain(chain_name)
+        return {'added': added, 'replaced': replaced, 'removed': list(removed)}
+    
+    @contextmanager
+    def reload_chains(self):
+        """
+        Context manager running begin_reload(), then commit_reload() on exit
+        or abort_reload() if the block raises
+        
+            with cf.reload_chains():
+                cf.remove_chain("old_chain")
+                cf.define_chain("new_chain", auto_flag=True)
+                op.asm_wait_for_event("ev_a")
+                cf.end_chain()
+        """
+        self.begin_reload()
+        try:
+            yield self
+        except BaseException:
+            self.abort_reload()
+            raise
+        self.commit_reload()
+        
+    def post_reload(self, build_fn):
+        """
+        Run a reload on the engine thread; callable from any thread
+        
+        The engine calls build_fn(cf) inside reload_chains() the next time it
+        drains posted events, i.e. between ticks.
+        
+        Args:
+            build_fn (callable): Defines and removes chains on the ChainFlow
+            
+        Returns:
+            Future: Resolves to the commit_reload() result, or the exception
+            raised by build_fn or the commit
+        """
+        if not callable(build_fn):
+            raise TypeError("build_fn must be a callable function")
+        if not self._finalized:
+            raise RuntimeError("ChainFlow must be finalized before reloading chains")
+        future = Future()
+        self._posted_reloads.put((build_fn, future))
+        # wake an engine blocked on posted events
+        self.event_system.post_wakeup()
+        return future
+    
+    def _apply_posted_reloads(self):
+        while not self._posted_reloads.empty():
+            build_fn, future = self._posted_reloads.get_nowait()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                self.begin_reload()
+                try:
+                    build_fn(self)
+                except BaseException:
+                    self.abort_reload()
+                    raise
+                result = self.commit_reload()
+            except Exception as exception:
+                future.set_exception(exception)
+            else:
+                future.set_result(result)
+            
     def get_chain_info(self, chain_name=None):
         """
         Get information about chains
@@ -234,6 +780,7 @@ class ChainFlow:
             return {
                 'chains': self.list_of_chains,
                 'chain_count': len(self.list_of_chains),
+                'active_chain_count': len(self._active_positions),
                 'finalized': self._finalized
             }
    
@@ -262,19 +809,32 @@ class ChainFlow:
             raise ValueError(f"Chain '{chain_name}' does not exist")
         
         # Enable the chain
+        if not self.chain_dict[chain_name]['active']:
+            insort(self._active_positions, self._chain_position[chain_name])
         self.chain_dict[chain_name]['active'] = True
         self.event_system.clear_callback_events(chain_name)
+        self._pending_callback_chains.discard(chain_name)
+        self._drop_expired_timeouts(chain_name)
+        self._compiled_chains[chain_name].generation += 1
         
         # Enable all elements in the chain and reset their initialization status
-        for element in self.chain_dict[chain_name]['element_list']:
-            element['enable'] = True
-            element['initialized'] = False
+        self._compiled_chains[chain_name].reset_flags()
+        self._update_subscription(chain_name)
       
     def is_chain_active(self,chain_name):
         if chain_name not in self.chain_dict:
             raise ValueError(f"Chain '{chain_name}' does not exist")
         return self.chain_dict[chain_name]['active']
     
+    def get_active_chains(self):
+        """Return the names of the active chains in definition order"""
+        list_of_chains = self.list_of_chains
+        return [list_of_chains[position] for position in self._active_positions]
+    
+    def get_active_chain_count(self):
+        """Return the number of active chains"""
+        return len(self._active_positions)
+    
  
     
     def disable_chain(self, chain_name):
@@ -301,39 +861,43 @@ class ChainFlow:
         if self.chain_dict[chain_name]['active'] == False:
             return
         self.chain_dict[chain_name]['active'] = False
+        active_positions = self._active_positions
+        del active_positions[bisect_left(active_positions, self._chain_position[chain_name])]
         self.event_system.clear_callback_events(chain_name)
-        # Get the chain data
-        chain_data = self.chain_dict[chain_name]
-        
-        # Process elements in reverse order (last to first)
-        element_list = chain_data['element_list']
+        self._pending_callback_chains.discard(chain_name)
+        self._drop_expired_timeouts(chain_name)
+        # Get the compiled chain
+        compiled_chain = self._compiled_chains[chain_name]
+        compiled_chain.generation += 1
+        enable = compiled_chain.enable
+        initialized = compiled_chain.initialized
+        termination_functions = compiled_chain.termination_functions
+        elements = compiled_chain.elements
         terminated_count = 0
         
-        for element in reversed(element_list):
+        # Process elements in reverse order (last to first)
+        for index in range(compiled_chain.length - 1, -1, -1):
             
             # Check if element is active (enabled and initialized)
-            if element['enable'] and element['initialized']:
+            if enable[index] and initialized[index]:
                 # Execute termination function if it exists
-                if element['termination_function'] is not None:
-                    try:
-                        
-                        element["current_chain"] = chain_name
-                        element['termination_function'](element)
-                        terminated_count += 1
-                    except Exception as e:
-                        raise e
+                if termination_functions[index] is not None:
+                    termination_functions[index](elements[index])
+                    terminated_count += 1
                 
                 # Set element as no longer initialized since we're terminating it
-                element['initialized'] = False
+                initialized[index] = 0
             
             # Disable the element
-            element['enable'] = False
+            enable[index] = 0
+            
+        self._update_subscription(chain_name)
         
      
     
        
     def disable_all_chains(self):
-        for chain_name in self.list_of_chains:
+        for chain_name in self.get_active_chains():
             self.disable_chain(chain_name)
         
         
@@ -354,14 +918,28 @@ class ChainFlow:
         if event.event_id not in self.event_id_dict.event_id_dict:
             raise ValueError(f"Event ID '{event.event_id}' is not a valid  event")
         if chain_name not in self.chain_dict:
+            if self._chain_router is not None and self._chain_router.routes(chain_name):
+                self._chain_router.send_named_queue_event(chain_name, event)
+                return
             raise ValueError(f"Chain '{chain_name}' does not exist")
         if not self.chain_dict[chain_name]['active']:
             raise ValueError(f"Chain '{chain_name}' is not active")
         self.event_system.add_callback_event(chain_name, event)
+        if chain_name not in self._pending_callback_chains:
+            self._pending_callback_chains.add(chain_name)
+            if self._subscription_changes is not None:
+                self._subscription_changes.append(chain_name)
         
-    def send_system_event(self, event: Event):
+    def send_system_event(self, event: Event, engine_event: bool = False):
         """
         Send a system event 
+        
+        Args:
+            event (Event): Event to send
+            engine_event (bool): True for the events the engine generates
+                itself (CF_TIMER_EVENT, calendar events).  They are not
+                journaled, a replay generates them again, and not forwarded
+                to the other shards, which generate their own.
         """
      
         if not isinstance(event, Event):
@@ -369,11 +947,177 @@ class ChainFlow:
         if event.event_id not in self.event_id_dict.event_id_dict:
             raise ValueError(f"Event ID '{event.event_id}' is not a valid  event")
         self.event_system.add_normal_event(event)
+        if self._chain_router is not None and not engine_event:
+            self._chain_router.send_system_event(event)
+        
+    def post_system_event(self, event: Event):
+        """
+        Send a system event from any thread
+        
+        The event is queued when the engine drains posted events at the
+        start of its next tick.
+        """
+        if not isinstance(event, Event):
+            raise TypeError("event must be an instance of Event")
+        if event.event_id not in self.event_id_dict.event_id_dict:
+            raise ValueError(f"Event ID '{event.event_id}' is not a valid  event")
+        self.event_system.post_normal_event(event)
+        
+    def post_named_queue_event(self, chain_name: str, event: Event):
+        """
+        Send an event to the queue tied to a chain from any thread
+        
+        The event is dropped if the chain is no longer active when the
+        engine drains posted events.
+        """
+        if not isinstance(chain_name, str):
+            raise TypeError("chain_name must be a string")
+        if not isinstance(event, Event):
+            raise TypeError("event must be an instance of Event")
+        if event.event_id not in self.event_id_dict.event_id_dict:
+            raise ValueError(f"Event ID '{event.event_id}' is not a valid  event")
+        self.event_system.post_callback_event(chain_name, event)
+        
+    def drain_posted_events(self, wait=None):
+        """
+        Queue the events posted from other threads; called by the engine once per tick
+        
+        Args:
+            wait (float, optional): Seconds to block for a first posted event
+                when none is pending; None returns immediately
+        """
+        chain_dict = self.chain_dict
+        for chain_name, event in self.event_system.drain_ingress(wait):
+            if event is None:
+                continue  # wake up only, see post_reload()
+            if chain_name is None:
+                self._queue_posted_system_event(event)
+            elif chain_name in chain_dict and chain_dict[chain_name]['active']:
+                self.send_named_queue_event(chain_name, event)
+        if not self._posted_reloads.empty():
+            self._apply_posted_reloads()
+            
+    def _queue_posted_system_event(self, event: Event):
+        self.event_system.add_normal_event(event)
+        
+    def set_clock(self, clock):
+        """
+        Replace the clock of the engine, e.g. with a cf_clock.SimulatedClock
+        
+        Raises:
+            RuntimeError: If timeouts in seconds are pending, their deadlines
+                belong to the old clock
+        """
+        if len(self._time_wheel):
+            raise RuntimeError("Cannot change the clock while timeouts are pending")
+        self.clock = clock
+        self._time_wheel = TimingWheel(current=self._time_ms())
+        
+    def set_timezone(self, timezone):
+        """
+        Set the timezone of the calendar events and of asm_wait_for_schedule
+        
+        Args:
+            timezone: None for the host's local time, an IANA name such as
+                "Europe/Paris" or a tzinfo
+        """
+        self._calendar.set_timezone(timezone, self.current_time())
+        self.timezone = timezone
+        
+    def current_time(self):
+        """Return the engine time in seconds"""
+        return self.clock.time()
+    
+    def _time_ms(self):
+        return int(self.current_time() * 1000)
+    
+    def schedule_timeout(self, chain_name: str, delay):
+        """
+        Schedule a timeout for a chain after delay seconds
+        
+        Deadlines are checked on each CF_TIMER_EVENT.  The chain is woken by
+        the CF_TIMER_EVENT that expires the timeout even if none of its
+        elements subscribe to timer events; the element that owns the
+        timeout claims it with check_timeout().
+        
+        Args:
+            chain_name (str): Chain that owns the timeout
+            delay (float): Delay in seconds
+            
+        Returns:
+            int: Token identifying the timeout
+        """
+        if chain_name not in self.chain_dict:
+            raise ValueError(f"Chain '{chain_name}' does not exist")
+        self._timeout_token += 1
+        deadline = int((self.current_time() + delay) * 1000) + 1
+        self._time_wheel.schedule(deadline, self._timeout_token, (chain_name, self._compiled_chains.get(chain_name)))
+        return self._timeout_token
+    
+    def schedule_tick_timeout(self, chain_name: str, ticks: int):
+        """
+        Schedule a timeout for a chain after a number of CF_TIMER_EVENTs
+        
+        A tick count below 1 expires on the next CF_TIMER_EVENT.
+        
+        Returns:
+            int: Token identifying the timeout
+        """
+        if chain_name not in self.chain_dict:
+            raise ValueError(f"Chain '{chain_name}' does not exist")
+        self._timeout_token += 1
+        self._tick_wheel.schedule(self.tick_count + max(ticks, 1), self._timeout_token,
+                                  (chain_name, self._compiled_chains.get(chain_name)))
+        return self._timeout_token
+    
+    def check_timeout(self, token):
+        """
+        Claim an expired timeout
+        
+        Returns:
+            bool: True the first time this is called after the timeout expired
+        """
+        chain_name = self._expired_timeouts.pop(token, None)
+        if chain_name is None:
+            return False
+        tokens = self._timeout_chains[chain_name]
+        tokens.discard(token)
+        if not tokens:
+            del self._timeout_chains[chain_name]
+        return True
+    
+    def cancel_timeout(self, token):
+        """
+        Cancel a timeout, whether pending or expired and not yet claimed
+        """
+        if token is None:
+            return
+        if not self._tick_wheel.cancel(token) and not self._time_wheel.cancel(token):
+            self.check_timeout(token)
+    
+    def _drop_expired_timeouts(self, chain_name):
+        tokens = self._timeout_chains.pop(chain_name, None)
+        if tokens:
+            for token in tokens:
+                del self._expired_timeouts[token]
+    
+    def _advance_timeouts(self):
+        """Count a CF_TIMER_EVENT and collect the timeouts that expire with it"""
+        self.tick_count += 1
+        expired = self._tick_wheel.advance(self.tick_count)
+        expired.extend(self._time_wheel.advance(self._time_ms()))
+        chain_dict = self.chain_dict
+        compiled_chains = self._compiled_chains
+        for token, (chain_name, compiled_chain) in expired:
+            # drop the timeouts of chains removed or replaced by a reload
+            if compiled_chains.get(chain_name) is compiled_chain and chain_dict[chain_name]['active']:
+                self._expired_timeouts[token] = chain_name
+                self._timeout_chains.setdefault(chain_name, set()).add(token)
         
     def reset_system(self):
-        self.send_system_event(Event("CF_SYSTEM_RESET"))
+        self.send_system_event(Event.trusted("CF_SYSTEM_RESET"))
     def stop_system(self):
-        self.send_system_event(Event("CF_SYSTEM_STOP"))
+        self.send_system_event(Event.trusted("CF_SYSTEM_STOP"))
     
     def initialize_chains(self):
         """
@@ -406,18 +1150,29 @@ class ChainFlow:
                 disabled_chains.append(chain_name)
         
     def execute_system_event_loop(self):
+        drain_normal = self.event_system.drain_normal
         while self._system_active:
-            self.execute_system_event()
-            if self.event_system.normal_events.size() == 0:
+            events = drain_normal()
+            if not events:
                 break
+            while events:
+                self.execute_system_event(events.popleft())
+                if not self._system_active:
+                    # leave undispatched events queued, as a stopped system would
+                    self.event_system.restore_normal(events)
+                    break
             
             
-    def execute_system_event(self):
+    def execute_system_event(self, event: Event = None):
         """
         Execute the system event
-        return True if event processing is to continue, False if it is to stop
+        
+        Args:
+            event (Event, optional): Event to execute, None to take the next
+                event from the normal events queue
         """
-        event = self.event_system.get_next_normal_event()
+        if event is None:
+            event = self.event_system.get_next_normal_event()
         
         if event is not None:
             
@@ -431,136 +1186,769 @@ class ChainFlow:
                 self.initialize_chains()
             
                 
-            self._system_active = False
-            for chain_name in self.list_of_chains:
-                if self.chain_dict[chain_name]['active']:
-                    self.execute_chain_event(chain_name,event)
+            elif event.event_id == "CF_TIMER_EVENT":
+                self._advance_timeouts()
+                
+            # the system stays active while any active chain has an enabled element
+            self._system_active = self._live_chain_count > 0
+            self._dispatch_event(event)
         else:
             pass
        
+    def _dispatch_event(self, event: Event):
+        """
+        Run an event on the chains subscribed to it, in chain definition order
+        
+        Candidates are the chains whose current elements react to the event id,
+        chains reacting to every event, chains with queued callback events and,
+        for CF_TIMER_EVENT, chains with expired timeouts.
+        Chains whose subscription changes while the event is being dispatched
+        (a chain is enabled or sent a callback event) are logged, and only
+        those are merged into the remaining candidates, so a dispatch that
+        initializes every chain stays O(N log N).
+        """
+        event_id = event.event_id
+        chain_position = self._chain_position
+        chain_dict = self.chain_dict
+        wildcard_chains = self._wildcard_chains
+        pending_callback_chains = self._pending_callback_chains
+        event_subscribers = self._event_subscribers
+        no_subscribers = ()
+        # chains with expired timeouts are woken by the timer event
+        timeout_chains = self._timeout_chains if event_id == "CF_TIMER_EVENT" else no_subscribers
+        
+        def is_candidate(chain_name):
+            return (chain_name in wildcard_chains
+                    or chain_name in event_subscribers.get(event_id, no_subscribers)
+                    or chain_name in pending_callback_chains
+                    or chain_name in timeout_chains)
+        
+        queued = wildcard_chains.union(event_subscribers.get(event_id, no_subscribers),
+                                       pending_callback_chains, timeout_chains)
+        order = [(chain_position[chain_name], chain_name) for chain_name in queued]
+        heapify(order)
+        changes = []
+        saved_changes = self._subscription_changes
+        self._subscription_changes = changes
+        try:
+            read_index = 0
+            last_position = -1
+            while True:
+                if read_index < len(changes):
+                    # other threads may append while the new entries are read
+                    new_changes = changes[read_index:]
+                    read_index += len(new_changes)
+                    for chain_name in new_changes:
+                        if (chain_name not in queued and chain_position[chain_name] > last_position
+                                and is_candidate(chain_name)):
+                            queued.add(chain_name)
+                            heappush(order, (chain_position[chain_name], chain_name))
+                if not order:
+                    break
+                last_position, chain_name = heappop(order)
+                # a queued chain may have stopped reacting since it was queued
+                if chain_dict[chain_name]['active'] and is_candidate(chain_name):
+                    self.execute_chain_event(chain_name,event)
+        finally:
+            self._subscription_changes = saved_changes
+        
         
     
     def execute_chain_event(self, chain: str, event: Event):
+        """
+        Run a chain on its queued callback events, the event and the callback events queued meanwhile
+        
+        The callback queue itself is checked, so callback events queued
+        without flagging the chain in _pending_callback_chains still run.
+        The flag is cleared before each check: a sender queues its event
+        before setting the flag, so an event queued by another thread while
+        the queue drains leaves the chain flagged for the next dispatch.
+        """
         self._current_chain = chain
         if not self.chain_dict[chain]['active']:
             return
-        while self.event_system.has_callback_events(chain):
-            event_cb = self.event_system.get_next_callback_event(chain)
-            if event is not None:
-                self.execute_chain_element(chain,event_cb)
+        has_callback_events = self.event_system.has_callback_events
+        pending_callback_chains = self._pending_callback_chains
+        pending_callback_chains.discard(chain)
+        if has_callback_events(chain):
+            self._execute_callback_events(chain)
           
         self.execute_chain_element(chain,event)
         
-        while self.event_system.has_callback_events(chain):
-            event_cb = self.event_system.get_next_callback_event(chain)
-        
-            if event is not None:
+        pending_callback_chains.discard(chain)
+        if has_callback_events(chain):
+            self._execute_callback_events(chain)
+        if self._compiled_chains[chain].dirty:
+            self._update_subscription(chain)
+     
+    def _execute_callback_events(self, chain: str):
+        """
+        Run a chain on its queued callback events, including those queued meanwhile
+        """
+        drain_callbacks = self.event_system.drain_callbacks
+        compiled_chain = self._compiled_chains[chain]
+        while True:
+            events = drain_callbacks(chain)
+            if not events:
+                return
+            generation = compiled_chain.generation
+            for event_cb in events:
+                if compiled_chain.generation != generation:
+                    # the chain was disabled or reset, which clears its queue
+                    break
                 self.execute_chain_element(chain,event_cb)
      
     def execute_chain_element(self, chain: str, event: Event):
-        for element in self.chain_dict[chain]['element_list']:
-            element["current_chain"] = chain
-            if element['enable'] == False:
+        compiled_chain = self._compiled_chains[chain]
+        enable = compiled_chain.enable
+        initialized = compiled_chain.initialized
+        elements = compiled_chain.elements
+        process_functions = compiled_chain.process_functions
+        initialization_functions = compiled_chain.initialization_functions
+        return_code_lookup = self._return_code_lookup
+        for index in range(compiled_chain.length):
+            if not enable[index]:
                 continue
-            if element['enable'] and element['initialized'] == False:
-                element['initialized'] = True
-                if element['initialization_function'] is not None:
-                    element['initialization_function'](element)
+            element = elements[index]
+            if not initialized[index]:
+                initialized[index] = 1
+                compiled_chain.dirty = True
+                if initialization_functions[index] is not None:
+                    initialization_functions[index](element)
             self._system_active = True
-            return_code = element['process_function'](element,event)
-            continue_flag = self.analyze_return_code(chain,element,return_code)
-            if not continue_flag:
+            result = process_functions[index](element,event)
+            try:
+                return_code = return_code_lookup(result)
+            except (KeyError, TypeError):
+                if self._strict_return_codes:
+                    raise
+                raise self._invalid_return_code(chain,element,result) from None
+            if return_code is CF_CONTINUE:
+                if result is True:
+                    raise self._invalid_return_code(chain,element,result)
+                continue
+            if return_code is CF_HALT:
+                if result is False:
+                    raise self._invalid_return_code(chain,element,result)
+                break
+            if not self._return_code_handlers[return_code](chain,compiled_chain,index):
                 break
 
  
 
-    def analyze_return_code(self, chain: str, element: dict, return_code: str):
-        valid_return_codes = ["CF_HALT", "CF_CONTINUE", "CF_DISABLE", "CF_RESET", "CF_TERMINATE"]
+    def enable_profiling(self):
+        """
+        Swap in the instrumented dispatcher and return the ChainFlowProfiler
+        
+        Statistics recorded by an earlier profiling session are kept.
+        """
+        if self.profiler is None:
+            self.profiler = ChainFlowProfiler(self)
+        self.profiler.attach()
+        return self.profiler
+    
+    def disable_profiling(self):
+        """Restore the plain dispatcher; the profiler keeps its statistics"""
+        if self.profiler is not None:
+            self.profiler.detach()
+    
+    def enable_metrics(self, tick_period=0.1, prometheus_path=None, export_interval=10.0,
+                       prometheus_buckets=PROMETHEUS_BUCKETS):
+        """
+        Start recording the tick time, event latency and overrun metrics
+        
+        Args:
+            tick_period (float): Seconds a tick may take before it counts as an overrun
+            prometheus_path (str, optional): File to export the metrics to in
+                the Prometheus text format every export_interval seconds
+            export_interval (float): Seconds between exports
+            prometheus_buckets (sequence): Histogram bucket bounds in seconds
+            
+        Returns:
+            EngineMetrics: The metrics, see EngineMetrics.get_stats()
+        """
+        if self.metrics is not None:
+            self.metrics.detach()
+        self.metrics = EngineMetrics(self, tick_period, prometheus_path, export_interval, prometheus_buckets)
+        self.metrics.attach()
+        return self.metrics
+    
+    def disable_metrics(self):
+        """Stop recording metrics; the recorded metrics are kept"""
+        if self.metrics is not None:
+            self.metrics.detach()
+            
+    def get_metrics_stats(self):
+        """Return EngineMetrics.get_stats(), None if metrics were never enabled"""
+        if self.metrics is None:
+            return None
+        return self.metrics.get_stats()
+    
+    def snapshot(self, buffer_callback=None):
+        """
+        Serialize the runtime state of the chains
+        
+        Saved: the active chains, the element enable / initialized flags, the
+        element data of the opcodes (wait counters, watch dog counts, ...),
+        the chain data, both event queues, the tick count and the pending
+        and expired timeouts.  Callables are not saved: restore() keeps the
+        ones of the system it restores into.  Call it on the engine thread
+        between events.
+        
+        Args:
+            buffer_callback (callable, optional): Passed to pickle protocol 5;
+                the element flag arrays are then handed to it out of band
+                instead of being copied into the returned bytes.  The
+                buffers view the live arrays: copy or send them before
+                the engine runs again
+                
+        Returns:
+            bytes: The snapshot
+        """
+        return take_snapshot(self, buffer_callback)
+    
+    def restore(self, data, buffers=None):
+        """
+        Load a snapshot into a finalized ChainFlow built with the same chains
+        
+        The next engine start keeps the restored state instead of running
+        initialize_chains().  Elements holding an awaitable or offloaded
+        work that was in flight are initialized again, restarting the work.
+        Timeouts in seconds keep their wall clock deadlines.
+        
+        Args:
+            data (bytes): Result of snapshot()
+            buffers (iterable, optional): The out of band buffers given to
+                snapshot()'s buffer_callback, in order
+                
+        Raises:
+            ValueError: If the snapshot does not match the chains
+        """
+        restore_snapshot(self, data, buffers)
+        
+    def enable_journal(self, directory, segment_bytes=64 << 20, segment_seconds=None,
+                       commit_interval=0.005, commit_bytes=1 << 20, fsync=True):
+        """
+        Start journaling the accepted events to a write ahead journal
+        
+        See cf_journal.EventJournal.  The writer thread syncs the records
+        in groups, so an event is durable commit_interval seconds after it
+        was sent at the latest; EventJournal.sync() waits for it.
+        
+        Args:
+            directory (str): Directory of the journal segments
+            segment_bytes (int): Size at which a segment rolls over
+            segment_seconds (float, optional): Age at which a segment rolls over
+            commit_interval (float): Seconds between group commits
+            commit_bytes (int): Pending bytes that trigger a commit at once
+            fsync (bool): Sync each commit to disk
+            
+        Returns:
+            EventJournal: The journal
+        """
+        self.disable_journal()
+        self.journal = EventJournal(self, directory, segment_bytes, segment_seconds,
+                                    commit_interval, commit_bytes, fsync=fsync)
+        self.journal.attach()
+        return self.journal
+    
+    def disable_journal(self):
+        """Stop journaling; the pending records are committed first"""
+        if self.journal is not None:
+            # close() refuses while a layer attached later still hooks the journal's methods
+            self.journal.close()
+            self.journal = None
+            
+    def replay_journal(self, directory, engine="polled", tick_period=0.1, start_sequence=0, settle_time=0.0):
+        """
+        Run the engine on the events of a journal under a simulated clock
+        
+        The clock starts at the time of the first record and the engine
+        runs until settle_time seconds after the last one; each event is
+        sent when the clock reaches its recorded time.  Events flagged
+        internal (sent by chains, awaitable and offload completions) are not
+        sent again, the chains generate them.  Replay into a ChainFlow built
+        like the recorded one, freshly finalized or restored from a snapshot
+        taken at start_sequence.  Afterwards the engine gets its own clock
+        back and its next start keeps the replayed state.
+        
+        Args:
+            directory (str): Journal directory
+            engine (str): "polled" for cf_engine_start(), "event_driven"
+                for cf_engine_start_event_driven(), as recorded
+            tick_period (float): Seconds between ticks of the recorded engine
+            start_sequence (int): First record to replay
+            settle_time (float): Seconds to run on after the last record
+            
+        Returns:
+            dict: Counts of the replayed, internal and dropped records,
+            the last sequence and the end time
+        """
+        return replay_events(self, directory, engine, tick_period, start_sequence, settle_time)
+        
+    def _start_chains(self):
+        """Initialize the chains when an engine starts, unless a snapshot was restored"""
+        if self._restored:
+            self._restored = False
+        else:
+            self.initialize_chains()
+    
+    def set_return_code_checking(self, strict):
+        """
+        Select how process function return codes are validated
+        
+        Args:
+            strict (bool): True to type check and validate every return code
+                with descriptive errors (development), False to map return
+                codes with a table lookup (production), which still rejects
+                unknown codes and bools with a ValueError
+        """
+        if not isinstance(strict, bool):
+            raise TypeError("strict must be a boolean")
+        self._strict_return_codes = strict
+        if strict:
+            self._return_code_lookup = self._check_return_code
+        else:
+            self._return_code_lookup = RETURN_CODE_TABLE.__getitem__
+            
+    def _check_return_code(self, return_code):
+        if type(return_code) is ReturnCode:
+            return return_code
         if type(return_code) is not str:
-            raise TypeError("return_code must be a string")
-        if return_code not in valid_return_codes:
+            raise TypeError("return_code must be a CF_* string or ReturnCode")
+        code = RETURN_CODE_NAMES.get(return_code)
+        if code is None:
             raise ValueError(f"Invalid return code: {return_code}")
-        continue_flag = False
-        if return_code == "CF_HALT":
-            return False
-        elif return_code == "CF_CONTINUE":
-            return True
-        elif return_code == "CF_DISABLE":
-            element['enable'] = False
-            element['initialized'] = False
-            return True
-        elif return_code == "CF_RESET":
-            self.disable_chain(chain)
-            self.enable_chain(chain)
-            return False
-        elif return_code == "CF_TERMINATE":
-         
-            self.disable_chain(chain)
-            return False
+        return code
+
+    def _invalid_return_code(self, chain, element, return_code):
+        """
+        Return the error for a return code the unchecked lookup does not map
+        
+        The table lookup raises a bare KeyError for unknown codes and maps
+        True and False to CF_CONTINUE and CF_HALT, as they hash like 1 and 0;
+        the strict lookup raises its own errors and rejects bools.
+        """
+        return ValueError(f"Chain '{chain}' element '{element['name']}' returned "
+                          f"an invalid return code: {return_code!r}")
+        
+    def analyze_return_code(self, chain: str, element: dict, return_code):
+        """
+        Apply a return code to an element of a chain
+        
+        Returns:
+            bool: True if the chain is to continue with the next element
+        
+        Raises:
+            TypeError, ValueError: If the return code is not a CF_* string or
+                ReturnCode (nor, with checking off, the int value of one)
+        """
+        try:
+            code = self._return_code_lookup(return_code)
+        except (KeyError, TypeError):
+            if self._strict_return_codes:
+                raise
+            raise self._invalid_return_code(chain,element,return_code) from None
+        if return_code is True or return_code is False:
+            raise self._invalid_return_code(chain,element,return_code)
+        return self._return_code_handlers[code](chain,self._compiled_chains[chain],element._index)
+    
+    def _return_code_halt(self, chain, compiled_chain, index):
+        return False
+    
+    def _return_code_continue(self, chain, compiled_chain, index):
+        return True
+    
+    def _return_code_disable(self, chain, compiled_chain, index):
+        compiled_chain.enable[index] = 0
+        compiled_chain.initialized[index] = 0
+        compiled_chain.dirty = True
+        return True
+    
+    def _return_code_reset(self, chain, compiled_chain, index):
+        self.disable_chain(chain)
+        self.enable_chain(chain)
+        return False
+    
+    def _return_code_terminate(self, chain, compiled_chain, index):
+        self.disable_chain(chain)
+        return False
             
       
         
     def cf_engine_start(self):
         """
         Start the chain flow engine
+        
+        With a simulated clock the engine advances the clock by its
+        tick_period on each pass instead of calling time_tick().
         """
        
    
 
-        self.time_stamp = time.time()
-        self.ref_second = int(self.time_stamp % 60)
-        self.ref_minute = int(self.ref_second / 60)
-        self.ref_hour = int(self.ref_second / 3600)
-        self.ref_day = int(self.ref_second / 86400)
+        self.time_stamp = self.current_time()
+        self._reset_calendar_reference()
         
 
         
         while True:
         
         
-            self.initialize_chains()
+            self._start_chains()
             
             self._system_active = True
             while True:
                 
                 if self._system_active == False:
                    return
-                self.time_tick() #time delay function  
-                self.ref_time_stamp = self.time_stamp
-                self.time_stamp = time.time()
-                self.current_second = int(self.time_stamp % 60)
-                self.current_minute = int(self.current_second / 60)
-                self.current_hour = int(self.current_second / 3600)
-                self.current_day = int(self.current_second / 86400)
-                   
-                self.time_stamp =time.time()
-                event = Event("CF_TIMER_EVENT",{'delta_time':self.time_stamp - self.ref_time_stamp,'time_stamp':self.time_stamp})
-                self.send_system_event(event)
-             
+                self._engine_pass()
+                
+    def run_ticks(self, ticks):
+        """
+        Run up to ticks passes of the polled engine and return
+        
+        The first call starts the engine as cf_engine_start() does, later
+        calls continue where the previous one returned; run_ticks(0) only
+        starts it.  Meant for stepping the engine on a SimulatedClock from
+        tests and benchmarks.
+        
+        Args:
+            ticks (int): Number of engine passes to run
+            
+        Returns:
+            bool: True if the system is still active, False once it has
+            stopped (the next call starts the engine again)
+        """
+        if not self._stepping:
+            self.time_stamp = self.current_time()
+            self._reset_calendar_reference()
+            self._start_chains()
+            self._system_active = True
+            self._stepping = True
+        for _ in range(ticks):
+            if not self._system_active:
+                break
+            self._engine_pass()
+        if not self._system_active:
+            self._stepping = False
+        return self._system_active
+    
+    def _engine_pass(self):
+        """One pass of the polled engine: wait for the tick, queue the time events and dispatch them"""
+        if self.clock.simulated:
+            self.clock.sleep(self.clock.tick_period)
+        else:
+            self.time_tick() #time delay function  
+        self.drain_posted_events()
+        self._queue_time_events(True)
+        self.execute_system_event_loop()
                 
+    def cf_engine_start_event_driven(self, tick_period=0.1):
+        """
+        Start the chain flow engine without polling time_tick()
+        
+        The engine sleeps until the earliest of the next tick, the next
+        schedule_timeout() deadline, the next second boundary or an event
+        posted with post_system_event() / post_named_queue_event(), so posted
+        events are handled as soon as they arrive.  A CF_TIMER_EVENT is
+        queued when a tick or a deadline is due.  Ticks are only scheduled
+        while some chain reacts to CF_TIMER_EVENT, reacts to every event,
+        has queued callback events or has a timeout counted in ticks; an
+        idle system only wakes for the calendar events.
+        
+        Events sent from other threads with send_system_event() are seen on
+        the next wake up; use the post_* methods to wake the engine.
+        With a simulated clock the engine never sleeps: it advances the
+        clock straight to the time it would have woken up.
+        As with cf_engine_start(), the engine stops when an event is
+        dispatched while no chain is live; without ticks that is at the
+        latest the next calendar event.
+        
+        Args:
+            tick_period (float): Seconds between CF_TIMER_EVENTs
+        """
+        if tick_period <= 0:
+            raise ValueError("tick_period must be positive")
+        self.time_stamp = self.current_time()
+        self._reset_calendar_reference()
+        
+        while True:
+            self._start_chains()
             
-                if self.current_second != self.ref_second:
-                    self.ref_second = self.current_second
-                    event = Event("CF_SECOND_EVENT",{'second':self.current_second,'time_stamp':self.time_stamp})
-                    self.send_system_event(event)
+            self._system_active = True
+            next_tick = self.time_stamp + tick_period
+            wait = None
+            while True:
+                self._wait_for_posted_events(wait)
+                next_tick, wait = self._event_driven_step(next_tick, tick_period)
+                if wait is None:
+                    return
                 
-                if self.current_minute != self.ref_minute:
-                    self.ref_minute = self.current_minute
-                    event = Event("CF_MINUTE_EVENT",{'minute':self.current_minute,'time_stamp':self.time_stamp})
-                    self.send_system_event(event)
-            
-                if self.current_hour != self.ref_hour:
-                    self.ref_hour = self.current_hour
-                    event = Event("CF_HOUR_EVENT",{'hour':self.current_hour,'time_stamp':self.time_stamp})
-                    self.send_system_event(event)
+    async def run_async(self, event_queue=None, tick_period=0.1):
+        """
+        Run the chain flow engine as an asyncio coroutine
+        
+        Same engine as cf_engine_start_event_driven(), except that it
+        waits on event_queue instead of blocking the thread, so other tasks
+        and the coroutines started by asm_await run while the engine is
+        idle.  event_queue items are either an Event, sent as a system
+        event, or a (chain_name, Event) tuple, sent to the chain's named
+        queue if the chain is active; None items only wake the engine.
+        Events posted from other threads with the post_* methods are seen
+        on the next wake up.  With a simulated clock the engine advances the
+        clock when event_queue is empty instead of waiting on it; asyncio's
+        own timers keep running on real time.  The coroutine returns when an
+        event is dispatched while no chain is live, as cf_engine_start()
+        does, or on CF_TERMINATE_SYSTEM.
+        
+        Args:
+            event_queue (asyncio.Queue, optional): Queue of incoming events,
+                created if None; available as async_event_queue
+            tick_period (float): Seconds between CF_TIMER_EVENTs
+        """
+        if tick_period <= 0:
+            raise ValueError("tick_period must be positive")
+        self._event_loop = asyncio.get_running_loop()
+        self.async_event_queue = event_queue if event_queue is not None else asyncio.Queue()
+        try:
+            self.time_stamp = self.current_time()
+            self._reset_calendar_reference()
+            
+            while True:
+                self._start_chains()
                 
-                if self.current_day != self.ref_day:
-                    self.ref_day = self.current_day
-                    event = Event("CF_DAY_EVENT",{'day':self.current_day,'time_stamp':self.time_stamp})
-                    self.send_system_event(event)
-                    
-                self.execute_system_event_loop()
-       
+                self._system_active = True
+                next_tick = self.time_stamp + tick_period
+                wait = None
+                while True:
+                    await self._receive_async_events(wait)
+                    self.drain_posted_events()
+                    next_tick, wait = self._event_driven_step(next_tick, tick_period)
+                    if wait is None:
+                        return
+        finally:
+            self._event_loop = None
+            
+    def _wait_for_posted_events(self, wait):
+        """Wait up to wait seconds for a posted event, then queue the posted events"""
+        if not self.clock.simulated:
+            self.drain_posted_events(wait)
+            return
+        self.drain_posted_events()
+        if wait and not self.event_system.has_normal_events() and not self._pending_callback_chains:
+            # nothing to do before the next deadline, jump to it
+            self.clock.sleep(wait)
+            
+    async def _receive_async_events(self, wait):
+        """Wait up to wait seconds for an incoming event, then queue all received events"""
+        event_queue = self.async_event_queue
+        if event_queue.empty():
+            if self.clock.simulated:
+                await asyncio.sleep(0)
+                if wait and event_queue.empty():
+                    self.clock.sleep(wait)
+            elif wait:
+                try:
+                    self._queue_async_event(await asyncio.wait_for(event_queue.get(), wait))
+                except asyncio.TimeoutError:
+                    return
+            else:
+                # let other tasks run between engine steps
+                await asyncio.sleep(0)
+        while not event_queue.empty():
+            self._queue_async_event(event_queue.get_nowait())
+            
+    def _queue_async_event(self, item):
+        if item is None:
+            return
+        if isinstance(item, tuple):
+            chain_name, event = item
+            if self.chain_dict[chain_name]['active']:
+                self.send_named_queue_event(chain_name, event)
+        else:
+            self.send_system_event(item)
+            
+    def start_awaitable(self, chain_name: str, awaitable):
+        """
+        Run an awaitable on the engine's event loop for a chain
+        
+        When it is done the chain is sent a CF_AWAIT_EVENT whose data is
+        the returned task, unless the chain is no longer active.
+        
+        Raises:
+            RuntimeError: If the engine is not running under run_async()
+        """
+        if self._event_loop is None:
+            raise RuntimeError("awaitables require the engine to run under run_async()")
+        if chain_name not in self.chain_dict:
+            raise ValueError(f"Chain '{chain_name}' does not exist")
+        task = asyncio.ensure_future(awaitable, loop=self._event_loop)
+        task.add_done_callback(lambda task: self._awaitable_done(chain_name, task))
+        return task
+    
+    def _awaitable_done(self, chain_name, task):
+        # runs on the event loop while the engine is waiting for events
+        chain_data = self.chain_dict.get(chain_name)
+        if self._event_loop is None or chain_data is None or not chain_data['active']:
+            return
+        self.send_named_queue_event(chain_name, Event.trusted("CF_AWAIT_EVENT", task))
+        if self.async_event_queue.empty():
+            self.async_event_queue.put_nowait(None)
+            
+    def configure_offload(self, kind="thread", max_workers=None, executor=None):
+        """
+        Set the executor used by the offload opcodes for a kind of work
+        
+        At most max_workers submissions are in flight per kind; further
+        submissions are refused until one completes, so work never queues
+        up behind the pool.
+        
+        Args:
+            kind (str): "thread" or "process"
+            max_workers (int, optional): Pool size, defaults to the
+                ThreadPoolExecutor / ProcessPoolExecutor default
+            executor (Executor, optional): Executor to use instead of a new
+                pool; max_workers is then required
+        """
+        if kind not in ("thread", "process"):
+            raise ValueError("kind must be 'thread' or 'process'")
+        if executor is None:
+            if max_workers is None:
+                cpu_count = os.cpu_count() or 1
+                max_workers = min(32, cpu_count + 4) if kind == "thread" else cpu_count
+            if kind == "thread":
+                executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="chain_flow_offload")
+            else:
+                executor = ProcessPoolExecutor(max_workers=max_workers)
+        elif max_workers is None:
+            raise ValueError("max_workers is required with an executor")
+        self.shutdown_offload(kind)
+        self._offload_executors[kind] = (executor, threading.BoundedSemaphore(max_workers))
+        
+    def submit_offload(self, chain_name: str, offload_fn, fn_data, kind="thread"):
+        """
+        Run offload_fn(fn_data) on an offload executor for a chain
+        
+        When it completes the chain is sent a CF_OFFLOAD_EVENT, whose data
+        is the returned future, through the thread safe posted event path.
+        
+        Returns:
+            Future, or None if the executor already has max_workers
+            submissions in flight
+        """
+        if chain_name not in self.chain_dict:
+            raise ValueError(f"Chain '{chain_name}' does not exist")
+        if kind not in self._offload_executors:
+            self.configure_offload(kind)
+        executor, in_flight = self._offload_executors[kind]
+        if not in_flight.acquire(blocking=False):
+            return None
+        try:
+            future = executor.submit(offload_fn, fn_data)
+        except BaseException:
+            in_flight.release()
+            raise
+        future.add_done_callback(lambda future: self._offload_done(chain_name, in_flight, future))
+        return future
+    
+    def _offload_done(self, chain_name, in_flight, future):
+        # runs on an executor thread
+        in_flight.release()
+        if chain_name in self.event_system.callback_events:
+            self.post_named_queue_event(chain_name, Event.trusted("CF_OFFLOAD_EVENT", future))
+        
+    def shutdown_offload(self, kind=None, wait=True):
+        """
+        Shut down the offload executors
+        
+        Args:
+            kind (str, optional): Executor kind, None for all
+            wait (bool): Wait for the work in flight to finish
+        """
+        kinds = list(self._offload_executors) if kind is None else [kind]
+        for kind in kinds:
+            entry = self._offload_executors.pop(kind, None)
+            if entry is not None:
+                entry[0].shutdown(wait=wait)
+            
+    def _event_driven_step(self, next_tick, tick_period):
+        """
+        Run one wake up of the event driven engines
+        
+        Returns:
+            (next_tick, wait): The next tick time and the seconds to sleep,
+            wait is None when the system has stopped
+        """
+        self._execute_pending_callbacks()
+        now = self.current_time()
+        tick = (now >= next_tick and self._needs_ticks()) or self._time_deadline_due()
+        if tick:
+            next_tick = now + tick_period
+        self._queue_time_events(tick)
+        self.execute_system_event_loop()
+        # as in cf_engine_start(), the system stops when an event finds no live chain
+        if self._system_active == False:
+            return next_tick, None
+        return next_tick, self._idle_time(next_tick)
+    
+    def _execute_pending_callbacks(self):
+        """
+        Run the chains with queued callback events without waiting for a system event
+        """
+        pending_callback_chains = self._pending_callback_chains
+        chain_position = self._chain_position
+        while pending_callback_chains:
+            for chain_name in sorted(pending_callback_chains, key=chain_position.__getitem__):
+                pending_callback_chains.discard(chain_name)
+                chain_data = self.chain_dict.get(chain_name)
+                if chain_data is None or not chain_data['active']:
+                    continue
+                self._current_chain = chain_name
+                self._execute_callback_events(chain_name)
+                if self._compiled_chains[chain_name].dirty:
+                    self._update_subscription(chain_name)
+                
+    def _needs_ticks(self):
+        """True if some chain depends on periodic CF_TIMER_EVENTs"""
+        return bool("CF_TIMER_EVENT" in self._event_subscribers or self._wildcard_chains
+                    or self._pending_callback_chains or len(self._tick_wheel))
+    
+    def _time_deadline_due(self):
+        deadline = self._time_wheel.next_deadline()
+        return deadline is not None and self._time_ms() >= deadline
+    
+    def _idle_time(self, next_tick):
+        """Seconds the event driven engine may sleep before it has work to do"""
+        if self.event_system.has_normal_events():
+            return 0
+        now = self.current_time()
+        wake_time = self._calendar.next_boundary  # next CF_SECOND_EVENT
+        if self._needs_ticks() and next_tick < wake_time:
+            wake_time = next_tick
+        deadline = self._time_wheel.next_deadline()
+        if deadline is not None and deadline / 1000 < wake_time:
+            wake_time = deadline / 1000
+        return max(wake_time - now, 0)
+    
+    def _reset_calendar_reference(self):
+        self._calendar.reset(self.time_stamp)
+        
+    def _queue_time_events(self, tick):
+        """
+        Queue the CF_TIMER_EVENT, if tick, and the calendar events that are due
+        """
+        now = self.current_time()
+        
+        if tick:
+            self.ref_time_stamp = self.time_stamp
+            self.time_stamp = now
+            # a new event every tick: chains may keep the event or its data
+            self.send_system_event(Event.trusted("CF_TIMER_EVENT",{'delta_time':self.time_stamp - self.ref_time_stamp,
+                                                                   'time_stamp':self.time_stamp}),engine_event=True)
+        
+        if now >= self._calendar.next_boundary:
+            for event in self._calendar.advance(now):
+                self.send_system_event(event,engine_event=True)
         
     def cf_engine_stop(self):
         """
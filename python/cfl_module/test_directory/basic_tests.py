@@ -8,6 +8,7 @@ class CF_Basic_Tests():
         self.test_sequence_dict = {}
         self.test_sequence_dict["test_chain_management"] = self.test_chain_management
         self.test_sequence_dict["test_system_reset"] = self.test_system_reset
+        self.test_sequence_dict["test_invalid_return_codes"] = self.test_invalid_return_codes
            
     def run_test_sequence(self,test_sequence_name):
       
@@ -171,4 +172,46 @@ class CF_Basic_Tests():
         
         
         
-    
\ No newline at end of file
+    
+
+    def test_invalid_return_codes(self):
+        print("\n\ntest_invalid_return_codes")
+        returned = []
+        for strict,return_code,error_type in ((False,True,ValueError),(False,False,ValueError),
+                                               (False,"CF_BOGUS",ValueError),(False,7,ValueError),
+                                               (False,[],ValueError),(True,True,TypeError),
+                                               (True,"CF_BOGUS",ValueError)):
+            self.cf.set_return_code_checking(strict)
+            try:
+                self.cf.reset_cf()
+                self.cf.define_chain("returns",auto_flag=True)
+                self.cf.add_element(lambda element,event,return_code=return_code: return_code,name = "bad_return")
+                self.cf.end_chain()
+                self.cf.finalize()
+                self.cf.initialize_chains()
+                try:
+                    self.cf.execute_chain_element("returns",self.event("CF_TIMER_EVENT",None))
+                    raise AssertionError(f"return code {return_code!r} was accepted")
+                except error_type as error:
+                    returned.append(str(error))
+                if not strict:
+                    message = returned[-1]
+                    assert "returns" in message and "bad_return" in message and repr(return_code) in message, message
+            finally:
+                self.cf.set_return_code_checking(True)
+                self.cf.reset_cf()
+        # the unchecked lookup still takes the int values
+        self.cf.set_return_code_checking(False)
+        try:
+            self.cf.define_chain("returns",auto_flag=True)
+            self.cf.add_element(lambda element,event: 1,name = "int_return")
+            self.cf.add_element(lambda element,event: "CF_HALT",name = "halt")
+            self.cf.end_chain()
+            self.cf.finalize()
+            self.cf.initialize_chains()
+            self.cf.execute_chain_element("returns",self.event("CF_TIMER_EVENT",None))
+        finally:
+            self.cf.set_return_code_checking(True)
+            self.cf.reset_cf()
+        print(returned)
+        print("Invalid return codes test passed\n\n")
@@ -0,0 +1,149 @@
+from datetime import datetime, timezone
+from cf_calendar import CalendarScheduler, CronSchedule
+from cf_clock import SimulatedClock
+def utc(*args):
+    return datetime(*args,tzinfo = timezone.utc).timestamp()
+class CF_Calendar_Test():
+    """
+    Checks the calendar: the second, minute, hour and day boundaries of the
+    scheduler, including clock jumps and daylight saving days, cron
+    schedules, and the calendar events and cron waits of a running engine.
+    """
+    def __init__(self,cf,op,Event):
+        self.cf = cf
+        self.op = op
+        self.event = Event
+        self.test_sequence_dict = {}
+        self.test_sequence_dict["test_calendar_scheduler"] = self.test_calendar_scheduler
+        self.test_sequence_dict["test_cron_schedule"] = self.test_cron_schedule
+        self.test_sequence_dict["test_calendar_events_fire"] = self.test_calendar_events_fire
+
+
+    def run_test_sequence(self,test_sequence_name):
+
+        if test_sequence_name in self.test_sequence_dict:
+            print("sequence name",test_sequence_name)
+            print("\n\nrunning test sequence",test_sequence_name)
+            self.test_sequence_dict[test_sequence_name]()
+            print("end of test sequence\n\n",test_sequence_name)
+
+        else:
+            raise ValueError(f"Test sequence {test_sequence_name} not found")
+
+    def run_all_test_sequences(self):
+
+        for test_sequence_name in self.test_sequence_dict:
+            self.run_test_sequence(test_sequence_name)
+
+    def test_calendar_scheduler(self):
+        print("\n\ntest_calendar_scheduler")
+        scheduler = CalendarScheduler("UTC")
+        start = utc(2026,3,1,23,59,58,500000)
+        scheduler.reset(start)
+        assert scheduler.advance(start + 0.4) == []
+        assert [event.event_id for event in scheduler.advance(start + 0.5)] == ["CF_SECOND_EVENT"]
+        events = scheduler.advance(start + 1.5)
+        assert [event.event_id for event in events] == ["CF_SECOND_EVENT","CF_MINUTE_EVENT","CF_HOUR_EVENT","CF_DAY_EVENT"]
+        assert events[1].data['minute'] == 0 and events[2].data['hour'] == 0, events
+        assert events[3].data['date'] == datetime(2026,3,2).date() and events[3].data['weekday'] == 0
+        # a jump over several boundaries of a kind gives one event of that kind
+        events = scheduler.advance(start + 1.5 + 600)
+        assert [event.event_id for event in events] == ["CF_SECOND_EVENT","CF_MINUTE_EVENT"], events
+        assert scheduler.advance(start + 1.5 + 600.5) == []
+
+        # the spring forward day in Paris is 23 hours long and has no 02:00
+        scheduler = CalendarScheduler("Europe/Paris")
+        start = utc(2026,3,28,23,0)  # 00:00 on the 29th in Paris
+        scheduler.reset(start - 1)
+        hours = []
+        days = []
+        for second in range(0,25 * 3600,60):
+            for event in scheduler.advance(start + second):
+                if event.event_id == "CF_HOUR_EVENT":
+                    hours.append(event.data['hour'])
+                elif event.event_id == "CF_DAY_EVENT":
+                    days.append(second)
+        assert hours == [0,1] + list(range(3,24)) + [0,1], hours
+        assert days == [0,23 * 3600], days
+        try:
+            CalendarScheduler("Not/A_Timezone")
+            raise AssertionError("an unknown timezone was accepted")
+        except ValueError:
+            pass
+        print("Calendar scheduler test passed\n\n")
+
+    def test_cron_schedule(self):
+        print("\n\ntest_cron_schedule")
+        saturday = utc(2026,10,17,12,0)
+        schedule = CronSchedule("*/15 8-17 * * mon-fri")
+        assert schedule.next_after(saturday,"UTC") == utc(2026,10,19,8,0)
+        assert schedule.next_after(utc(2026,10,19,8,0),"UTC") == utc(2026,10,19,8,15)
+        assert schedule.next_after(utc(2026,10,19,17,45),"UTC") == utc(2026,10,20,8,0)
+        # both day fields restricted: either one matches
+        schedule = CronSchedule("0 0 13 * fri")
+        assert schedule.next_after(utc(2026,10,17),"UTC") == utc(2026,10,23)
+        assert schedule.next_after(utc(2026,11,10),"UTC") == utc(2026,11,13)
+        assert CronSchedule("@daily").next_after(utc(2026,10,17,23,59,30),"UTC") == utc(2026,10,18)
+        assert CronSchedule("0 12 29 feb *").next_after(utc(2026,3,1),"UTC") == utc(2028,2,29,12,0)
+        # 02:30 does not exist in Paris on the spring forward day
+        paris = CronSchedule("30 2 * * *")
+        assert paris.next_after(utc(2026,3,28,12,0),"Europe/Paris") == utc(2026,3,30,0,30)
+        for expression in ("* * * *","60 * * * *","* * * foo *","5-1 * * * *","0 0 31 feb *"):
+            try:
+                CronSchedule(expression)
+                raise AssertionError(f"cron expression '{expression}' was accepted")
+            except ValueError:
+                pass
+        print("Cron schedule test passed\n\n")
+
+    def test_calendar_events_fire(self):
+        print("\n\ntest_calendar_events_fire")
+        saved_clock = self.cf.clock
+        saved_timezone = self.cf.timezone
+        try:
+            self.cf.clock = SimulatedClock(start = utc(2026,1,1,23,58,30),tick_period = 1.0)
+            self.cf.timezone = "UTC"
+            self.cf.reset_cf()
+            received = []
+            fired = []
+
+            def record(data,event):
+                if event.event_id in ("CF_SECOND_EVENT","CF_MINUTE_EVENT","CF_HOUR_EVENT","CF_DAY_EVENT"):
+                    received.append((event.event_id,event.data))
+                return False
+
+            self.cf.define_chain("calendar",auto_flag=True)
+            self.op.asm_wait(record,None,None,None)
+            self.cf.end_chain()
+
+            # resets after the wait, so it fires on every matching minute
+            self.cf.define_chain("cron",auto_flag=True)
+            self.op.asm_wait_for_schedule("* * * * *")
+            self.op.asm_one_shot_handler(lambda data: fired.append(self.cf.current_time()),None)
+            self.op.asm_reset()
+            self.cf.end_chain()
+
+            self.cf.define_chain("stop",auto_flag=True)
+            self.op.asm_wait(lambda data,event: len(fired) == 2,None,None,None)
+            self.op.asm_terminate_system()
+            self.cf.end_chain()
+            self.cf.finalize()
+            self.cf.cf_engine_start()
+
+            print(fired,[(event_id,data) for event_id,data in received if event_id != "CF_SECOND_EVENT"])
+            # like wait_time, on the first tick strictly after the matching minute
+            assert [int(time_stamp - boundary) for time_stamp,boundary in zip(fired,(utc(2026,1,1,23,59),utc(2026,1,2)))] == [1,1], fired
+            seconds = [data['time_stamp'] for event_id,data in received if event_id == "CF_SECOND_EVENT"]
+            # one second event per second, none skipped
+            assert seconds[0] <= utc(2026,1,1,23,58,31) and seconds[-1] >= utc(2026,1,2), seconds
+            assert all(later - earlier == 1.0 for earlier,later in zip(seconds,seconds[1:])), seconds
+            others = [(event_id,data['time_stamp']) for event_id,data in received if event_id != "CF_SECOND_EVENT"]
+            assert others == [("CF_MINUTE_EVENT",utc(2026,1,1,23,59)),("CF_MINUTE_EVENT",utc(2026,1,2)),
+                              ("CF_HOUR_EVENT",utc(2026,1,2)),("CF_DAY_EVENT",utc(2026,1,2))], others
+            day = [data for event_id,data in received if event_id == "CF_DAY_EVENT"][0]
+            assert day['day'] == 2 and day['date'] == datetime(2026,1,2).date()
+        finally:
+            self.cf.clock = saved_clock
+            self.cf.timezone = saved_timezone
+            self.cf.reset_cf()
+        print("Calendar events fire test passed\n\n")
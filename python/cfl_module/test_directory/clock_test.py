@@ -0,0 +1,130 @@
+import time
+from cf_clock import SimulatedClock, SystemClock
+class CF_Clock_Test():
+    """
+    Checks the pluggable clocks: the simulated clock only moves when it is
+    advanced, set_clock refuses to move pending timeouts to another clock and
+    both engines run waits of hours or days under a simulated clock without
+    waiting for them.
+    """
+    def __init__(self,cf,op,Event):
+        self.cf = cf
+        self.op = op
+        self.event = Event
+        self.test_sequence_dict = {}
+        self.test_sequence_dict["test_simulated_clock"] = self.test_simulated_clock
+        self.test_sequence_dict["test_set_clock"] = self.test_set_clock
+        self.test_sequence_dict["test_faster_than_real_time"] = self.test_faster_than_real_time
+
+
+    def run_test_sequence(self,test_sequence_name):
+
+        if test_sequence_name in self.test_sequence_dict:
+            print("sequence name",test_sequence_name)
+            print("\n\nrunning test sequence",test_sequence_name)
+            self.test_sequence_dict[test_sequence_name]()
+            print("end of test sequence\n\n",test_sequence_name)
+
+        else:
+            raise ValueError(f"Test sequence {test_sequence_name} not found")
+
+    def run_all_test_sequences(self):
+
+        for test_sequence_name in self.test_sequence_dict:
+            self.run_test_sequence(test_sequence_name)
+
+    def test_simulated_clock(self):
+        print("\n\ntest_simulated_clock")
+        clock = SimulatedClock(start = 100.0,tick_period = 0.5)
+        assert clock.simulated and not SystemClock().simulated
+        assert clock.time() == 100.0 and clock.tick_period == 0.5
+        clock.advance(2.5)
+        assert clock.time() == 102.5
+        clock.advance_to(110.0)
+        clock.advance_to(105.0)
+        assert clock.time() == 110.0, "advance_to moved the clock backwards"
+        clock.sleep(0)
+        assert clock.time() == 110.0
+        # a positive sleep always moves the clock, by at least its resolution
+        clock.sleep(1e-12)
+        assert clock.time() == 110.0 + SimulatedClock.resolution
+        started = time.monotonic()
+        clock.sleep(3600.0)
+        assert time.monotonic() - started < 0.1, "the simulated clock blocked"
+        assert abs(SimulatedClock().time() - time.time()) < 5.0
+        for args,error_type in (({"tick_period":0},ValueError),):
+            try:
+                SimulatedClock(**args)
+                raise AssertionError(f"{args} was accepted")
+            except error_type:
+                pass
+        try:
+            clock.advance(-1.0)
+            raise AssertionError("the clock moved backwards")
+        except ValueError:
+            pass
+        print("Simulated clock test passed\n\n")
+
+    def test_set_clock(self):
+        print("\n\ntest_set_clock")
+        saved_clock = self.cf.clock
+        try:
+            self.cf.clock = SimulatedClock(start = 0.0)
+            self.cf.reset_cf()
+            done = {}
+            self.cf.define_chain("timed",auto_flag=True)
+            self.op.asm_one_shot_handler(lambda data: done.setdefault("start",self.cf.current_time()),None)
+            self.op.asm_wait_time(1.0)
+            self.op.asm_one_shot_handler(lambda data: done.setdefault("woken",self.cf.current_time()),None)
+            self.op.asm_terminate_system()
+            self.cf.end_chain()
+            self.cf.finalize()
+            token = self.cf.schedule_timeout("timed",10.0)
+            try:
+                self.cf.set_clock(SimulatedClock(start = 1000.0))
+                raise AssertionError("the clock changed under a pending timeout")
+            except RuntimeError:
+                pass
+            assert self.cf.current_time() == 0.0
+            self.cf.cancel_timeout(token)
+            clock = SimulatedClock(start = 1000.0)
+            self.cf.set_clock(clock)
+            assert self.cf.clock is clock and self.cf.current_time() == 1000.0
+            # timeouts scheduled afterwards follow the new clock
+            self.cf.cf_engine_start()
+            print(done)
+            assert done["start"] >= 1000.0 and 1.0 < done["woken"] - done["start"] <= 1.1 + 1e-9, done
+        finally:
+            self.cf.clock = saved_clock
+            self.cf.reset_cf()
+        print("Set clock test passed\n\n")
+
+    def test_faster_than_real_time(self):
+        print("\n\ntest_faster_than_real_time")
+        saved_clock = self.cf.clock
+        try:
+            for engine in ("polled","event_driven"):
+                self.cf.clock = SimulatedClock(start = 0.0,tick_period = 60.0)
+                self.cf.reset_cf()
+                done = {}
+                self.cf.define_chain("sleeper",auto_flag=True)
+                self.op.asm_one_shot_handler(lambda data: done.setdefault("start",self.cf.current_time()),None)
+                self.op.asm_wait_time(3 * 3600.0)
+                self.op.asm_one_shot_handler(lambda data: done.setdefault("woken",self.cf.current_time()),None)
+                self.op.asm_terminate_system()
+                self.cf.end_chain()
+                self.cf.finalize()
+                started = time.monotonic()
+                if engine == "polled":
+                    self.cf.cf_engine_start()
+                else:
+                    self.cf.cf_engine_start_event_driven(tick_period = 60.0)
+                elapsed = time.monotonic() - started
+                print(engine,done,"ticks",self.cf.tick_count,"wall seconds",elapsed)
+                assert 3 * 3600.0 < done["woken"] - done["start"] <= 3 * 3600.0 + 60.0 + 1e-6, done
+                # three simulated hours, with time_tick never called
+                assert elapsed < 5.0, elapsed
+        finally:
+            self.cf.clock = saved_clock
+            self.cf.reset_cf()
+        print("Faster than real time test passed\n\n")
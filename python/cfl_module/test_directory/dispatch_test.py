@@ -0,0 +1,213 @@
+class CF_Dispatch_Test():
+    """
+    Checks that chains are only dispatched the events their elements react to.
+
+    A chain parked on an element with an event_list is skipped for other
+    events; an element returning CF_CONTINUE on unmatched events (watch dog)
+    adds the events of the elements after it, and asm_wait_time is woken by
+    its timeout alone.  Callback events queued without flagging the chain
+    still run when the chain is dispatched.
+    """
+    def __init__(self,cf,op,Event):
+        self.cf = cf
+        self.op = op
+        self.event = Event
+        self.test_sequence_dict = {}
+        self.test_sequence_dict["test_wait_for_event_skips_unmatched"] = self.test_wait_for_event_skips_unmatched
+        self.test_sequence_dict["test_watch_dog_skips_unmatched"] = self.test_watch_dog_skips_unmatched
+        self.test_sequence_dict["test_wait_time_woken_by_timeout"] = self.test_wait_time_woken_by_timeout
+        self.test_sequence_dict["test_unflagged_callback_events_run"] = self.test_unflagged_callback_events_run
+
+
+    def run_test_sequence(self,test_sequence_name):
+
+        if test_sequence_name in self.test_sequence_dict:
+            print("sequence name",test_sequence_name)
+            print("\n\nrunning test sequence",test_sequence_name)
+            self.test_sequence_dict[test_sequence_name]()
+            print("end of test sequence\n\n",test_sequence_name)
+
+        else:
+            raise ValueError(f"Test sequence {test_sequence_name} not found")
+
+    def run_all_test_sequences(self):
+
+        for test_sequence_name in self.test_sequence_dict:
+            self.run_test_sequence(test_sequence_name)
+
+    def record_events(self,chain_name,seen):
+        # wrap the last element added to chain_name so the events it is run on are recorded in seen
+        element = self.cf.chain_dict[chain_name]['element_list'][-1]
+        process_function = element['process_function']
+        def recording_process_function(element_data,event):
+            seen.append(event.event_id)
+            return process_function(element_data,event)
+        element['process_function'] = recording_process_function
+
+    def terminate_system(self,data):
+        self.cf.send_system_event(self.event("CF_TERMINATE_SYSTEM",None))
+
+    def define_guard_chain(self):
+        # stops the engine if a test chain never completes
+        self.cf.define_chain("guard",auto_flag=True)
+        self.op.asm_wait_time(5.0)
+        self.op.asm_log_message("guard timeout, stopping the test")
+        self.op.asm_terminate_system()
+        self.op.asm_terminate()
+        self.cf.end_chain()
+
+    def add_event_ids(self):
+        self.cf.event_id_dict.add_event_id("DISPATCH_EVENT_A","Dispatch test event A")
+        self.cf.event_id_dict.add_event_id("DISPATCH_EVENT_B","Dispatch test event B")
+        self.cf.event_id_dict.add_event_id("DISPATCH_EVENT_C","Dispatch test event C")
+
+    def test_wait_for_event_skips_unmatched(self):
+        print("\n\ntest_wait_for_event_skips_unmatched")
+        self.cf.reset_cf()
+        self.add_event_ids()
+        seen = []
+        completed = []
+
+        self.cf.define_chain("waiter",auto_flag=True)
+        self.op.asm_wait_for_event(event_id = "DISPATCH_EVENT_A",event_count = 2)
+        self.record_events("waiter",seen)
+        self.op.asm_one_shot_handler(lambda data: completed.append(True),None)
+        self.op.asm_one_shot_handler(self.terminate_system,None)
+        self.op.asm_terminate()
+        self.cf.end_chain()
+
+        self.cf.define_chain("sender",auto_flag=True)
+        self.op.asm_send_system_event("DISPATCH_EVENT_B")
+        self.op.asm_send_system_event("DISPATCH_EVENT_A")
+        self.op.asm_send_system_event("DISPATCH_EVENT_B")
+        self.op.asm_wait_time(0.5)
+        self.op.asm_send_system_event("DISPATCH_EVENT_B")
+        self.op.asm_send_system_event("DISPATCH_EVENT_A")
+        self.op.asm_terminate()
+        self.cf.end_chain()
+
+        self.define_guard_chain()
+        self.cf.finalize()
+        self.cf.cf_engine_start()
+
+        print("events seen by the wait element",seen)
+        assert completed, "wait_for_event did not complete"
+        # the first event initializes the element, afterwards only DISPATCH_EVENT_A reaches it
+        assert seen[1:] == ["DISPATCH_EVENT_A","DISPATCH_EVENT_A"], f"unexpected events {seen}"
+        print("Wait for event skips unmatched events test passed\n\n")
+
+    def test_watch_dog_skips_unmatched(self):
+        print("\n\ntest_watch_dog_skips_unmatched")
+        self.cf.reset_cf()
+        self.add_event_ids()
+        self.cf.event_id_dict.add_event_id("WD_PAT_EVENT","Watch dog pattern event")
+        self.cf.event_id_dict.add_event_id("WD_PAT_START_EVENT","Watch dog pattern start event")
+        self.cf.event_id_dict.add_event_id("WD_CANCEL_EVENT","Watch dog cancel event")
+        seen = []
+        passed_watch_dog = []
+        failures = []
+
+        def watch_dog_failure(data):
+            failures.append(data)
+            self.terminate_system(data)
+
+        self.cf.define_chain("watched",auto_flag=True)
+        self.op.asm_watch_dog("WD_PAT_EVENT","WD_PAT_START_EVENT","WD_CANCEL_EVENT","CF_TIMER_EVENT",5,
+                              reset_flag = False,failure_fn = watch_dog_failure,failure_data = "watch dog timeout")
+        self.record_events("watched",seen)
+        # the watch dog continues on unmatched events, so the chain also reacts to the events below
+        self.op.asm_wait_for_event(event_id = "DISPATCH_EVENT_A")
+        self.op.asm_one_shot_handler(lambda data: passed_watch_dog.append(True),None)
+        self.op.asm_wait_for_event(event_id = "DISPATCH_EVENT_C")
+        self.op.asm_terminate()
+        self.cf.end_chain()
+
+        self.cf.define_chain("sender",auto_flag=True)
+        self.op.asm_send_system_event("DISPATCH_EVENT_B")
+        self.op.asm_send_system_event("DISPATCH_EVENT_A")
+        self.op.asm_send_system_event("DISPATCH_EVENT_B")
+        self.op.asm_wait_time(0.2)
+        self.op.asm_send_system_event("DISPATCH_EVENT_B")
+        self.op.asm_terminate()
+        self.cf.end_chain()
+
+        self.define_guard_chain()
+        self.cf.finalize()
+        self.cf.cf_engine_start()
+
+        print("events seen by the watch dog",seen)
+        assert passed_watch_dog, "DISPATCH_EVENT_A did not reach the element after the watch dog"
+        assert failures == ["watch dog timeout"], "watch dog did not time out"
+        assert "DISPATCH_EVENT_A" in seen, "the chain was not run on DISPATCH_EVENT_A"
+        assert "DISPATCH_EVENT_B" not in seen, "the chain was run on an event none of its elements react to"
+        print("Watch dog skips unmatched events test passed\n\n")
+
+    def test_wait_time_woken_by_timeout(self):
+        print("\n\ntest_wait_time_woken_by_timeout")
+        self.cf.reset_cf()
+        self.add_event_ids()
+        seen = []
+        wake_times = []
+
+        self.cf.define_chain("sleeper",auto_flag=True)
+        self.op.asm_wait_time(0.5)
+        self.record_events("sleeper",seen)
+        self.op.asm_one_shot_handler(lambda data: wake_times.append(self.cf.current_time()),None)
+        self.op.asm_one_shot_handler(self.terminate_system,None)
+        self.op.asm_terminate()
+        self.cf.end_chain()
+
+        # keeps timer ticks and other events flowing while the sleeper waits
+        self.cf.define_chain("ticker",auto_flag=True)
+        self.op.asm_wait_for_event(event_id = "CF_TIMER_EVENT")
+        self.op.asm_send_system_event("DISPATCH_EVENT_B")
+        self.op.asm_reset()
+        self.cf.end_chain()
+
+        self.define_guard_chain()
+        self.cf.finalize()
+        start_time = self.cf.current_time()
+        self.cf.cf_engine_start()
+
+        print("events seen by the wait element",seen)
+        assert wake_times, "wait_time did not complete"
+        assert wake_times[0] - start_time >= 0.5, "wait_time completed early"
+        # one call to initialize the element and one when its timeout expires
+        assert seen[1:] == ["CF_TIMER_EVENT"], f"unexpected events {seen}"
+        print("Wait time woken by its timeout test passed\n\n")
+
+    def test_unflagged_callback_events_run(self):
+        print("\n\ntest_unflagged_callback_events_run")
+        self.cf.reset_cf()
+        self.add_event_ids()
+        seen = []
+        completed = []
+
+        self.cf.define_chain("listener",auto_flag=True)
+        self.op.asm_wait_for_event(event_id = "DISPATCH_EVENT_C",event_count = 2)
+        self.record_events("listener",seen)
+        self.op.asm_one_shot_handler(lambda data: completed.append(True),None)
+        self.op.asm_one_shot_handler(self.terminate_system,None)
+        self.op.asm_terminate()
+        self.cf.end_chain()
+
+        def queue_unflagged(data):
+            # bypasses send_named_queue_event, so the chain is not flagged as having callback events
+            self.cf.event_system.add_callback_event("listener",self.event("DISPATCH_EVENT_C",None))
+
+        self.cf.define_chain("sender",auto_flag=True)
+        self.op.asm_wait_time(0.2)
+        self.op.asm_one_shot_handler(queue_unflagged,None)
+        self.op.asm_send_system_event("DISPATCH_EVENT_C")
+        self.op.asm_terminate()
+        self.cf.end_chain()
+
+        self.define_guard_chain()
+        self.cf.finalize()
+        self.cf.cf_engine_start()
+
+        print("events seen by the wait element",seen)
+        assert "listener" not in self.cf._pending_callback_chains
+        assert completed, "the unflagged callback event did not run"
+        assert seen[1:] == ["DISPATCH_EVENT_C","DISPATCH_EVENT_C"], f"unexpected events {seen}"
+        print("Unflagged callback events run test passed\n\n")
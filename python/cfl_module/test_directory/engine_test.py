@@ -0,0 +1,203 @@
+import asyncio
+import threading
+import time
+from cf_clock import SimulatedClock
+class CF_Engine_Test():
+    """
+    Checks the engine's chain bookkeeping: the active chain set follows
+    enable, disable, terminate and system terminate in definition order.
+    Checks the event driven engine: it sleeps to the next deadline, wakes
+    for posted events and stops like the polled engine once no chain is live.
+    Checks run_async: asm_await results and errors, events fed through its
+    queue and other tasks running while the engine is idle.
+    """
+    def __init__(self,cf,op,Event):
+        self.cf = cf
+        self.op = op
+        self.event = Event
+        self.test_sequence_dict = {}
+        self.test_sequence_dict["test_active_chain_set"] = self.test_active_chain_set
+        self.test_sequence_dict["test_event_driven_deadlines"] = self.test_event_driven_deadlines
+        self.test_sequence_dict["test_event_driven_stops"] = self.test_event_driven_stops
+        self.test_sequence_dict["test_event_driven_posted_events"] = self.test_event_driven_posted_events
+        self.test_sequence_dict["test_run_async"] = self.test_run_async
+
+
+    def run_test_sequence(self,test_sequence_name):
+
+        if test_sequence_name in self.test_sequence_dict:
+            print("sequence name",test_sequence_name)
+            print("\n\nrunning test sequence",test_sequence_name)
+            self.test_sequence_dict[test_sequence_name]()
+            print("end of test sequence\n\n",test_sequence_name)
+
+        else:
+            raise ValueError(f"Test sequence {test_sequence_name} not found")
+
+    def run_all_test_sequences(self):
+
+        for test_sequence_name in self.test_sequence_dict:
+            self.run_test_sequence(test_sequence_name)
+
+    def test_active_chain_set(self):
+        print("\n\ntest_active_chain_set")
+        self.cf.reset_cf()
+        for chain_name,auto_flag in (("chain_1",True),("chain_2",False),("chain_3",True),("chain_4",False)):
+            self.cf.define_chain(chain_name,auto_flag=auto_flag)
+            self.op.asm_halt()
+            self.cf.end_chain()
+        self.cf.define_chain("one_pass",auto_flag=True)
+        self.op.asm_terminate()
+        self.cf.end_chain()
+        self.cf.finalize()
+
+        self.cf.initialize_chains()
+        assert self.cf.get_active_chains() == ["chain_1","chain_3","one_pass"], self.cf.get_active_chains()
+        # enabled chains are kept in definition order, not enable order
+        self.cf.enable_chain("chain_4")
+        self.cf.enable_chain("chain_2")
+        self.cf.enable_chain("chain_2")
+        assert self.cf.get_active_chains() == ["chain_1","chain_2","chain_3","chain_4","one_pass"]
+        self.cf.disable_chain("chain_3")
+        self.cf.disable_chain("chain_3")
+        assert self.cf.get_active_chains() == ["chain_1","chain_2","chain_4","one_pass"]
+        assert self.cf.get_active_chain_count() == 4
+        assert self.cf.get_chain_info()['active_chain_count'] == 4
+
+        # a CF_TERMINATE return code disables its chain
+        self.cf.send_system_event(self.event("CF_TIMER_EVENT",None))
+        self.cf.execute_system_event_loop()
+        assert self.cf.get_active_chains() == ["chain_1","chain_2","chain_4"], self.cf.get_active_chains()
+        assert not self.cf.is_chain_active("one_pass")
+
+        self.cf.send_system_event(self.event("CF_TERMINATE_SYSTEM",None))
+        self.cf.execute_system_event_loop()
+        assert self.cf.get_active_chains() == [] and self.cf.get_active_chain_count() == 0
+        self.cf.reset_cf()
+        print("Active chain set test passed\n\n")
+
+    def test_event_driven_deadlines(self):
+        print("\n\ntest_event_driven_deadlines")
+        saved_clock = self.cf.clock
+        try:
+            self.cf.clock = SimulatedClock(start = 0.0)
+            self.cf.reset_cf()
+            done = {}
+            self.cf.define_chain("sleeper",auto_flag=True)
+            self.op.asm_one_shot_handler(lambda data: done.setdefault("start",self.cf.current_time()),None)
+            self.op.asm_wait_time(5.0)
+            self.op.asm_one_shot_handler(lambda data: done.setdefault("woken",self.cf.current_time()),None)
+            self.op.asm_terminate_system()
+            self.cf.end_chain()
+            self.cf.finalize()
+            self.cf.cf_engine_start_event_driven(tick_period = 0.1)
+            print(done,"ticks",self.cf.tick_count)
+            assert 5.0 < done["woken"] - done["start"] <= 5.01, done
+            # no chain reacts to CF_TIMER_EVENT after the first: the deadline is the only other tick
+            assert self.cf.tick_count <= 2, self.cf.tick_count
+        finally:
+            self.cf.clock = saved_clock
+            self.cf.reset_cf()
+        print("Event driven deadlines test passed\n\n")
+
+    def test_event_driven_stops(self):
+        print("\n\ntest_event_driven_stops")
+        saved_clock = self.cf.clock
+        try:
+            self.cf.clock = SimulatedClock(start = 0.0)
+            self.cf.reset_cf()
+            ran = []
+            self.cf.define_chain("one_pass",auto_flag=True)
+            self.op.asm_one_shot_handler(lambda data: ran.append(self.cf.current_time()),None)
+            self.op.asm_terminate()
+            self.cf.end_chain()
+            self.cf.finalize()
+            self.cf.cf_engine_start_event_driven(tick_period = 0.1)
+            # the chain ends on its first event; the next event finds no live chain
+            assert len(ran) == 1 and self.cf.get_active_chain_count() == 0
+            assert self.cf.current_time() <= 1.0, self.cf.current_time()
+        finally:
+            self.cf.clock = saved_clock
+            self.cf.reset_cf()
+        print("Event driven stops test passed\n\n")
+
+    def test_event_driven_posted_events(self):
+        print("\n\ntest_event_driven_posted_events")
+        self.cf.reset_cf()
+        self.cf.event_id_dict.add_event_id("ENGINE_POSTED_EVENT","Engine test posted event")
+        received = []
+        self.cf.define_chain("receiver",auto_flag=True)
+        self.op.asm_wait_for_event(event_id = "ENGINE_POSTED_EVENT")
+        self.op.asm_one_shot_handler(lambda data: received.append(time.monotonic()),None)
+        self.op.asm_terminate_system()
+        self.cf.end_chain()
+        self.cf.finalize()
+
+        posted = []
+        def post():
+            time.sleep(0.3)
+            posted.append(time.monotonic())
+            self.cf.post_system_event(self.event("ENGINE_POSTED_EVENT",None))
+        thread = threading.Thread(target = post)
+        thread.start()
+        # ticks are never needed here; the posted event wakes the engine
+        self.cf.cf_engine_start_event_driven(tick_period = 60.0)
+        thread.join()
+        print("woken after",received[0] - posted[0])
+        assert received and received[0] - posted[0] < 0.25, "the posted event did not wake the engine"
+        self.cf.reset_cf()
+        print("Event driven posted events test passed\n\n")
+
+    def test_run_async(self):
+        print("\n\ntest_run_async")
+        self.cf.reset_cf()
+        self.cf.event_id_dict.add_event_id("ASYNC_EVENT","Engine test async event")
+        results = {}
+
+        async def double(value):
+            await asyncio.sleep(0.05)
+            return value * 2
+
+        async def fail(value):
+            await asyncio.sleep(0.01)
+            raise RuntimeError(value)
+
+        self.cf.define_chain("awaiter",auto_flag=True)
+        self.op.asm_await(double,21,result_fn = lambda data,result: results.setdefault("result",result))
+        self.op.asm_await(fail,"expected",error_fn = lambda data: results.setdefault("error",data),
+                          error_data = "error_data",reset_flag = False)
+        self.cf.end_chain()
+
+        self.cf.define_chain("queue_reader",auto_flag=True)
+        self.op.asm_wait_for_event(event_id = "ASYNC_EVENT",event_count = 2)
+        self.op.asm_one_shot_handler(lambda data: results.setdefault("events",True),None)
+        self.op.asm_wait(lambda data,event: "error" in results,None,None,None)
+        self.op.asm_terminate_system()
+        self.cf.end_chain()
+        self.cf.finalize()
+
+        async def main():
+            ticks = []
+            async def other_task():
+                while True:
+                    ticks.append(time.monotonic())
+                    await asyncio.sleep(0.01)
+            async def feeder(queue):
+                await asyncio.sleep(0.1)
+                await queue.put(self.event("ASYNC_EVENT",1))
+                await queue.put(None)
+                await queue.put(("queue_reader",self.event("ASYNC_EVENT",2)))
+            queue = asyncio.Queue()
+            tasks = [asyncio.create_task(other_task()),asyncio.create_task(feeder(queue))]
+            await asyncio.wait_for(self.cf.run_async(event_queue = queue,tick_period = 0.1),10.0)
+            for task in tasks:
+                task.cancel()
+            return ticks
+
+        ticks = asyncio.run(main())
+        print(results,"other task ran",len(ticks),"times")
+        assert results == {"result":42,"error":"error_data","events":True}, results
+        assert len(ticks) >= 5, "the engine blocked the event loop"
+        assert self.cf._event_loop is None
+        self.cf.reset_cf()
+        print("Run async test passed\n\n")
@@ -0,0 +1,205 @@
+import os
+import tempfile
+from cf_clock import SimulatedClock
+from cf_journal import JournalReader, Unrecorded, FLAG_INTERNAL, FLAG_START, FLAG_UNRECORDED
+class CF_Journal_Test():
+    """
+    Checks the event journal: records read back as written, a torn tail is
+    reported and skipped, a reopened journal continues its sequence, prune()
+    keeps the records asked for and a polled replay reproduces the recorded run.
+    """
+    def __init__(self,cf,op,Event):
+        self.cf = cf
+        self.op = op
+        self.event = Event
+        self.test_sequence_dict = {}
+        self.test_sequence_dict["test_record_and_read_back"] = self.test_record_and_read_back
+        self.test_sequence_dict["test_truncated_tail"] = self.test_truncated_tail
+        self.test_sequence_dict["test_reopen_continues_sequence"] = self.test_reopen_continues_sequence
+        self.test_sequence_dict["test_prune"] = self.test_prune
+        self.test_sequence_dict["test_polled_replay"] = self.test_polled_replay
+
+
+    def run_test_sequence(self,test_sequence_name):
+
+        if test_sequence_name in self.test_sequence_dict:
+            print("sequence name",test_sequence_name)
+            print("\n\nrunning test sequence",test_sequence_name)
+            self.test_sequence_dict[test_sequence_name]()
+            print("end of test sequence\n\n",test_sequence_name)
+
+        else:
+            raise ValueError(f"Test sequence {test_sequence_name} not found")
+
+    def run_all_test_sequences(self):
+
+        for test_sequence_name in self.test_sequence_dict:
+            self.run_test_sequence(test_sequence_name)
+
+    def define_journal_chain(self):
+        self.cf.reset_cf()
+        self.cf.event_id_dict.add_event_id("JOURNAL_EVENT_A","Journal test event A")
+        self.cf.event_id_dict.add_event_id("JOURNAL_EVENT_B","Journal test event B")
+        self.cf.define_chain("journaled",auto_flag=True)
+        self.op.asm_wait_for_event(event_id = "JOURNAL_EVENT_A",event_count = 1000)
+        self.cf.end_chain()
+        self.cf.finalize()
+        self.cf.initialize_chains()
+
+    def record_events(self,directory,count,segment_bytes = 64 << 20):
+        journal = self.cf.enable_journal(directory,segment_bytes = segment_bytes,commit_interval = 0.001)
+        for index in range(count):
+            self.cf.send_system_event(self.event("JOURNAL_EVENT_A",{"index":index}))
+        self.cf.disable_journal()
+        return journal
+
+    def test_record_and_read_back(self):
+        print("\n\ntest_record_and_read_back")
+        self.define_journal_chain()
+        with tempfile.TemporaryDirectory() as directory:
+            journal = self.cf.enable_journal(directory,commit_interval = 0.001)
+            self.cf.send_system_event(self.event("JOURNAL_EVENT_A",{"value":[1,2,3]}))
+            self.cf.send_named_queue_event("journaled",self.event("JOURNAL_EVENT_B","named"))
+            # callables can not be pickled, they are journaled as Unrecorded placeholders
+            self.cf.send_system_event(self.event("JOURNAL_EVENT_B",{"callback":self.define_journal_chain,"count":2}))
+            assert journal.sync(timeout = 5.0), "journal did not commit"
+            stats = journal.get_stats()
+            self.cf.disable_journal()
+
+            records = list(JournalReader(directory))
+            for record in records:
+                print(record)
+            assert stats["records"] == 3 and stats["committed_sequence"] == 2, f"unexpected stats {stats}"
+            assert [record.sequence for record in records] == [0,1,2]
+            assert records[0].chain_name is None and records[0].event_id == "JOURNAL_EVENT_A"
+            assert records[0].data == {"value":[1,2,3]} and records[0].flags == 0
+            assert records[1].chain_name == "journaled" and records[1].data == "named"
+            assert records[2].flags & FLAG_UNRECORDED
+            assert isinstance(records[2].data["callback"],Unrecorded) and records[2].data["count"] == 2
+        print("Record and read back test passed\n\n")
+
+    def test_truncated_tail(self):
+        print("\n\ntest_truncated_tail")
+        self.define_journal_chain()
+        with tempfile.TemporaryDirectory() as directory:
+            self.record_events(directory,10)
+            reader = JournalReader(directory)
+            segment_path = reader.segments()[-1][1]
+            # a crash in the middle of the last frame
+            with open(segment_path,"r+b") as file:
+                file.truncate(os.path.getsize(segment_path) - 3)
+
+            reader = JournalReader(directory)
+            records = list(reader)
+            print("records after truncation",len(records),"damaged",reader.damaged)
+            assert [record.data["index"] for record in records] == list(range(9))
+            assert len(reader.damaged) == 1 and reader.damaged[0][0] == segment_path
+            assert reader.last_sequence() == 8
+        print("Truncated tail test passed\n\n")
+
+    def test_reopen_continues_sequence(self):
+        print("\n\ntest_reopen_continues_sequence")
+        self.define_journal_chain()
+        with tempfile.TemporaryDirectory() as directory:
+            first = self.record_events(directory,3)
+            second = self.record_events(directory,2)
+            records = list(JournalReader(directory))
+            print("sequences",[record.sequence for record in records])
+            assert first.last_sequence() == 2 and second.last_sequence() == 4
+            assert [record.sequence for record in records] == [0,1,2,3,4]
+            assert [record.data["index"] for record in records] == [0,1,2,0,1]
+            assert [first_sequence for first_sequence,_ in JournalReader(directory).segments()] == [0,3]
+        print("Reopen continues sequence test passed\n\n")
+
+    def test_prune(self):
+        print("\n\ntest_prune")
+        self.define_journal_chain()
+        with tempfile.TemporaryDirectory() as directory:
+            # small segments, so the records spread over several of them
+            self.record_events(directory,40,segment_bytes = 500)
+            segments = JournalReader(directory).segments()
+            print("segments before prune",[first_sequence for first_sequence,_ in segments])
+            assert len(segments) > 3
+            keep_from = segments[2][0] + 1
+
+            journal = self.cf.enable_journal(directory,segment_bytes = 500)
+            deleted = journal.prune(keep_from)
+            self.cf.disable_journal()
+
+            # the segment holding keep_from and the later ones are kept
+            assert deleted == 2, f"deleted {deleted} segments"
+            records = list(JournalReader(directory))
+            assert records[0].sequence == segments[2][0]
+            assert [record.sequence for record in records] == list(range(segments[2][0],40))
+        print("Prune test passed\n\n")
+
+    def define_replay_chains(self,outcomes):
+        self.cf.reset_cf()
+        self.cf.event_id_dict.add_event_id("JOURNAL_EVENT_A","Journal test event A")
+        self.cf.event_id_dict.add_event_id("JOURNAL_EVENT_B","Journal test event B")
+        self.cf.event_id_dict.add_event_id("JOURNAL_EVENT_C","Journal test event C")
+
+        def outcome(label):
+            return lambda data: outcomes.append((label,self.cf.tick_count,round(self.cf.current_time() - 1000.0,1)))
+
+        self.cf.define_chain("waiter",auto_flag=True)
+        self.op.asm_wait_for_event(event_id = "JOURNAL_EVENT_A",event_count = 2)
+        self.op.asm_one_shot_handler(outcome("waiter done"),None)
+        # sent by a chain: journaled as internal and generated again by the replay
+        self.op.asm_send_system_event("JOURNAL_EVENT_C")
+        self.op.asm_wait_time(1.0)
+        self.op.asm_one_shot_handler(outcome("waiter delay"),None)
+        self.op.asm_halt()
+        self.cf.end_chain()
+
+        self.cf.define_chain("observer",auto_flag=True)
+        self.op.asm_wait_for_event(event_id = "JOURNAL_EVENT_C")
+        self.op.asm_one_shot_handler(outcome("observer saw C"),None)
+        self.op.asm_halt()
+        self.cf.end_chain()
+
+        self.cf.define_chain("dog",auto_flag=True)
+        self.op.asm_watch_dog("JOURNAL_EVENT_B","JOURNAL_EVENT_B","JOURNAL_EVENT_B","CF_TIMER_EVENT",10,
+                              failure_fn = outcome("dog timeout"))
+        self.op.asm_halt()
+        self.cf.end_chain()
+        self.cf.finalize()
+
+    def test_polled_replay(self):
+        print("\n\ntest_polled_replay")
+        saved_clock = self.cf.clock
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                recorded = []
+                self.cf.clock = SimulatedClock(start = 1000.0)
+                self.define_replay_chains(recorded)
+                self.cf.enable_journal(directory,commit_interval = 0.001)
+                self.cf.run_ticks(3)
+                self.cf.send_system_event(self.event("JOURNAL_EVENT_A"))
+                self.cf.run_ticks(4)
+                self.cf.send_system_event(self.event("JOURNAL_EVENT_B"))
+                self.cf.send_named_queue_event("waiter",self.event("JOURNAL_EVENT_A"))
+                self.cf.run_ticks(6)
+                self.cf.send_system_event(self.event("JOURNAL_EVENT_B"))
+                self.cf.run_ticks(30)
+                self.cf.disable_journal()
+
+                records = list(JournalReader(directory))
+                internal = [record for record in records if record.flags & FLAG_INTERNAL]
+                assert records[0].flags & FLAG_START, "the engine start was not journaled"
+                assert [record.event_id for record in internal] == ["JOURNAL_EVENT_C"]
+
+                replayed = []
+                self.cf.clock = SimulatedClock(start = 0.0)
+                self.define_replay_chains(replayed)
+                stats = self.cf.replay_journal(directory,settle_time = 3.0)
+                print("recorded",recorded)
+                print("replayed",replayed)
+                print("replay stats",stats)
+                assert stats["complete"] and stats["replayed"] == 4 and stats["internal"] == 1
+                assert [label for label,_,_ in recorded] == ["waiter done","observer saw C","waiter delay","dog timeout"]
+                assert replayed == recorded, "the replay did not reproduce the recorded run"
+        finally:
+            self.cf.clock = saved_clock
+            self.cf.reset_cf()
+        print("Polled replay test passed\n\n")
@@ -0,0 +1,305 @@
+"""
+FullLtreeStorage test sequences
+
+The indexed queries are compared with brute force scans of the stored nodes
+after random store / delete / delete_subtree / clear sequences.  Run from
+the cfl_module directory with
+
+    python -m test_directory.ltree_storage_test
+"""
+import gc
+import random
+import weakref
+from behavior_tree_data import FullLtreeStorage, ReadOnlyDict
+from behavior_tree_control import Behavior_Tree_Control
+class CF_Ltree_Storage_Test():
+    def __init__(self,seed = 0,steps = 3000):
+        self.seed = seed
+        self.steps = steps
+        self.labels = ["a","b","c","a_b","b0","ab","Z","_x"]
+        self.lquery_segments = ["a","b","*","**","{a,b}","{a,ab,a}","*{1}","*{1,2}","*{,2}","*{2,}","{1,2}",
+                                "a*","!a","b0","Z","{b0,Z}","_x"]
+        self.test_sequence_dict = {}
+        self.test_sequence_dict["test_index_queries_match_scan"] = self.test_index_queries_match_scan
+        self.test_sequence_dict["test_lquery_matches_scan"] = self.test_lquery_matches_scan
+        self.test_sequence_dict["test_ltxtquery_parser"] = self.test_ltxtquery_parser
+        self.test_sequence_dict["test_label_index_matches_scan"] = self.test_label_index_matches_scan
+        self.test_sequence_dict["test_copy_policies"] = self.test_copy_policies
+        self.test_sequence_dict["test_query_cache_shared"] = self.test_query_cache_shared
+
+
+    def run_test_sequence(self,test_sequence_name):
+
+        if test_sequence_name in self.test_sequence_dict:
+            print("sequence name",test_sequence_name)
+            print("\n\nrunning test sequence",test_sequence_name)
+            self.test_sequence_dict[test_sequence_name]()
+            print("end of test sequence\n\n",test_sequence_name)
+
+        else:
+            raise ValueError(f"Test sequence {test_sequence_name} not found")
+
+    def run_all_test_sequences(self):
+
+        for test_sequence_name in self.test_sequence_dict:
+            self.run_test_sequence(test_sequence_name)
+
+    def random_path(self,rnd):
+        return ".".join(rnd.choice(self.labels) for _ in range(rnd.randint(1,4)))
+
+    def random_lquery(self,rnd):
+        query = ".".join(rnd.choice(self.lquery_segments) for _ in range(rnd.randint(1,4)))
+        if rnd.random() < 0.05:
+            query = query.replace(".","@",1)
+        return query
+
+    def random_ltxtquery(self,rnd,depth = 0):
+        choice = rnd.random()
+        if depth > 3 or choice < 0.4:
+            return rnd.choice(self.labels) + rnd.choice(["","","*","@","%","*@","%*"])
+        if choice < 0.55:
+            return "!" + self.random_ltxtquery(rnd,depth + 1)
+        if choice < 0.7:
+            return "(" + self.random_ltxtquery(rnd,depth + 1) + ")"
+        return self.random_ltxtquery(rnd,depth + 1) + rnd.choice([" & "," | "]) + self.random_ltxtquery(rnd,depth + 1)
+
+    def random_operation(self,storage,rnd,step):
+        # mostly stores, so the tree grows while nodes and subtrees come and go
+        path = self.random_path(rnd)
+        operation = rnd.random()
+        if operation < 0.7:
+            storage.store(path,{"step":step})
+        elif operation < 0.93:
+            storage.delete(path)
+        elif operation < 0.999:
+            storage.delete_subtree(path)
+        else:
+            storage.clear()
+
+    def scan(self,storage,predicate):
+        """Paths of the stored nodes passing predicate, found without the indexes"""
+        return sorted(path for path in storage.data if predicate(path))
+
+    def brute_force_stats(self,storage):
+        paths = list(storage.data)
+        if not paths:
+            return {'total_nodes': 0,'max_depth': 0,'avg_depth': 0.0,'root_nodes': 0,'leaf_nodes': 0}
+        depths = [len(path.split(".")) for path in paths]
+        return {
+            'total_nodes': len(paths),
+            'max_depth': max(depths),
+            'avg_depth': sum(depths) / len(depths),
+            'root_nodes': depths.count(1),
+            'leaf_nodes': sum(1 for path in paths if not any(other.startswith(path + ".") for other in paths))
+        }
+
+    def test_index_queries_match_scan(self):
+        print("\n\ntest_index_queries_match_scan")
+        rnd = random.Random(self.seed)
+        storage = FullLtreeStorage()
+        checks = 0
+        for step in range(self.steps):
+            self.random_operation(storage,rnd,step)
+            if step % 10:
+                continue
+            path = self.random_path(rnd)
+            descendants = self.scan(storage,lambda stored: storage.ltree_descendant(stored,path))
+            ancestors = sorted(self.scan(storage,lambda stored: storage.ltree_ancestor(stored,path)),
+                               key = lambda stored: len(stored.split(".")))
+            subtree = self.scan(storage,lambda stored: stored == path or stored.startswith(path + "."))
+            assert [result['path'] for result in storage.query_descendants(path)] == descendants, path
+            assert [result['path'] for result in storage.query_by_operator("<@",path)] == descendants, path
+            assert [result['path'] for result in storage.query_ancestors(path)] == ancestors, path
+            assert [result['path'] for result in storage.query_subtree(path)] == subtree, path
+            assert storage.get_all_paths() == sorted(storage.data)
+            assert storage.get_stats() == self.brute_force_stats(storage)
+            checks += 1
+        print("index query checks",checks,"nodes",storage.size())
+        print("Index queries match scan test passed\n\n")
+
+    def test_lquery_matches_scan(self):
+        print("\n\ntest_lquery_matches_scan")
+        rnd = random.Random(self.seed)
+        storage = FullLtreeStorage()
+        storage.store("a",1)
+        storage.store("a.b",2)
+        storage.store("a.b.c",3)
+        storage.store("a.c",4)
+        storage.store("b.c",5)
+        assert [result['path'] for result in storage.query("a.*")] == ["a.b","a.c"]
+        assert [result['path'] for result in storage.query("a.**")] == ["a.b","a.b.c","a.c"]
+        assert [result['path'] for result in storage.query("{a,b}.c")] == ["a.c","b.c"]
+        assert [result['data'] for result in storage.query("*.c")] == [4,5]
+        assert storage.query("a.{") == [] and not storage.ltree_match("a","a.{")
+        assert storage.compile_query("a.*") is storage.compile_query("a.*")
+
+        matches = 0
+        for step in range(self.steps):
+            self.random_operation(storage,rnd,step)
+            if step % 3:
+                continue
+            query = self.random_lquery(rnd)
+            # the query walks the path index; the scan tests every stored path
+            expected = self.scan(storage,lambda stored: storage.ltree_match(stored,query))
+            results = storage.query(query)
+            assert [result['path'] for result in results] == expected, query
+            assert [result['data'] for result in results] == [storage.get(path) for path in expected], query
+            assert storage.query_by_operator("~",query) == results, query
+            matches += len(expected) > 0
+        print("lquery checks with matches",matches,storage.compile_query.cache_info())
+        print("lquery matches scan test passed\n\n")
+
+    def test_ltxtquery_parser(self):
+        print("\n\ntest_ltxtquery_parser")
+        storage = FullLtreeStorage()
+        for path in ["Top.Science.Astro_Physics","Top.Sport.Football","Top.Russia_Europe","Top.Europe_Russia_East",
+                     "gamma.eps","alpha.gamma","alpha.beta","beta"]:
+            storage.store(path,path)
+        expected_results = {
+            "gamma": ["alpha.gamma","gamma.eps"],
+            # the eval() based matcher never matched a parenthesized word and
+            # its word replacing turned "gamma & !gamma" into a match
+            "(gamma)": ["alpha.gamma","gamma.eps"],
+            "gamma & !gamma": [],
+            # ! binds tighter than &, which binds tighter than |
+            "alpha | beta & gamma": ["alpha.beta","alpha.gamma"],
+            "(alpha | beta) & gamma": ["alpha.gamma"],
+            "!alpha & beta": ["beta"],
+            "!(alpha | Top)": ["beta","gamma.eps"],
+            "!!beta": ["alpha.beta","beta"],
+            "  alpha&beta ": ["alpha.beta"],
+            "Top & (Sport | Science) & !Football": ["Top.Science.Astro_Physics"],
+            "Sport & !Football": [],
+            # * prefix, @ case insensitive, % underscore separated words in any order
+            "Astro*": ["Top.Science.Astro_Physics"],
+            "astro*@": ["Top.Science.Astro_Physics"],
+            "ASTRO_PHYSICS@": ["Top.Science.Astro_Physics"],
+            "astro_physics": [],
+            "Physics%": ["Top.Science.Astro_Physics"],
+            "physics%": [],
+            "physics%@": ["Top.Science.Astro_Physics"],
+            "Russia_Europe": ["Top.Russia_Europe"],
+            "Russia_Europe%": ["Top.Europe_Russia_East","Top.Russia_Europe"],
+            "Europe_Ru%*": ["Top.Europe_Russia_East","Top.Russia_Europe"],
+            "Eur%* & !East%": ["Top.Russia_Europe"],
+            "Eur%* & !East": ["Top.Europe_Russia_East","Top.Russia_Europe"],
+            # invalid queries match nothing
+            "alpha &": [],
+            "(alpha": [],
+            "alpha)": [],
+            "alpha beta": [],
+            "!": [],
+            "": [],
+            "alpha.beta": [],
+        }
+        for query,expected in expected_results.items():
+            results = [result['path'] for result in storage.query_ltxtquery(query)]
+            assert results == expected, f"{query!r}: {results}"
+            assert [result['path'] for result in storage.query_by_operator("@@",query)] == expected, query
+            for path in storage.get_all_paths():
+                assert storage.ltxtquery_match(path,query) == (path in expected), (query,path)
+
+        compiled = storage.compile_ltxtquery("a | b & !c")
+        assert compiled.tree == ("or",(("word","a",""),("and",(("word","b",""),("not",("word","c",""))))))
+        assert storage.compile_ltxtquery("a | b & !c") is compiled
+        assert storage.compile_ltxtquery("a &").match is None
+        # nesting too deep for the parser is an invalid query, not an error
+        assert not storage.ltxtquery_match("a.b","!" * 5000 + "a")
+        print("ltxtquery parser test passed\n\n")
+
+    def test_label_index_matches_scan(self):
+        print("\n\ntest_label_index_matches_scan")
+        rnd = random.Random(self.seed)
+        storage = FullLtreeStorage()
+        matches = 0
+        for step in range(self.steps):
+            self.random_operation(storage,rnd,step)
+            if step % 3:
+                continue
+            query = self.random_ltxtquery(rnd)
+            # query_ltxtquery() combines the postings of the label index; the scan matches every stored path
+            expected = self.scan(storage,lambda stored: storage.ltxtquery_match(stored,query))
+            results = storage.query_ltxtquery(query)
+            assert [result['path'] for result in results] == expected, query
+            assert [result['data'] for result in results] == [storage.get(path) for path in expected], query
+            matches += len(expected) > 0
+
+            label_paths = {}
+            for path in storage.data:
+                for label in path.split("."):
+                    label_paths.setdefault(label,set()).add(path)
+            assert storage._label_paths == label_paths, "label index out of date"
+        print("ltxtquery checks with matches",matches,"nodes",storage.size())
+        print("Label index matches scan test passed\n\n")
+
+    def test_copy_policies(self):
+        print("\n\ntest_copy_policies")
+        data = {"list":[1,2],"nested":{"value":1}}
+
+        storage = FullLtreeStorage()
+        storage.store("a.b",data)
+        result = storage.get("a.b")
+        result["nested"]["value"] = 2
+        assert data["nested"]["value"] == 1 and storage.get("a.b") == data, "'deepcopy' shared data"
+
+        # 'none' hands out the stored objects themselves, in store() and on every read
+        storage = FullLtreeStorage(copy_policy = 'none')
+        storage.store("a.b",data)
+        assert storage.get("a.b") is data
+        assert storage.query("a.*")[0]['data'] is data
+        assert storage.get("a.b",copy_policy = True) is not data
+        storage.get("a.b")["list"].append(3)
+        assert data["list"] == [1,2,3], "'none' copied the data"
+        data["list"].pop()
+
+        storage = FullLtreeStorage(copy_policy = 'readonly')
+        storage.store("a.b",data)
+        view = storage.get("a.b")
+        assert isinstance(view,ReadOnlyDict) and view == data and view["list"] == [1,2]
+        try:
+            view["list"].append(3)
+            raise AssertionError("a readonly view was modified")
+        except AttributeError:
+            pass
+        data["list"].append(3)
+        assert view["list"] == [1,2], "'readonly' shared the caller's data"
+        storage.store("a.b",{"replaced":True})
+        assert view["list"] == [1,2], "store() changed the data of a view"
+        assert storage.get("a.b",copy_policy = 'deepcopy') == {"replaced":True}
+
+        # Behavior_Tree_Control hands out plain data only
+        control = Behavior_Tree_Control(None)
+        control.add_leaf_element("leaf",{"value":1})
+        assert type(control.get("leaf")) is dict
+        for set_policy in (lambda: control.get("leaf",copy_policy = 'readonly'),
+                           lambda: setattr(control,"copy_policy",'readonly') or control.get("leaf")):
+            try:
+                set_policy()
+                raise AssertionError("Behavior_Tree_Control accepted 'readonly'")
+            except ValueError:
+                pass
+        print("Copy policies test passed\n\n")
+
+    def test_query_cache_shared(self):
+        print("\n\ntest_query_cache_shared")
+        first = FullLtreeStorage()
+        second = FullLtreeStorage()
+        assert first.compile_query("a.*{1,2}.b") is second.compile_query("a.*{1,2}.b")
+        assert first.compile_ltxtquery("a & !b") is FullLtreeStorage.compile_ltxtquery("a & !b")
+        # the caches hold no reference to a storage, so one is freed without the cycle collector
+        first.store("a.b",{"value":1})
+        assert first.query("a.*")[0]['path'] == "a.b"
+        reference = weakref.ref(first)
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            del first
+            assert reference() is None, "a storage outlived its last reference"
+        finally:
+            if enabled:
+                gc.enable()
+        print("Query cache shared test passed\n\n")
+
+
+if __name__ == "__main__":
+    CF_Ltree_Storage_Test().run_all_test_sequences()
@@ -0,0 +1,123 @@
+from cf_clock import SimulatedClock
+from cf_metrics import Histogram, PROMETHEUS_BUCKETS
+class CF_Metrics_Test():
+    """
+    Checks the engine metrics: histogram percentiles and buckets, the tick
+    and event counts of a polled run and a Prometheus export that lists
+    every configured bucket, empty or not.
+    """
+    def __init__(self,cf,op,Event):
+        self.cf = cf
+        self.op = op
+        self.event = Event
+        self.test_sequence_dict = {}
+        self.test_sequence_dict["test_histogram"] = self.test_histogram
+        self.test_sequence_dict["test_polled_metrics"] = self.test_polled_metrics
+        self.test_sequence_dict["test_prometheus_buckets"] = self.test_prometheus_buckets
+
+
+    def run_test_sequence(self,test_sequence_name):
+
+        if test_sequence_name in self.test_sequence_dict:
+            print("sequence name",test_sequence_name)
+            print("\n\nrunning test sequence",test_sequence_name)
+            self.test_sequence_dict[test_sequence_name]()
+            print("end of test sequence\n\n",test_sequence_name)
+
+        else:
+            raise ValueError(f"Test sequence {test_sequence_name} not found")
+
+    def run_all_test_sequences(self):
+
+        for test_sequence_name in self.test_sequence_dict:
+            self.run_test_sequence(test_sequence_name)
+
+    def run_metered_chain(self,ticks,**metrics_args):
+        self.cf.clock = SimulatedClock(start = 0.0)
+        self.cf.reset_cf()
+        self.cf.event_id_dict.add_event_id("METRICS_EVENT","Metrics test event")
+        self.cf.define_chain("metered",auto_flag=True)
+        self.op.asm_wait_for_event(event_id = "CF_TIMER_EVENT",event_count = ticks)
+        self.op.asm_terminate_system()
+        self.cf.end_chain()
+        self.cf.finalize()
+        metrics = self.cf.enable_metrics(**metrics_args)
+        self.cf.post_system_event(self.event("METRICS_EVENT",None))
+        self.cf.cf_engine_start()
+        self.cf.disable_metrics()
+        return metrics
+
+    def test_histogram(self):
+        print("\n\ntest_histogram")
+        histogram = Histogram(sub_bucket_bits = 4)
+        assert histogram.percentile(50) is None and histogram.buckets([1,2]) == [(1,0),(2,0)]
+        for value in range(1,101):
+            histogram.record(value)
+        histogram.record(-5)
+        stats = histogram.get_stats()
+        assert stats['count'] == 101 and stats['min'] == 0 and stats['max'] == 100, stats
+        assert 48 <= stats['p50'] <= 52, stats
+        assert stats['p99'] <= 100, stats
+        # exact below 2**sub_bucket_bits, then every bound is reported, empty or not
+        assert histogram.buckets([0,5,15,1000,5000]) == [(0,1),(5,6),(15,16),(1000,101),(5000,101)]
+        histogram.reset()
+        histogram.record(1)
+        histogram.record(100)
+        all_buckets = histogram.buckets()
+        assert len(all_buckets) > 2 and all_buckets[0] == (0,0) and all_buckets[-1][1] == 2, all_buckets
+        assert [count for _,count in all_buckets].count(1) > 1, "empty buckets were dropped"
+        print("Histogram test passed\n\n")
+
+    def test_polled_metrics(self):
+        print("\n\ntest_polled_metrics")
+        saved_clock = self.cf.clock
+        try:
+            metrics = self.run_metered_chain(5)
+            stats = metrics.get_stats()
+            print(stats)
+            assert stats['tick_count'] >= 5 and stats['overrun_count'] == 0, stats
+            # the timer events and the posted event all had their latency recorded
+            assert metrics.event_latency.count >= 6, stats
+            assert metrics.tick_time.count == metrics.tick_count
+            assert "execute_system_event_loop" not in vars(self.cf), "the metrics did not detach"
+        finally:
+            self.cf.clock = saved_clock
+            self.cf.reset_cf()
+        print("Polled metrics test passed\n\n")
+
+    def test_prometheus_buckets(self):
+        print("\n\ntest_prometheus_buckets")
+        saved_clock = self.cf.clock
+        try:
+            metrics = self.run_metered_chain(3)
+            text = metrics.prometheus_text(prefix = "cf_test")
+            print(text)
+            lines = text.splitlines()
+            for name in ("tick_processing_seconds","event_latency_seconds"):
+                metric = f"cf_test_{name}"
+                histogram = metrics.tick_time if name == "tick_processing_seconds" else metrics.event_latency
+                bucket_lines = [line for line in lines if line.startswith(f"{metric}_bucket")]
+                # one line per configured bound plus +Inf, on every scrape
+                assert len(bucket_lines) == len(PROMETHEUS_BUCKETS) + 1, bucket_lines
+                labels = [line.split('"')[1] for line in bucket_lines]
+                assert labels == [f"{bound:.6g}" for bound in PROMETHEUS_BUCKETS] + ["+Inf"], labels
+                counts = [int(line.split()[-1]) for line in bucket_lines]
+                assert counts == sorted(counts), f"bucket counts are not cumulative {counts}"
+                assert counts[-1] == histogram.count
+                assert f"# TYPE {metric} histogram" in lines
+                assert f"{metric}_count {histogram.count}" in lines
+            assert f"cf_test_ticks_total {metrics.tick_count}" in lines
+
+            metrics = self.run_metered_chain(3,prometheus_buckets = (0.5,1.0))
+            bucket_lines = [line for line in metrics.prometheus_text().splitlines()
+                            if line.startswith("chain_flow_tick_processing_seconds_bucket")]
+            assert [line.split('"')[1] for line in bucket_lines] == ["0.5","1","+Inf"], bucket_lines
+            try:
+                self.cf.enable_metrics(prometheus_buckets = (1.0,0.5))
+                raise AssertionError("decreasing bucket bounds were accepted")
+            except ValueError:
+                pass
+        finally:
+            self.cf.clock = saved_clock
+            self.cf.reset_cf()
+        print("Prometheus buckets test passed\n\n")
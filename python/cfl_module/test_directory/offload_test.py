@@ -0,0 +1,159 @@
+import os
+import threading
+import time
+def offload_pid(data):
+    # module level, so the process pool can pickle it
+    return (data,os.getpid())
+class CF_Offload_Test():
+    """
+    Checks the offload opcodes: results and errors of work run on the
+    thread pool while the engine keeps ticking, timeouts, retries when the
+    pool is at capacity and work run on the process pool.
+    """
+    def __init__(self,cf,op,Event):
+        self.cf = cf
+        self.op = op
+        self.event = Event
+        self.test_sequence_dict = {}
+        self.test_sequence_dict["test_thread_offload"] = self.test_thread_offload
+        self.test_sequence_dict["test_offload_timeout_and_capacity"] = self.test_offload_timeout_and_capacity
+        self.test_sequence_dict["test_process_offload"] = self.test_process_offload
+
+
+    def run_test_sequence(self,test_sequence_name):
+
+        if test_sequence_name in self.test_sequence_dict:
+            print("sequence name",test_sequence_name)
+            print("\n\nrunning test sequence",test_sequence_name)
+            self.test_sequence_dict[test_sequence_name]()
+            print("end of test sequence\n\n",test_sequence_name)
+
+        else:
+            raise ValueError(f"Test sequence {test_sequence_name} not found")
+
+    def run_all_test_sequences(self):
+
+        for test_sequence_name in self.test_sequence_dict:
+            self.run_test_sequence(test_sequence_name)
+
+    def test_thread_offload(self):
+        print("\n\ntest_thread_offload")
+        results = {}
+        ticks_during_work = []
+
+        def slow_double(value):
+            time.sleep(0.5)
+            results["thread"] = threading.current_thread().name
+            return value * 2
+
+        def fail(value):
+            raise RuntimeError(value)
+
+        try:
+            self.cf.reset_cf()
+            self.cf.define_chain("offloader",auto_flag=True)
+            self.op.asm_offload(slow_double,21,result_fn = lambda data,result: results.setdefault("result",result))
+            self.op.asm_halt()
+            self.cf.end_chain()
+
+            self.cf.define_chain("failing",auto_flag=True)
+            self.op.asm_offload(fail,"expected",error_fn = lambda data: results.setdefault("error",data),
+                                error_data = "error_data",reset_flag = False)
+            self.op.asm_one_shot_handler(lambda data: results.setdefault("after_error",True),None)
+            self.op.asm_halt()
+            self.cf.end_chain()
+
+            # the engine keeps dispatching ticks while the work runs
+            self.cf.define_chain("ticker",auto_flag=True)
+            self.op.asm_wait(lambda data,event: ticks_during_work.append(self.cf.tick_count) or "result" in results,
+                             None,None,None)
+            self.op.asm_terminate_system()
+            self.cf.end_chain()
+            self.cf.finalize()
+            self.cf.cf_engine_start()
+
+            print(results,"ticks",len(ticks_during_work))
+            assert results["result"] == 42 and results["thread"].startswith("chain_flow_offload"), results
+            # the failing chain was terminated, not continued
+            assert results["error"] == "error_data" and "after_error" not in results, results
+            assert len(ticks_during_work) >= 3, "the engine blocked on the offloaded work"
+        finally:
+            self.cf.shutdown_offload()
+            self.cf.reset_cf()
+        print("Thread offload test passed\n\n")
+
+    def test_offload_timeout_and_capacity(self):
+        print("\n\ntest_offload_timeout_and_capacity")
+        results = {}
+        release = threading.Event()
+        try:
+            self.cf.reset_cf()
+            self.cf.configure_offload("thread",max_workers = 1)
+
+            self.cf.define_chain("blocked",auto_flag=True)
+            self.op.asm_offload(lambda data: release.wait(5.0),None,timeout = 0.3,
+                                error_fn = lambda data: results.setdefault("timed_out",self.cf.tick_count))
+            self.cf.end_chain()
+
+            # the pool is full until the blocked work is released, so this submission is retried
+            self.cf.define_chain("waiting",auto_flag=True)
+            self.op.asm_one_shot_handler(lambda data: results.setdefault("submitted",self.cf.tick_count),None)
+            self.op.asm_offload(lambda data: data,"done",result_fn = lambda data,result: results.setdefault("result",result))
+            self.op.asm_terminate_system()
+            self.cf.end_chain()
+
+            self.cf.define_chain("releaser",auto_flag=True)
+            self.op.asm_wait(lambda data,event: "timed_out" in results,None,None,None)
+            self.op.asm_one_shot_handler(lambda data: release.set(),None)
+            self.op.asm_halt()
+            self.cf.end_chain()
+
+            # stops the engine if the retry never succeeds
+            self.cf.define_chain("guard",auto_flag=True)
+            self.op.asm_wait_time(5.0)
+            self.op.asm_one_shot_handler(lambda data: results.setdefault("guard",True),None)
+            self.op.asm_terminate_system()
+            self.cf.end_chain()
+            self.cf.finalize()
+            self.cf.cf_engine_start()
+
+            print(results)
+            assert "guard" not in results, results
+            assert 3 <= results["timed_out"] - results["submitted"] <= 5, results
+            assert results["result"] == "done", results
+            try:
+                self.cf.configure_offload("fiber")
+                raise AssertionError("an unknown offload kind was accepted")
+            except ValueError:
+                pass
+        finally:
+            release.set()
+            self.cf.shutdown_offload()
+            self.cf.reset_cf()
+        print("Offload timeout and capacity test passed\n\n")
+
+    def test_process_offload(self):
+        print("\n\ntest_process_offload")
+        results = {}
+        try:
+            self.cf.reset_cf()
+            self.cf.configure_offload("process",max_workers = 1)
+            self.cf.define_chain("process_offloader",auto_flag=True)
+            self.op.asm_offload_process(offload_pid,"value",result_fn = lambda data,result: results.setdefault("result",result),
+                                        timeout = 10.0)
+            self.op.asm_terminate_system()
+            self.cf.end_chain()
+            self.cf.finalize()
+            self.cf.cf_engine_start()
+            print(results)
+            data,pid = results["result"]
+            assert data == "value" and pid != os.getpid(), results
+            try:
+                self.op.asm_offload("not callable")
+                raise AssertionError("a non callable offload_fn was accepted")
+            except TypeError:
+                pass
+        finally:
+            self.cf.shutdown_offload()
+            self.cf.reset_cf()
+        print("Process offload test passed\n\n")
@@ -0,0 +1,108 @@
+from cf_clock import SimulatedClock
+class CF_Profiler_Test():
+    """
+    Checks the profiler counts: element calls and chain events under the
+    polled engine, and the callback events the event driven engine runs
+    without a system event.
+    """
+    def __init__(self,cf,op,Event):
+        self.cf = cf
+        self.op = op
+        self.event = Event
+        self.test_sequence_dict = {}
+        self.test_sequence_dict["test_polled_counts"] = self.test_polled_counts
+        self.test_sequence_dict["test_event_driven_callback_counts"] = self.test_event_driven_callback_counts
+
+
+    def run_test_sequence(self,test_sequence_name):
+
+        if test_sequence_name in self.test_sequence_dict:
+            print("sequence name",test_sequence_name)
+            print("\n\nrunning test sequence",test_sequence_name)
+            self.test_sequence_dict[test_sequence_name]()
+            print("end of test sequence\n\n",test_sequence_name)
+
+        else:
+            raise ValueError(f"Test sequence {test_sequence_name} not found")
+
+    def run_all_test_sequences(self):
+
+        for test_sequence_name in self.test_sequence_dict:
+            self.run_test_sequence(test_sequence_name)
+
+    def element_calls(self,profiler,chain_name):
+        return {row['element']: row['calls'] for row in profiler.report() if row['chain'] == chain_name}
+
+    def test_polled_counts(self):
+        print("\n\ntest_polled_counts")
+        saved_clock = self.cf.clock
+        try:
+            self.cf.clock = SimulatedClock(start = 0.0)
+            self.cf.reset_cf()
+            self.cf.define_chain("counter",auto_flag=True)
+            self.op.asm_wait_for_event(event_id = "CF_TIMER_EVENT",event_count = 5,name = "wait_ticks")
+            self.op.asm_terminate_system(name = "stop")
+            self.cf.end_chain()
+            self.cf.finalize()
+
+            profiler = self.cf.enable_profiling()
+            profiler.reset()
+            self.cf.cf_engine_start()
+            self.cf.disable_profiling()
+            print(profiler.format_report())
+
+            calls = self.element_calls(profiler,"counter")
+            chains = {row['chain']: row for row in profiler.chain_report()}
+            assert calls["wait_ticks"] == 5, f"unexpected calls {calls}"
+            assert calls["stop"] == 1, f"unexpected calls {calls}"
+            assert chains["counter"]['events'] == 5 and chains["counter"]['max_callback_depth'] == 0
+            assert "execute_chain_element" not in vars(self.cf), "the profiler did not detach"
+        finally:
+            self.cf.clock = saved_clock
+            self.cf.reset_cf()
+        print("Polled counts test passed\n\n")
+
+    def test_event_driven_callback_counts(self):
+        print("\n\ntest_event_driven_callback_counts")
+        saved_clock = self.cf.clock
+        try:
+            self.cf.clock = SimulatedClock(start = 0.0)
+            self.cf.reset_cf()
+            self.cf.event_id_dict.add_event_id("PROFILE_EVENT","Profiler test event")
+            completed = []
+
+            self.cf.define_chain("receiver",auto_flag=True)
+            self.op.asm_wait_for_event(event_id = "PROFILE_EVENT",event_count = 3,name = "wait_events")
+            self.op.asm_one_shot_handler(lambda data: completed.append(True),None,name = "done")
+            self.op.asm_terminate_system(name = "stop")
+            self.cf.end_chain()
+
+            # stops the engine if the receiver never completes
+            self.cf.define_chain("guard",auto_flag=True)
+            self.op.asm_wait_time(10.0)
+            self.op.asm_terminate_system()
+            self.cf.end_chain()
+            self.cf.finalize()
+
+            # drained when the engine starts and run by its pending callback pass, not by a system event
+            for index in range(4):
+                self.cf.post_named_queue_event("receiver",self.event("PROFILE_EVENT",index))
+            profiler = self.cf.enable_profiling()
+            profiler.reset()
+            self.cf.cf_engine_start_event_driven(tick_period = 0.1)
+            self.cf.disable_profiling()
+            print(profiler.format_report())
+            print(profiler.chain_report())
+
+            calls = self.element_calls(profiler,"receiver")
+            chains = {row['chain']: row for row in profiler.chain_report()}
+            assert completed, "the receiver did not complete"
+            assert calls["wait_events"] >= 3, f"callback events were not timed {calls}"
+            assert calls["done"] == 1 and calls["stop"] == 1, f"unexpected calls {calls}"
+            assert chains["receiver"]['events'] >= 3, f"callback events were not counted {chains}"
+            assert chains["receiver"]['max_callback_depth'] == 4, f"callback depth not sampled {chains}"
+            assert "_execute_callback_events" not in vars(self.cf), "the profiler did not detach"
+        finally:
+            self.cf.clock = saved_clock
+            self.cf.reset_cf()
+        print("Event driven callback counts test passed\n\n")
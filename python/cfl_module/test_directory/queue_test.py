@@ -0,0 +1,254 @@
+import threading
+from cf_events import DualEventQueueSystem, EventQueue, UnlockedEventQueue
+class CF_Queue_Test():
+    """
+    Checks the event queues: the lock free queues and the thread safe
+    ingress producer threads post through, the batch drains the engine
+    dispatches from and the slotted events it queues.
+    """
+    def __init__(self,cf,op,Event):
+        self.cf = cf
+        self.op = op
+        self.event = Event
+        self.test_sequence_dict = {}
+        self.test_sequence_dict["test_lock_free_ingress"] = self.test_lock_free_ingress
+        self.test_sequence_dict["test_posted_events_reach_engine"] = self.test_posted_events_reach_engine
+        self.test_sequence_dict["test_batch_drain"] = self.test_batch_drain
+        self.test_sequence_dict["test_engine_batches"] = self.test_engine_batches
+        self.test_sequence_dict["test_events"] = self.test_events
+        self.test_sequence_dict["test_timer_events_kept_by_chains"] = self.test_timer_events_kept_by_chains
+
+
+    def run_test_sequence(self,test_sequence_name):
+
+        if test_sequence_name in self.test_sequence_dict:
+            print("sequence name",test_sequence_name)
+            print("\n\nrunning test sequence",test_sequence_name)
+            self.test_sequence_dict[test_sequence_name]()
+            print("end of test sequence\n\n",test_sequence_name)
+
+        else:
+            raise ValueError(f"Test sequence {test_sequence_name} not found")
+
+    def run_all_test_sequences(self):
+
+        for test_sequence_name in self.test_sequence_dict:
+            self.run_test_sequence(test_sequence_name)
+
+    def post_from_threads(self,post,thread_count,event_count):
+        threads = [threading.Thread(target=lambda thread=thread: [post(thread,index) for index in range(event_count)])
+                   for thread in range(thread_count)]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def test_lock_free_ingress(self):
+        print("\n\ntest_lock_free_ingress")
+        queues = DualEventQueueSystem(["chain_a","chain_b"],lock_free = True)
+        assert type(queues.normal_events) is UnlockedEventQueue
+        assert type(queues.callback_events["chain_a"]) is UnlockedEventQueue
+        assert type(DualEventQueueSystem(["chain_a"]).normal_events) is EventQueue
+
+        def post(thread,index):
+            if index % 2:
+                queues.post_callback_event("chain_a",self.event("QUEUE_EVENT",(thread,index)))
+            else:
+                queues.post_normal_event(self.event("QUEUE_EVENT",(thread,index)))
+        for thread in self.post_from_threads(post,4,500):
+            thread.join()
+        queues.post_wakeup()
+
+        posted = queues.drain_ingress()
+        assert len(posted) == 2001 and posted[-1] == (None,None)
+        for thread in range(4):
+            indexes = [event.data[1] for _,event in posted[:-1] if event.data[0] == thread]
+            assert indexes == list(range(500)), "posting order lost"
+        assert all((chain_name == "chain_a") == bool(event.data[1] % 2) for chain_name,event in posted[:-1])
+        assert queues.drain_ingress() == [] and queues.drain_ingress(wait = 0.01) == []
+
+        try:
+            queues.post_callback_event("chain_c",self.event("QUEUE_EVENT",None))
+            raise AssertionError("an unknown chain was accepted")
+        except ValueError:
+            pass
+        try:
+            queues.post_normal_event("QUEUE_EVENT")
+            raise AssertionError("a non Event was accepted")
+        except TypeError:
+            pass
+        print("Lock free ingress test passed\n\n")
+
+    def test_posted_events_reach_engine(self):
+        print("\n\ntest_posted_events_reach_engine")
+        saved_lock_free = self.cf.lock_free_queues
+        try:
+            self.cf.lock_free_queues = True
+            self.cf.reset_cf()
+            self.cf.event_id_dict.add_event_id("POSTED_EVENT","Queue test posted event")
+            self.cf.event_id_dict.add_event_id("POSTED_NAMED_EVENT","Queue test posted named event")
+            completed = []
+
+            self.cf.define_chain("system_counter",auto_flag=True)
+            self.op.asm_wait_for_event(event_id = "POSTED_EVENT",event_count = 200)
+            self.op.asm_one_shot_handler(lambda data: completed.append("system"),None)
+            self.op.asm_halt()
+            self.cf.end_chain()
+
+            self.cf.define_chain("named_counter",auto_flag=True)
+            self.op.asm_wait_for_event(event_id = "POSTED_NAMED_EVENT",event_count = 100)
+            self.op.asm_one_shot_handler(lambda data: completed.append("named"),None)
+            self.op.asm_halt()
+            self.cf.end_chain()
+
+            self.cf.define_chain("stop",auto_flag=True)
+            self.op.asm_wait(lambda data,event: len(completed) == 2,None,None,None)
+            self.op.asm_terminate_system()
+            self.cf.end_chain()
+
+            # stops the engine if an event is lost
+            self.cf.define_chain("guard",auto_flag=True)
+            self.op.asm_wait_time(5.0)
+            self.op.asm_terminate_system()
+            self.cf.end_chain()
+            self.cf.finalize()
+            assert type(self.cf.event_system.normal_events) is UnlockedEventQueue
+
+            def post(thread,index):
+                if thread < 4:
+                    self.cf.post_system_event(self.event("POSTED_EVENT",(thread,index)))
+                else:
+                    self.cf.post_named_queue_event("named_counter",self.event("POSTED_NAMED_EVENT",(thread,index)))
+            threads = self.post_from_threads(post,6,50)
+            self.cf.cf_engine_start()
+            for thread in threads:
+                thread.join()
+            assert sorted(completed) == ["named","system"], f"posted events were lost {completed}"
+        finally:
+            self.cf.lock_free_queues = saved_lock_free
+            self.cf.reset_cf()
+        print("Posted events reach engine test passed\n\n")
+
+    def test_batch_drain(self):
+        print("\n\ntest_batch_drain")
+        for queue_class in (EventQueue,UnlockedEventQueue):
+            queue = queue_class("batch",max_size = 10)
+            for index in range(12):
+                assert queue.enqueue(self.event("QUEUE_EVENT",index)) == (index < 10)
+            assert [event.data for event in queue.drain(3)] == [0,1,2]
+            queue.push_front([self.event("QUEUE_EVENT","a"),self.event("QUEUE_EVENT","b")])
+            assert queue.peek().data == "a" and queue.size() == 9
+            drained = queue.drain()
+            assert [event.data for event in drained] == ["a","b",3,4,5,6,7,8,9]
+            assert queue.is_empty() and len(queue.drain()) == 0 and len(queue.drain(5)) == 0
+            # the drained deque is no longer the queue's
+            queue.enqueue(self.event("QUEUE_EVENT",10))
+            assert len(drained) == 9 and queue.size() == 1
+
+        queues = DualEventQueueSystem(["chain_a"])
+        for index in range(4):
+            queues.add_normal_event(self.event("QUEUE_EVENT",index))
+            queues.add_callback_event("chain_a",self.event("QUEUE_EVENT",index))
+        events = queues.drain_normal(2)
+        queues.restore_normal(events)
+        assert [event.data for event in queues.drain_normal()] == [0,1,2,3]
+        assert [event.data for event in queues.drain_callbacks("chain_a")] == [0,1,2,3]
+        assert not queues.has_callback_events("chain_a")
+        try:
+            queues.drain_callbacks("chain_b")
+            raise AssertionError("an unknown chain was drained")
+        except ValueError:
+            pass
+        print("Batch drain test passed\n\n")
+
+    def test_engine_batches(self):
+        print("\n\ntest_engine_batches")
+        self.cf.reset_cf()
+        self.cf.event_id_dict.add_event_id("BATCH_EVENT","Queue test batch event")
+        seen = []
+
+        def record(data,event):
+            if event.event_id == "BATCH_EVENT":
+                seen.append(event.data)
+                if event.data == 1:
+                    self.cf.send_system_event(self.event("BATCH_EVENT",100))
+            return False
+
+        self.cf.define_chain("recorder",auto_flag=True)
+        self.op.asm_wait(record,None,None,None)
+        self.cf.end_chain()
+        self.cf.finalize()
+        self.cf.initialize_chains()
+
+        # events sent while a batch is dispatched run after it, in order
+        for index in range(4):
+            self.cf.send_system_event(self.event("BATCH_EVENT",index))
+        self.cf.execute_system_event_loop()
+        assert seen == [0,1,2,3,100], seen
+
+        # the events after CF_TERMINATE_SYSTEM stay queued
+        self.cf.send_system_event(self.event("BATCH_EVENT",4))
+        self.cf.send_system_event(self.event("CF_TERMINATE_SYSTEM",None))
+        self.cf.send_system_event(self.event("BATCH_EVENT",5))
+        self.cf.send_system_event(self.event("BATCH_EVENT",6))
+        self.cf.execute_system_event_loop()
+        assert seen[-1] == 4, seen
+        assert [event.data for event in self.cf.event_system.normal_events.get_all_events()] == [5,6]
+        self.cf.reset_cf()
+        print("Engine batches test passed\n\n")
+
+    def test_events(self):
+        print("\n\ntest_events")
+        event = self.event(" QUEUE_EVENT ")
+        assert event.event_id == "QUEUE_EVENT" and event.data is None
+        assert not hasattr(event,"__dict__")
+        try:
+            event.extra = 1
+            raise AssertionError("an Event took an attribute outside its slots")
+        except AttributeError:
+            pass
+        for event_id,error_type in ((None,TypeError),("  ",ValueError)):
+            try:
+                self.event(event_id)
+                raise AssertionError(f"event id {event_id!r} was accepted")
+            except error_type:
+                pass
+        trusted = self.event.trusted("QUEUE_EVENT",{"value":1})
+        assert type(trusted) is self.event and trusted == self.event("QUEUE_EVENT",{"value":1})
+        assert hash(trusted) == hash(self.event("QUEUE_EVENT",{"value":1}))
+
+        self.cf.reset_cf()
+        self.cf.define_chain("idle",auto_flag=True)
+        self.op.asm_halt()
+        self.cf.end_chain()
+        self.cf.finalize()
+        self.cf.reset_system()
+        self.cf.stop_system()
+        assert [event.event_id for event in self.cf.event_system.normal_events.get_all_events()] == \
+            ["CF_SYSTEM_RESET","CF_SYSTEM_STOP"]
+        self.cf.reset_cf()
+        print("Events test passed\n\n")
+
+    def test_timer_events_kept_by_chains(self):
+        print("\n\ntest_timer_events_kept_by_chains")
+        kept = []
+
+        def keep(data,event):
+            if event.event_id == "CF_TIMER_EVENT":
+                kept.append((event,event.data,dict(event.data)))
+            return len(kept) >= 5
+
+        self.cf.reset_cf()
+        self.cf.define_chain("keeper",auto_flag=True)
+        self.op.asm_wait(keep,None,None,None)
+        self.op.asm_terminate_system()
+        self.cf.end_chain()
+        self.cf.finalize()
+        self.cf.cf_engine_start()
+        # every tick queues its own event; the ones chains kept are left as they were
+        assert len(kept) == 5
+        assert len({id(event) for event,_,_ in kept}) == 5 and len({id(data) for _,data,_ in kept}) == 5
+        assert all(data == copied for _,data,copied in kept)
+        time_stamps = [data['time_stamp'] for _,data,_ in kept]
+        assert time_stamps == sorted(time_stamps) and len(set(time_stamps)) == 5, time_stamps
+        self.cf.reset_cf()
+        print("Timer events kept by chains test passed\n\n")
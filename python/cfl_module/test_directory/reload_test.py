@@ -0,0 +1,186 @@
+from cf_clock import SimulatedClock
+class CF_Reload_Test():
+    """
+    Checks hot reload: chains added, replaced and removed on a finalized
+    system while the other chains keep their state, aborted reloads, and
+    reloads posted to a running engine.
+    """
+    def __init__(self,cf,op,Event):
+        self.cf = cf
+        self.op = op
+        self.event = Event
+        self.test_sequence_dict = {}
+        self.test_sequence_dict["test_reload_chains"] = self.test_reload_chains
+        self.test_sequence_dict["test_abort_reload"] = self.test_abort_reload
+        self.test_sequence_dict["test_post_reload"] = self.test_post_reload
+
+
+    def run_test_sequence(self,test_sequence_name):
+
+        if test_sequence_name in self.test_sequence_dict:
+            print("sequence name",test_sequence_name)
+            print("\n\nrunning test sequence",test_sequence_name)
+            self.test_sequence_dict[test_sequence_name]()
+            print("end of test sequence\n\n",test_sequence_name)
+
+        else:
+            raise ValueError(f"Test sequence {test_sequence_name} not found")
+
+    def run_all_test_sequences(self):
+
+        for test_sequence_name in self.test_sequence_dict:
+            self.run_test_sequence(test_sequence_name)
+
+    def define_counter(self,chain_name,counts,terminated):
+        # counts the RELOAD_EVENTs its chain sees, records its termination
+        def count(data,event):
+            if event.event_id == "RELOAD_EVENT":
+                counts[data] = counts.get(data,0) + 1
+            return False
+        self.cf.define_chain(chain_name,auto_flag=True)
+        self.op.asm_wait(count,None,lambda data: terminated.append(data),chain_name)
+        self.cf.end_chain()
+
+    def send_reload_event(self):
+        self.cf.send_system_event(self.event("RELOAD_EVENT",None))
+        self.cf.execute_system_event_loop()
+
+    def build_system(self):
+        counts = {}
+        terminated = []
+        self.cf.reset_cf()
+        self.cf.event_id_dict.add_event_id("RELOAD_EVENT","Reload test event")
+        for chain_name in ("kept","replaced","removed"):
+            self.define_counter(chain_name,counts,terminated)
+        self.cf.finalize()
+        self.cf.initialize_chains()
+        self.send_reload_event()
+        return counts,terminated
+
+    def test_reload_chains(self):
+        print("\n\ntest_reload_chains")
+        counts,terminated = self.build_system()
+        kept_element = self.cf.chain_dict["kept"]["element_list"][0]
+        with self.cf.reload_chains():
+            self.cf.remove_chain("removed")
+            self.define_counter("replaced",counts,terminated)
+            self.define_counter("added",counts,terminated)
+            # nothing changes before the commit
+            assert self.cf.get_active_chains() == ["kept","replaced","removed"]
+        assert self.cf.get_active_chains() == ["kept","replaced","added"], self.cf.get_active_chains()
+        assert sorted(terminated) == ["removed","replaced"], terminated
+        assert "removed" not in self.cf.chain_dict and "removed" not in self.cf.event_system.callback_events
+        # the unchanged chain was not touched
+        assert self.cf.chain_dict["kept"]["element_list"][0] is kept_element
+
+        self.send_reload_event()
+        assert counts == {"kept":2,"replaced":2,"removed":1,"added":1}, counts
+        # the added chain has its own callback queue
+        self.cf.send_named_queue_event("added",self.event("RELOAD_EVENT",None))
+        self.send_reload_event()
+        assert counts["added"] == 3 and counts["kept"] == 3, counts
+
+        self.cf.begin_reload()
+        result_errors = []
+        for call,error_type in ((lambda: self.cf.remove_chain("missing"),ValueError),
+                                (lambda: self.cf.begin_reload(),RuntimeError)):
+            try:
+                call()
+                result_errors.append(call)
+            except error_type:
+                pass
+        self.cf.define_chain("unfinished",auto_flag=True)
+        try:
+            self.cf.commit_reload()
+            result_errors.append("commit_reload")
+        except ValueError:
+            pass
+        self.cf.end_chain()
+        assert self.cf.commit_reload() == {"added":["unfinished"],"replaced":[],"removed":[]}
+        assert result_errors == [], result_errors
+        try:
+            self.cf.commit_reload()
+            raise AssertionError("a reload was committed twice")
+        except RuntimeError:
+            pass
+        self.cf.reset_cf()
+        print("Reload chains test passed\n\n")
+
+    def test_abort_reload(self):
+        print("\n\ntest_abort_reload")
+        counts,terminated = self.build_system()
+        try:
+            with self.cf.reload_chains():
+                self.cf.remove_chain("kept")
+                self.define_counter("added",counts,terminated)
+                raise KeyError("build failed")
+        except KeyError:
+            pass
+        assert self.cf.get_active_chains() == ["kept","replaced","removed"] and terminated == []
+        assert "added" not in self.cf.chain_dict
+        self.send_reload_event()
+        assert counts == {"kept":2,"replaced":2,"removed":2}, counts
+        # a new reload can start after the aborted one
+        with self.cf.reload_chains():
+            self.cf.remove_chain("kept")
+        assert self.cf.get_active_chains() == ["replaced","removed"]
+        self.cf.reset_cf()
+        print("Abort reload test passed\n\n")
+
+    def test_post_reload(self):
+        print("\n\ntest_post_reload")
+        saved_clock = self.cf.clock
+        try:
+            self.cf.clock = SimulatedClock(start = 0.0)
+            self.cf.reset_cf()
+            done = {}
+            futures = []
+
+            def failing_build(cf):
+                cf.remove_chain("missing")
+
+            def build(cf):
+                # replaces the sleeper, whose pending wait_time timeout must not wake the new chain
+                cf.define_chain("sleeper",auto_flag=True)
+                self.op.asm_one_shot_handler(lambda data: done.setdefault("replaced_start",cf.current_time()),None)
+                self.op.asm_wait_time(2.0)
+                self.op.asm_one_shot_handler(lambda data: done.setdefault("replaced_woken",cf.current_time()),None)
+                self.op.asm_terminate_system()
+                cf.end_chain()
+
+            self.cf.define_chain("sleeper",auto_flag=True)
+            self.op.asm_wait_time(0.5)
+            self.op.asm_one_shot_handler(lambda data: done.setdefault("old_woken",True),None)
+            self.op.asm_halt()
+            self.cf.end_chain()
+
+            # posts the reloads from inside a chain element, which can not commit them itself
+            self.cf.define_chain("reloader",auto_flag=True)
+            self.op.asm_wait_for_event(event_id = "CF_TIMER_EVENT",event_count = 3)
+            self.op.asm_one_shot_handler(lambda data: futures.extend([self.cf.post_reload(failing_build),self.cf.post_reload(build)]),None)
+            self.op.asm_halt()
+            self.cf.end_chain()
+
+            # stops the engine if the reload never terminates the system
+            self.cf.define_chain("guard",auto_flag=True)
+            self.op.asm_wait_time(10.0)
+            self.op.asm_one_shot_handler(lambda data: done.setdefault("guard",True),None)
+            self.op.asm_terminate_system()
+            self.cf.end_chain()
+            self.cf.finalize()
+            self.cf.cf_engine_start()
+
+            print(done)
+            assert isinstance(futures[0].exception(),ValueError)
+            assert futures[1].result() == {"added":[],"replaced":["sleeper"],"removed":[]}
+            assert "old_woken" not in done and "guard" not in done, done
+            assert 2.0 < done["replaced_woken"] - done["replaced_start"] <= 2.1 + 1e-9, done
+            try:
+                self.cf.post_reload("not callable")
+                raise AssertionError("a non callable build_fn was accepted")
+            except TypeError:
+                pass
+        finally:
+            self.cf.clock = saved_clock
+            self.cf.reset_cf()
+        print("Post reload test passed\n\n")
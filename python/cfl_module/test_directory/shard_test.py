@@ -0,0 +1,112 @@
+import multiprocessing
+import os
+from cf_sharding import ShardedChainFlow, default_shard_of
+from op_codes import Opcodes
+class CF_Shard_Test():
+    """
+    Checks the sharded chain flow: chain placement, named events routed to
+    the shard owning their chain, system events reaching every shard and
+    asm_terminate_system stopping all of them.
+    """
+    def __init__(self,cf,op,Event):
+        self.cf = cf
+        self.op = op
+        self.event = Event
+        self.test_sequence_dict = {}
+        self.test_sequence_dict["test_placement"] = self.test_placement
+        self.test_sequence_dict["test_cross_shard_routing"] = self.test_cross_shard_routing
+
+
+    def run_test_sequence(self,test_sequence_name):
+
+        if test_sequence_name in self.test_sequence_dict:
+            print("sequence name",test_sequence_name)
+            print("\n\nrunning test sequence",test_sequence_name)
+            self.test_sequence_dict[test_sequence_name]()
+            print("end of test sequence\n\n",test_sequence_name)
+
+        else:
+            raise ValueError(f"Test sequence {test_sequence_name} not found")
+
+    def run_all_test_sequences(self):
+
+        for test_sequence_name in self.test_sequence_dict:
+            self.run_test_sequence(test_sequence_name)
+
+    def test_placement(self):
+        print("\n\ntest_placement")
+        build = lambda cf: None
+        sharded = ShardedChainFlow(build,shard_count = 4)
+        for chain_name in ("chain_a","chain_b","sender","receiver"):
+            assert sharded.shard_of(chain_name) == default_shard_of(chain_name,4) == default_shard_of(chain_name,4)
+        sharded = ShardedChainFlow(build,shard_count = 4,partition = {"sender":3})
+        assert sharded.shard_of("sender") == 3 and sharded.shard_of("chain_a") == default_shard_of("chain_a",4)
+        sharded = ShardedChainFlow(build,shard_count = 4,partition = lambda chain_name,shard_count: len(chain_name) % shard_count)
+        assert sharded.shard_of("receiver") == 0
+        for partition,error_type in (({"sender":4},ValueError),(lambda chain_name,shard_count: "0",ValueError)):
+            try:
+                ShardedChainFlow(build,shard_count = 4,partition = partition).shard_of("sender")
+                raise AssertionError(f"invalid partition {partition} was accepted")
+            except error_type:
+                pass
+        for kwargs,error_type in (({"shard_count":0},ValueError),({"partition":["sender"]},TypeError)):
+            try:
+                ShardedChainFlow(build,**kwargs)
+                raise AssertionError(f"{kwargs} was accepted")
+            except error_type:
+                pass
+        try:
+            sharded.send_system_event(self.event("CF_TERMINATE_SYSTEM"))
+            raise AssertionError("an event was sent before start()")
+        except RuntimeError:
+            pass
+        print("Placement test passed\n\n")
+
+    def test_cross_shard_routing(self):
+        print("\n\ntest_cross_shard_routing")
+        context = multiprocessing.get_context("fork")
+        results = context.Queue()
+        partition = {"sender":0,"receiver":1,"listener_0":0,"listener_1":1,"listener_2":2}
+
+        def build(cf):
+            op = Opcodes(cf)
+            cf.event_id_dict.add_event_id("SHARD_START","Shard test start event")
+            cf.event_id_dict.add_event_id("SHARD_NAMED","Shard test named event")
+            cf.event_id_dict.add_event_id("SHARD_BROADCAST","Shard test event sent by a chain")
+            cf.add_reserved_chain_name(list(partition))
+            cf.define_chain("sender",auto_flag=True)
+            op.asm_wait_for_event(event_id = "SHARD_START")
+            op.asm_send_named_event("receiver","SHARD_NAMED",{"from":os.getpid()})
+            op.asm_halt()
+            cf.end_chain()
+            cf.define_chain("receiver",auto_flag=True)
+            op.asm_wait_for_event(event_id = "SHARD_NAMED")
+            op.asm_one_shot_handler(lambda data: results.put(("receiver",os.getpid())),None)
+            op.asm_send_system_event("SHARD_BROADCAST")
+            op.asm_halt()
+            cf.end_chain()
+            for shard_index in range(3):
+                cf.define_chain(f"listener_{shard_index}",auto_flag=True)
+                op.asm_wait_for_event(event_id = "SHARD_BROADCAST")
+                op.asm_one_shot_handler(lambda data,shard_index=shard_index: results.put((f"listener_{shard_index}",os.getpid())),None)
+                if shard_index == 2:
+                    op.asm_terminate_system()
+                op.asm_halt()
+                cf.end_chain()
+
+        sharded = ShardedChainFlow(build,shard_count = 3,partition = partition,tick_period = 0.05,mp_context = context)
+        sharded.start()
+        try:
+            sharded.send_named_queue_event("sender",self.event("SHARD_START"))
+            received = dict(results.get(timeout = 10.0) for _ in range(4))
+            print(received)
+            # each chain ran in its own shard's process, none in this one
+            assert received["receiver"] == received["listener_1"] != received["listener_0"] != received["listener_2"]
+            assert os.getpid() not in received.values()
+            assert sharded.join(10.0), "CF_TERMINATE_SYSTEM did not stop every shard"
+        finally:
+            if any(sharded.is_alive()):
+                for process in sharded._processes:
+                    process.terminate()
+                sharded.join(5.0)
+        print("Cross shard routing test passed\n\n")
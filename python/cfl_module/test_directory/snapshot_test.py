@@ -0,0 +1,157 @@
+import pickle
+from chain_flow import ChainFlow
+from cf_clock import SimulatedClock
+from op_codes import Opcodes
+class CF_Snapshot_Test():
+    """
+    Checks snapshot and restore: a system restored into a new ChainFlow in
+    the middle of a run finishes exactly as the original one does, with
+    its element data, queued events, timeouts and inactive chains carried
+    over, and a snapshot only loads into a system with the same chains.
+    """
+    def __init__(self,cf,op,Event):
+        self.cf = cf
+        self.op = op
+        self.event = Event
+        self.test_sequence_dict = {}
+        self.test_sequence_dict["test_snapshot_round_trip"] = self.test_snapshot_round_trip
+        self.test_sequence_dict["test_snapshot_mismatch"] = self.test_snapshot_mismatch
+
+
+    def run_test_sequence(self,test_sequence_name):
+
+        if test_sequence_name in self.test_sequence_dict:
+            print("sequence name",test_sequence_name)
+            print("\n\nrunning test sequence",test_sequence_name)
+            self.test_sequence_dict[test_sequence_name]()
+            print("end of test sequence\n\n",test_sequence_name)
+
+        else:
+            raise ValueError(f"Test sequence {test_sequence_name} not found")
+
+    def run_all_test_sequences(self):
+
+        for test_sequence_name in self.test_sequence_dict:
+            self.run_test_sequence(test_sequence_name)
+
+    def build(self,cf,op,results):
+        cf.event_id_dict.add_event_id("SNAP_EVENT","Snapshot test event")
+
+        def count(state,event):
+            if event.event_id == "SNAP_EVENT":
+                state["count"] += 1
+            return state["count"] >= 4
+
+        cf.define_chain("counter",auto_flag=True)
+        op.asm_wait(count,None,None,{"count":0})
+        op.asm_one_shot_handler(lambda data: results.append(("counter",cf.tick_count)),None)
+        op.asm_halt()
+        cf.end_chain()
+
+        cf.define_chain("sleeper",auto_flag=True)
+        op.asm_wait_time(5.0)
+        op.asm_one_shot_handler(lambda data: results.append(("sleeper",round(cf.current_time(),3))),None)
+        op.asm_halt()
+        cf.end_chain()
+
+        cf.define_chain("one_pass",auto_flag=True)
+        op.asm_one_shot_handler(lambda data: results.append(("one_pass",cf.tick_count)),None)
+        op.asm_terminate()
+        cf.end_chain()
+
+        cf.define_chain("idle",auto_flag=False)
+        op.asm_halt()
+        cf.end_chain()
+
+        cf.define_chain("ticker",auto_flag=True)
+        op.asm_wait_for_event(event_id = "CF_TIMER_EVENT",event_count = 80)
+        op.asm_one_shot_handler(lambda data: results.append(("ticker",cf.tick_count)),None)
+        op.asm_terminate_system()
+        cf.end_chain()
+        cf.finalize()
+
+    def new_chain_flow(self,now):
+        cf = ChainFlow(self.cf.time_tick,clock = SimulatedClock(start = now))
+        return cf,Opcodes(cf)
+
+    def test_snapshot_round_trip(self):
+        print("\n\ntest_snapshot_round_trip")
+        saved_clock = self.cf.clock
+        try:
+            self.cf.clock = SimulatedClock(start = 0.0)
+            self.cf.reset_cf()
+            original = []
+            self.build(self.cf,self.op,original)
+            assert self.cf.run_ticks(10)
+            self.cf.send_system_event(self.event("SNAP_EVENT",None))
+            assert self.cf.run_ticks(10)
+            # left queued: two named events and one system event
+            self.cf.send_named_queue_event("counter",self.event("SNAP_EVENT",None))
+            self.cf.send_named_queue_event("counter",self.event("SNAP_EVENT",None))
+            self.cf.send_system_event(self.event("SNAP_EVENT",None))
+            buffers = []
+            data = self.cf.snapshot(buffer_callback = buffers.append)
+            in_band = self.cf.snapshot()
+            buffers = [bytes(buffer) for buffer in buffers]
+            snapshot_time = self.cf.current_time()
+            before = list(original)
+            while self.cf.run_ticks(10):
+                pass
+            after = original[len(before):]
+            print("before",before,"after",after)
+            assert [name for name,_ in before] == ["one_pass"], before
+            assert [name for name,_ in after] == ["counter","sleeper","ticker"], after
+
+            for snapshot,snapshot_buffers in ((data,buffers),(in_band,None)):
+                cf,op = self.new_chain_flow(snapshot_time)
+                restored = []
+                self.build(cf,op,restored)
+                cf.restore(snapshot,snapshot_buffers)
+                assert cf.get_active_chains() == ["counter","sleeper","ticker"], cf.get_active_chains()
+                assert cf.tick_count == 20
+                while cf.run_ticks(10):
+                    pass
+                print("restored",restored)
+                # the terminated chain did not run again and the rest finished as in the original
+                assert restored == after, restored
+        finally:
+            self.cf.clock = saved_clock
+            self.cf.reset_cf()
+        print("Snapshot round trip test passed\n\n")
+
+    def test_snapshot_mismatch(self):
+        print("\n\ntest_snapshot_mismatch")
+        saved_clock = self.cf.clock
+        try:
+            self.cf.clock = SimulatedClock(start = 0.0)
+            self.cf.reset_cf()
+            self.build(self.cf,self.op,[])
+            self.cf.run_ticks(1)
+            data = self.cf.snapshot()
+
+            cf,op = self.new_chain_flow(0.0)
+            try:
+                cf.snapshot()
+                raise AssertionError("a snapshot was taken before finalize()")
+            except RuntimeError:
+                pass
+            cf.event_id_dict.add_event_id("SNAP_EVENT","Snapshot test event")
+            cf.define_chain("counter",auto_flag=True)
+            op.asm_halt()
+            cf.end_chain()
+            cf.finalize()
+            try:
+                cf.restore(data)
+                raise AssertionError("a snapshot was restored into different chains")
+            except ValueError:
+                pass
+            for garbage,error_type in ((b"not a snapshot",pickle.UnpicklingError),(pickle.dumps({"version":0}),ValueError)):
+                try:
+                    cf.restore(garbage)
+                    raise AssertionError(f"{garbage!r} was restored")
+                except error_type:
+                    pass
+        finally:
+            self.cf.clock = saved_clock
+            self.cf.reset_cf()
+        print("Snapshot mismatch test passed\n\n")
@@ -3,6 +3,19 @@ from .wait_test import CF_Wait_Test
 from .verify_test import CF_Verify_Test
 from .watch_dog_test import CF_Watch_Dog_Test
 from .basic_tests import CF_Basic_Tests
+from .dispatch_test import CF_Dispatch_Test
+from .journal_test import CF_Journal_Test
+from .profiler_test import CF_Profiler_Test
+from .metrics_test import CF_Metrics_Test
+from .engine_test import CF_Engine_Test
+from .queue_test import CF_Queue_Test
+from .timing_wheel_test import CF_Timing_Wheel_Test
+from .shard_test import CF_Shard_Test
+from .offload_test import CF_Offload_Test
+from .clock_test import CF_Clock_Test
+from .calendar_test import CF_Calendar_Test
+from .reload_test import CF_Reload_Test
+from .snapshot_test import CF_Snapshot_Test
 class CFL_test_driver:
     def __init__(self,cf,op,Event):
         self.cf = cf
@@ -11,11 +24,37 @@ class CFL_test_driver:
         self.cf_verify_test = CF_Verify_Test(cf,op)
         self.cf_watch_dog_test = CF_Watch_Dog_Test(cf,op,Event)
         self.cf_basic_tests = CF_Basic_Tests(cf,op,Event)
+        self.cf_dispatch_test = CF_Dispatch_Test(cf,op,Event)
+        self.cf_journal_test = CF_Journal_Test(cf,op,Event)
+        self.cf_profiler_test = CF_Profiler_Test(cf,op,Event)
+        self.cf_metrics_test = CF_Metrics_Test(cf,op,Event)
+        self.cf_engine_test = CF_Engine_Test(cf,op,Event)
+        self.cf_queue_test = CF_Queue_Test(cf,op,Event)
+        self.cf_timing_wheel_test = CF_Timing_Wheel_Test(cf,op,Event)
+        self.cf_shard_test = CF_Shard_Test(cf,op,Event)
+        self.cf_offload_test = CF_Offload_Test(cf,op,Event)
+        self.cf_clock_test = CF_Clock_Test(cf,op,Event)
+        self.cf_calendar_test = CF_Calendar_Test(cf,op,Event)
+        self.cf_reload_test = CF_Reload_Test(cf,op,Event)
+        self.cf_snapshot_test = CF_Snapshot_Test(cf,op,Event)
         self.test_sequence_dict = {}
         self.test_sequence_dict["wait"] = self.cf_wait_test
         self.test_sequence_dict["verify"] = self.cf_verify_test
         self.test_sequence_dict["watch_dog"] = self.cf_watch_dog_test
         self.test_sequence_dict["basic"] = self.cf_basic_tests
+        self.test_sequence_dict["dispatch"] = self.cf_dispatch_test
+        self.test_sequence_dict["journal"] = self.cf_journal_test
+        self.test_sequence_dict["profiler"] = self.cf_profiler_test
+        self.test_sequence_dict["metrics"] = self.cf_metrics_test
+        self.test_sequence_dict["engine"] = self.cf_engine_test
+        self.test_sequence_dict["queue"] = self.cf_queue_test
+        self.test_sequence_dict["timing_wheel"] = self.cf_timing_wheel_test
+        self.test_sequence_dict["shard"] = self.cf_shard_test
+        self.test_sequence_dict["offload"] = self.cf_offload_test
+        self.test_sequence_dict["clock"] = self.cf_clock_test
+        self.test_sequence_dict["calendar"] = self.cf_calendar_test
+        self.test_sequence_dict["reload"] = self.cf_reload_test
+        self.test_sequence_dict["snapshot"] = self.cf_snapshot_test
         
         
     def list_test_sequences(self):
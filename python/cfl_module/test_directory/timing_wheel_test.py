@@ -0,0 +1,126 @@
+import random
+from cf_clock import SimulatedClock
+from timing_wheel import TimingWheel
+class CF_Timing_Wheel_Test():
+    """
+    Checks the timing wheel against a brute force model of its deadlines,
+    and the wait_time and tick timeouts the engine schedules on it.
+    """
+    def __init__(self,cf,op,Event,seed = 0,steps = 5000):
+        self.cf = cf
+        self.op = op
+        self.event = Event
+        self.seed = seed
+        self.steps = steps
+        self.test_sequence_dict = {}
+        self.test_sequence_dict["test_wheel_matches_model"] = self.test_wheel_matches_model
+        self.test_sequence_dict["test_engine_timeouts"] = self.test_engine_timeouts
+
+
+    def run_test_sequence(self,test_sequence_name):
+
+        if test_sequence_name in self.test_sequence_dict:
+            print("sequence name",test_sequence_name)
+            print("\n\nrunning test sequence",test_sequence_name)
+            self.test_sequence_dict[test_sequence_name]()
+            print("end of test sequence\n\n",test_sequence_name)
+
+        else:
+            raise ValueError(f"Test sequence {test_sequence_name} not found")
+
+    def run_all_test_sequences(self):
+
+        for test_sequence_name in self.test_sequence_dict:
+            self.run_test_sequence(test_sequence_name)
+
+    def test_wheel_matches_model(self):
+        print("\n\ntest_wheel_matches_model")
+        rnd = random.Random(self.seed)
+        # small levels, so deadlines cascade through every level and the overflow list
+        wheel = TimingWheel(slot_bits = 2,level_count = 3,current = 5)
+        model = {}
+        now = 5
+        next_key = 0
+        expired_count = 0
+        for step in range(self.steps):
+            choice = rnd.random()
+            if choice < 0.45:
+                deadline = now + rnd.choice([-2,0,1,3,4,15,16,17,63,64,65,300])
+                wheel.schedule(deadline,next_key,("payload",next_key))
+                model[next_key] = deadline
+                next_key += 1
+            elif choice < 0.6 and model:
+                key = rnd.choice(list(model))
+                assert wheel.cancel(key)
+                del model[key]
+            elif choice < 0.65:
+                assert not wheel.cancel(next_key + 1)
+            else:
+                now += rnd.choice([0,1,1,2,5,40,200])
+                expired = wheel.advance(now)
+                expected = sorted((deadline,key) for key,deadline in model.items() if deadline <= now)
+                assert sorted((model[key],key) for key,_ in expired) == expected, step
+                deadlines = [model[key] for key,_ in expired]
+                assert deadlines == sorted(deadlines), "expired out of deadline order"
+                assert all(payload == ("payload",key) for key,payload in expired)
+                for key,_ in expired:
+                    del model[key]
+                expired_count += len(expired)
+            assert len(wheel) == len(model)
+            assert wheel.next_deadline() == (min(model.values()) if model else None), step
+        try:
+            wheel.schedule(now,"twice")
+            wheel.schedule(now,"twice")
+            raise AssertionError("a key was scheduled twice")
+        except ValueError:
+            pass
+        wheel.clear()
+        assert len(wheel) == 0 and wheel.advance(now + 1000) == [] and wheel.current == now + 1000
+        print("expired",expired_count,"of",next_key)
+        print("Wheel matches model test passed\n\n")
+
+    def test_engine_timeouts(self):
+        print("\n\ntest_engine_timeouts")
+        saved_clock = self.cf.clock
+        try:
+            self.cf.clock = SimulatedClock(start = 0.0,tick_period = 0.1)
+            self.cf.reset_cf()
+            self.cf.event_id_dict.add_event_id("NEVER_EVENT","Timing wheel test event that is never sent")
+            done = {}
+
+            self.cf.define_chain("delayed",auto_flag=True)
+            self.op.asm_one_shot_handler(lambda data: done.setdefault("start",self.cf.current_time()),None)
+            self.op.asm_wait_time(1.0)
+            self.op.asm_one_shot_handler(lambda data: done.setdefault("delayed",self.cf.current_time()),None)
+            self.op.asm_halt()
+            self.cf.end_chain()
+
+            self.cf.define_chain("timed_out",auto_flag=True)
+            self.op.asm_wait_for_event(event_id = "NEVER_EVENT",timeout = 5,
+                                       error_fn = lambda data: done.setdefault("timed_out",self.cf.tick_count))
+            self.cf.end_chain()
+
+            self.cf.define_chain("cancelled",auto_flag=True)
+            self.op.asm_wait_for_event(event_id = "CF_TIMER_EVENT",event_count = 2,timeout = 4,
+                                       error_fn = lambda data: done.setdefault("cancelled",self.cf.tick_count))
+            self.op.asm_halt()
+            self.cf.end_chain()
+
+            self.cf.define_chain("stop",auto_flag=True)
+            self.op.asm_wait_time(3.0)
+            self.op.asm_terminate_system()
+            self.cf.end_chain()
+            self.cf.finalize()
+            self.cf.cf_engine_start()
+
+            print(done)
+            # expires on the first tick strictly after the delay
+            assert 1.0 < done["delayed"] - done["start"] <= 1.1 + 1e-9, done
+            assert done["timed_out"] == 5, done
+            # completed before its timeout, which is cancelled with it
+            assert "cancelled" not in done, done
+            assert len(self.cf._tick_wheel) == 0 and len(self.cf._time_wheel) == 0, "timeouts left scheduled"
+        finally:
+            self.cf.clock = saved_clock
+            self.cf.reset_cf()
+        print("Engine timeouts test passed\n\n")
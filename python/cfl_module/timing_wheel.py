@@ -0,0 +1,260 @@
+"""
+Hierarchical timing wheel for chain flow deadlines
+"""
+from typing import Any, Hashable, List, Optional, Tuple
+
+
+class _WheelEntry:
+    """A scheduled deadline; alive is cleared when the entry is cancelled"""
+
+    __slots__ = ('deadline', 'key', 'payload', 'alive')
+
+    def __init__(self, deadline: int, key: Hashable, payload: Any):
+        self.deadline = deadline
+        self.key = key
+        self.payload = payload
+        self.alive = True
+
+
+class TimingWheel:
+    """
+    Hierarchical timing wheel keyed by integer time units
+
+    Level 0 has one slot per unit and each higher level has slots spanning a
+    full revolution of the level below.  An entry is filed at the lowest
+    level whose span covers its distance from the current time and cascades
+    down a level when the wheel reaches its slot, so scheduling and
+    cancelling are O(1) and nothing is touched for an entry until it is
+    close to expiring.  Deadlines beyond the top level wait in an overflow
+    list until they come into range.
+
+    The wheel does not read a clock: the caller advances it with the
+    current time in its own units (ticks, milliseconds, ...).
+    """
+
+    def __init__(self, slot_bits: int = 6, level_count: int = 5, current: int = 0):
+        """
+        Initialize a TimingWheel
+
+        Args:
+            slot_bits (int): log2 of the number of slots per level
+            level_count (int): Number of levels
+            current (int): Starting time in wheel units
+        """
+        if not isinstance(slot_bits, int) or slot_bits < 1:
+            raise ValueError("slot_bits must be a positive integer")
+        if not isinstance(level_count, int) or level_count < 1:
+            raise ValueError("level_count must be a positive integer")
+        self.slot_bits = slot_bits
+        self.slot_count = 1 << slot_bits
+        self.slot_mask = self.slot_count - 1
+        self.level_count = level_count
+        self.current = current
+        # overflow entries are refiled on multiples of this many units
+        self._overflow_shift = slot_bits * max(level_count - 1, 1)
+        self._levels = [[[] for _ in range(self.slot_count)] for _ in range(level_count)]
+        self._level_sizes = [0] * level_count  # entries filed per level, cancelled ones included
+        self._overflow = []
+        self._due = []  # entries scheduled at or before the current time
+        self._entries = {}  # key to live entry
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def schedule(self, deadline: int, key: Hashable, payload: Any = None) -> None:
+        """
+        Schedule payload to expire at deadline
+
+        Args:
+            deadline (int): Expiry time in wheel units; a deadline that is not
+                after the current time expires on the next advance()
+            key (hashable): Unique key used to cancel the entry
+            payload (object): Returned by advance() when the entry expires
+
+        Raises:
+            ValueError: If key is already scheduled
+        """
+        if key in self._entries:
+            raise ValueError(f"Key '{key}' is already scheduled")
+        entry = _WheelEntry(int(deadline), key, payload)
+        self._entries[key] = entry
+        if entry.deadline <= self.current:
+            self._due.append(entry)
+        else:
+            self._place(entry)
+
+    def cancel(self, key: Hashable) -> bool:
+        """
+        Cancel a scheduled entry
+
+        Returns:
+            bool: True if the entry was pending, False if unknown or expired
+        """
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        entry.alive = False
+        return True
+
+    def clear(self) -> None:
+        """Drop every entry, keeping the current time"""
+        for entry in self._entries.values():
+            entry.alive = False
+        self._entries.clear()
+        self._reset_slots()
+
+    def _reset_slots(self):
+        for level in range(self.level_count):
+            if self._level_sizes[level]:
+                self._levels[level] = [[] for _ in range(self.slot_count)]
+                self._level_sizes[level] = 0
+        self._overflow = []
+        self._due = []
+
+    def _place(self, entry: _WheelEntry):
+        delta = entry.deadline - self.current
+        shift = 0
+        for level in range(self.level_count):
+            if delta < (1 << (shift + self.slot_bits)):
+                self._levels[level][(entry.deadline >> shift) & self.slot_mask].append(entry)
+                self._level_sizes[level] += 1
+                return
+            shift += self.slot_bits
+        self._overflow.append(entry)
+
+    def _cascade(self, now: int):
+        """Refile the higher level slots that the wheel reaches at time now"""
+        # highest level whose revolution of the level below ends at now
+        top_level = 0
+        shift = self.slot_bits
+        while top_level + 1 < self.level_count and now & ((1 << shift) - 1) == 0:
+            top_level += 1
+            shift += self.slot_bits
+
+        if self._overflow and now & ((1 << self._overflow_shift) - 1) == 0:
+            overflow = self._overflow
+            self._overflow = []
+            for entry in overflow:
+                if entry.alive:
+                    self._place(entry)
+
+        # cascade from the top so refiled entries are cascaded again below
+        for level in range(top_level, 0, -1):
+            slot_index = (now >> (self.slot_bits * level)) & self.slot_mask
+            slot = self._levels[level][slot_index]
+            if not slot:
+                continue
+            self._levels[level][slot_index] = []
+            self._level_sizes[level] -= len(slot)
+            for entry in slot:
+                if entry.alive:
+                    self._place(entry)
+
+    def _next_stop(self, now: int) -> int:
+        """Furthest time the wheel can jump to without skipping a slot with entries"""
+        current = self.current
+        if self._level_sizes[0]:
+            return current + 1
+        span = self.slot_count
+        for level in range(1, self.level_count):
+            if self._level_sizes[level]:
+                return min(now, (current | (span - 1)) + 1)
+            span <<= self.slot_bits
+        # only overflow entries: jump to the top level boundary that brings
+        # the earliest of them into range
+        top_shift = self._overflow_shift
+        earliest = min(entry.deadline for entry in self._overflow if entry.alive)
+        stop = (earliest >> top_shift) << top_shift
+        if stop <= current:
+            stop = ((current >> top_shift) + 1) << top_shift
+        return min(now, stop)
+
+    def advance(self, now: int) -> List[Tuple[Hashable, Any]]:
+        """
+        Move the wheel forward to time now and collect the expired entries
+
+        Args:
+            now (int): Current time in wheel units
+
+        Returns:
+            List of (key, payload) in deadline order
+        """
+        expired = []
+        entries = self._entries
+        if self._due:
+            self._due.sort(key=lambda entry: entry.deadline)
+            for entry in self._due:
+                if entry.alive:
+                    del entries[entry.key]
+                    expired.append((entry.key, entry.payload))
+            self._due = []
+
+        if not entries:
+            if self._overflow or any(self._level_sizes):
+                self._reset_slots()
+            if now > self.current:
+                self.current = now
+            return expired
+
+        level_zero = self._levels[0]
+        slot_mask = self.slot_mask
+        while self.current < now:
+            self.current = self._next_stop(now)
+            current = self.current
+            if current & slot_mask == 0:
+                self._cascade(current)
+            slot = level_zero[current & slot_mask]
+            if not slot:
+                continue
+            level_zero[current & slot_mask] = []
+            self._level_sizes[0] -= len(slot)
+            for entry in slot:
+                if entry.alive:
+                    del entries[entry.key]
+                    expired.append((entry.key, entry.payload))
+            if not entries:
+                self._reset_slots()
+                self.current = now
+                break
+        return expired
+
+    def items(self) -> List[Tuple[int, Hashable, Any]]:
+        """
+        Return (deadline, key, payload) for every pending entry, in deadline order
+        """
+        return sorted(((entry.deadline, entry.key, entry.payload) for entry in self._entries.values()),
+                      key=lambda item: item[0])
+
+    def next_deadline(self) -> Optional[int]:
+        """
+        Return the earliest pending deadline, None if nothing is scheduled
+        """
+        if not self._entries:
+            return None
+        earliest = None
+        for entry in self._due:
+            if entry.alive and (earliest is None or entry.deadline < earliest):
+                earliest = entry.deadline
+        shift = 0
+        for level in range(self.level_count):
+            if self._level_sizes[level]:
+                slots = self._levels[level]
+                start = (self.current >> shift) + 1
+                for offset in range(self.slot_count):
+                    live = [entry.deadline for entry in slots[(start + offset) & self.slot_mask] if entry.alive]
+                    if live:
+                        level_earliest = min(live)
+                        if earliest is None or level_earliest < earliest:
+                            earliest = level_earliest
+                        break
+            shift += self.slot_bits
+        for entry in self._overflow:
+            if entry.alive and (earliest is None or entry.deadline < earliest):
+                earliest = entry.deadline
+        return earliest
+
+    def __repr__(self):
+        return f"TimingWheel(current={self.current}, pending={len(self._entries)})"
@@ -24,11 +24,14 @@ class Verify_Opcodes(Support_Functions):
         if element_data['fn'](element_data["fn_data"],event) == False:
               return self.exec_failure(element_data,event)
             
-        if "timeout" in element_data and element_data["timeout"] is not None:
-            if event.event_id == element_data["time_out_event"]:    
-                element_data["time_out_count"] += 1
-                if element_data["time_out_count"] >= element_data["timeout"]:
-                     return self.exec_failure(element_data,event)
+        if element_data["timeout"] is not None and element_data["time_out_event"] is not None:
+            # asm_verify always counts CF_TIMER_EVENTs, which are scheduled on the engine's tick wheel
+            if element_data["timeout_token"] is None:
+                timed_out = self._start_tick_timeout(data,event)
+            else:
+                timed_out = self._is_timed_out(element_data,event)
+            if timed_out:
+                return self.exec_failure(element_data,event)
                   
         return "CF_CONTINUE"
         
@@ -40,9 +43,11 @@ class Verify_Opcodes(Support_Functions):
         if "init" in element_data and element_data["init"] is not None:
             element_data["init"](element_data["fn_data"])
         element_data["time_out_count"] = 0
+        self._cancel_timeout(element_data)
             
     def exec_verify_term(self,data):
         element_data = data["data"]
+        self._cancel_timeout(element_data)
         if "term" in element_data and element_data["term"] is not None:
             element_data["term"](element_data["fn_data"])
 
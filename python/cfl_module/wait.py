@@ -1,7 +1,7 @@
 from datetime import datetime
 from asm_support_functions import Support_Functions
 from cf_events import Event_id_dict
-import time
+from cf_calendar import CronSchedule
 
 class Wait_Opcodes(Support_Functions):
     def __init__(self,cf):
@@ -12,12 +12,14 @@ class Wait_Opcodes(Support_Functions):
     def exec_wait_init(self,element_data_total):
         element_data = element_data_total["data"]
         element_data["time_out_count"] = 0
+        self._cancel_timeout(element_data)
 
         if element_data["initialization_function"] is not None:
             element_data["initialization_function"](element_data["fn_data"])
 
     def exec_wait_term(self,element_data_total):
         element_data = element_data_total["data"]
+        self._cancel_timeout(element_data)
         if element_data["termination_function"] is not None:
             element_data["termination_function"](element_data["fn_data"])
 
@@ -36,15 +38,25 @@ class Wait_Opcodes(Support_Functions):
             # Check process_function
             if callable(element_data["process_function"]):
                 if element_data["process_function"](element_data["fn_data"], event) is True:
+                    self._cancel_timeout(element_data)
                     return "CF_DISABLE"
             else:
                 raise TypeError("process_function must be callable")
             
             # Handle timeout
             if element_data["timeout"] is not None:
-                if event.event_id == element_data["time_out_event"]:
-                   element_data["time_out_count"] += 1
-                   if element_data["time_out_count"] >= element_data["timeout"]:
+                if element_data["time_out_event"] == "CF_TIMER_EVENT":
+                    # timer event timeouts are scheduled on the engine's tick wheel
+                    if element_data["timeout_token"] is None:
+                        timed_out = self._start_tick_timeout(element_data_total, event)
+                    else:
+                        timed_out = self._is_timed_out(element_data, event)
+                elif event.event_id == element_data["time_out_event"]:
+                    element_data["time_out_count"] += 1
+                    timed_out = element_data["time_out_count"] >= element_data["timeout"]
+                else:
+                    timed_out = False
+                if timed_out:
                        
                     # Execute error_function if it exists and is callable
                     if element_data["error_function"] is not None:
@@ -63,7 +75,13 @@ class Wait_Opcodes(Support_Functions):
         except Exception as e:
             # Log error and re-raise or handle as needed
             raise RuntimeError(f"Error in exec_wait: {str(e)}")
-    def asm_wait(self,wait_fn,wait_fn_init,wait_fn_term,fn_data, reset_flag = False, timeout=None,time_out_event="CF_TIMER_EVENT",error_fn = None,error_data = None,name=None):
+    def asm_wait(self,wait_fn,wait_fn_init,wait_fn_term,fn_data, reset_flag = False, timeout=None,time_out_event="CF_TIMER_EVENT",error_fn = None,error_data = None,name=None,
+                 event_list=None):
+        # event_list: events wait_fn reacts to, None if wait_fn must see every event
+        if event_list is not None and timeout is not None:
+            # the engine wakes the chain for timer event timeouts
+            if time_out_event != "CF_TIMER_EVENT":
+                event_list = list(event_list) + [time_out_event]
         element_data = {}
         element_data["fn_data"] = fn_data
         element_data["reset_flag"] = reset_flag
@@ -77,7 +95,8 @@ class Wait_Opcodes(Support_Functions):
         self.cf.add_element(process_function=self.exec_wait,
                             initialization_function=self.exec_wait_init,
                             termination_function=self.exec_wait_term,
-                            data=element_data, name=name)
+                            data=element_data, name=name,
+                            event_list=event_list)
        
         
     
@@ -98,22 +117,23 @@ class Wait_Opcodes(Support_Functions):
         element_data = {}
         element_data["event_id"] = event_id
         element_data["event_count"] = event_count
-        self.asm_wait(self.exec_wait_for_event,self.exec_wait_for_event_init,None,element_data,reset_flag,timeout,time_out_event,error_fn,error_data,name)
+        self.asm_wait(self.exec_wait_for_event,self.exec_wait_for_event_init,None,element_data,reset_flag,timeout,time_out_event,error_fn,error_data,name,
+                      event_list=[event_id])
     
     def exec_time_delay_init(self,element_data):
-    
-        element_data["data"]["start_time"] = time.time()
+        data = element_data["data"]
+        self._cancel_timeout(data)
+        data["start_time"] = self.cf.current_time()
+        data["timeout_token"] = self.cf.schedule_timeout(element_data["current_chain"],data["time_delay"])
         
+    def exec_time_delay_term(self,element_data):
+        self._cancel_timeout(element_data["data"])
         
     def exec_time_delay(self,element_data,event):
 
         
-        if event.event_id == "CF_TIMER_EVENT":
-            data = element_data["data"]
-           
-            if time.time() > data["time_delay"] +data["start_time"]:
-              
-                return "CF_DISABLE"
+        if self._is_timed_out(element_data["data"],event):
+            return "CF_DISABLE"
         return "CF_HALT"
     
     def asm_wait_time(self,time_delay,name=None):
@@ -122,6 +142,45 @@ class Wait_Opcodes(Support_Functions):
     
         self.cf.add_element(process_function=self.exec_time_delay,
                             initialization_function=self.exec_time_delay_init,
-                            termination_function=None,
-                            data=element_data, name=name)
- 
\ No newline at end of file
+                            termination_function=self.exec_time_delay_term,
+                            data=element_data, name=name,
+                            event_list=[])
+ 
+
+    def exec_schedule_init(self,element_data):
+        data = element_data["data"]
+        self._cancel_timeout(data)
+        now = self.cf.current_time()
+        data["fire_time"] = data["schedule"].next_after(now,self.cf.timezone)
+        if data["fire_time"] is not None:
+            data["timeout_token"] = self.cf.schedule_timeout(element_data["current_chain"],data["fire_time"] - now)
+
+    def exec_schedule_term(self,element_data):
+        self._cancel_timeout(element_data["data"])
+
+    def exec_wait_for_schedule(self,element_data,event):
+        if self._is_timed_out(element_data["data"],event):
+            return "CF_DISABLE"
+        return "CF_HALT"
+
+    def asm_wait_for_schedule(self,schedule,name=None):
+        """
+        Wait for the next minute matching a cron expression
+
+        The wait starts when the element is initialized, so a chain that
+        resets after the wait fires on every matching minute.  Minutes are
+        taken in the engine's timezone, see ChainFlow.set_timezone().
+
+        Args:
+            schedule (str or CronSchedule): e.g. "*/15 8-17 * * mon-fri"
+        """
+        if not isinstance(schedule,CronSchedule):
+            schedule = CronSchedule(schedule)
+        element_data = {}
+        element_data["schedule"] = schedule
+
+        self.cf.add_element(process_function=self.exec_wait_for_schedule,
+                            initialization_function=self.exec_schedule_init,
+                            termination_function=self.exec_schedule_term,
+                            data=element_data, name=name,
+                            event_list=[])
@@ -78,5 +78,7 @@ class Watch_Dog_Opcodes(Support_Functions):
         self.cf.add_element(process_function=self.exec_watch_dog,
                             initialization_function=self.exec_watch_dog_init,
                             termination_function=None,
-                            data=element_data, name=name)
+                            data=element_data, name=name,
+                            event_list=[pat_event,pat_start_event,cancel_event,pat_time_event],
+                            unmatched_return_code="CF_CONTINUE")
         
\ No newline at end of file